@@ -0,0 +1,37 @@
+"""Cost of authenticating a request with and without an AuthCache, with an
+argon2 validator like the ones built on pwdlib.
+
+Run from the directory that contains the package:
+    python -m securapi.benchmarks.bench_auth_cache
+"""
+import timeit
+from pwdlib import PasswordHash
+from ..main import authenticate, bearer_token
+from ..security.authCache import AuthCache
+
+
+def main() -> None:
+    password_hash = PasswordHash.recommended()
+    token = "session-token-1234"
+    token_hash = password_hash.hash(token)
+
+    def auth_middleware(token):
+        return "alice" if password_hash.verify(token, token_hash) else None
+
+    auth_header = f"Bearer {token}".encode()
+    cache = AuthCache()
+
+    def request(cache=None):
+        return authenticate(auth_middleware, bearer_token(auth_header), cache)
+
+    request(cache)
+    for name, call, number in (
+        ("argon2 every request", request, 5),
+        ("cached", lambda: request(cache), 200_000),
+    ):
+        elapsed = min(timeit.repeat(call, number=number, repeat=3))
+        print(f"{name:<22} {elapsed / number * 1e6:>12.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Latency of a fast endpoint while a sync one blocks on I/O (a 20ms DB call),
+with the sync handlers called on the event loop (inline=True), in the app
+thread pool, and with only the fast one inline.
+
+Run from the directory that contains the package:
+    python -m securapi.benchmarks.bench_blocking_handlers
+"""
+import asyncio
+import logging
+import time
+from ..main import SecurAPI
+
+
+def build_app(report_inline: bool, health_inline: bool) -> SecurAPI:
+    app = SecurAPI()
+
+    @app.add_endpoint("/report", inline=report_inline)
+    def report():
+        time.sleep(0.02)
+        return {"rows": 100}
+
+    @app.add_endpoint("/health", inline=health_inline)
+    def health():
+        return {"response": "OK"}
+
+    return app
+
+
+def make_scope(path: str) -> dict:
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 5000),
+    }
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def timed_request(app: SecurAPI, scope: dict, arrival: float, latencies: list) -> None:
+    await app.request_manager(scope, receive, send)
+    latencies.append(time.perf_counter() - arrival)
+
+
+async def run(app: SecurAPI, seconds: float) -> tuple:
+    """A /report every 40ms and a /health every 1ms, returns their latencies.\n
+    Latencies count from when each request was due, so the ones that couldn't
+    even be started while the loop was blocked are measured too"""
+    report, health = make_scope("/report"), make_scope("/health")
+    slow, fast = [], []
+    tasks = []
+    start = time.perf_counter()
+    ticks = int(seconds * 1000)
+    tick = 0
+    while tick < ticks:
+        now = time.perf_counter()
+        while tick < ticks and start + tick * 0.001 <= now:
+            arrival = start + tick * 0.001
+            if tick % 40 == 0:
+                tasks.append(asyncio.create_task(timed_request(app, report, arrival, slow)))
+            tasks.append(asyncio.create_task(timed_request(app, health, arrival, fast)))
+            tick += 1
+        await asyncio.sleep(max(0, start + tick * 0.001 - time.perf_counter()))
+    await asyncio.gather(*tasks)
+    return slow, fast
+
+
+def percentile(latencies: list, p: float) -> float:
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e3
+
+
+def main() -> None:
+    logging.disable(logging.INFO)
+    for name, report_inline, health_inline in (
+        ("on the event loop", True, True),
+        ("thread pool", False, False),
+        ("only /health inline", False, True),
+    ):
+        app = build_app(report_inline, health_inline)
+        slow, fast = asyncio.run(run(app, 3.0))
+        print(
+            f"{name:<20} /health p50 {percentile(fast, 0.5):7.2f} ms"
+            f"  p99 {percentile(fast, 0.99):7.2f} ms"
+            f"  | /report p99 {percentile(slow, 0.99):7.2f} ms"
+        )
+        if not report_inline:
+            stats = app.worker_pools.stats()
+            print(
+                f"{'':<20} pool wait avg {stats['wait_avg'] * 1e3:.2f} ms"
+                f"  p99 {stats['wait_p99'] * 1e3:.2f} ms"
+            )
+        app.worker_pools.shutdown()
+
+
+if __name__ == "__main__":
+    main()
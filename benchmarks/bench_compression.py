@@ -0,0 +1,45 @@
+"""Bytes saved against CPU spent compressing a JSON list response, for each
+encoding and level, and the cost of a new compressor against a copy of a
+prepared one (the copy is slower, Compression creates them).
+
+Run from the directory that contains the package:
+    python -m securapi.benchmarks.bench_compression
+"""
+import timeit
+import zlib
+from ..compression import WINDOW_BITS, compress_chunk
+from ..serializers import JSONSerializer
+
+
+def main() -> None:
+    rows = [
+        {"id": i, "name": f"user {i}", "email": f"user{i}@example.com", "active": i % 3 != 0}
+        for i in range(20_000)
+    ]
+    body = JSONSerializer().encode(rows)
+    print(f"JSON list response: {len(body) / 1024:.0f} KB")
+    for encoding, window_bits in WINDOW_BITS.items():
+        for level in (1, 6, 9):
+            def compress():
+                compressor = zlib.compressobj(level, zlib.DEFLATED, window_bits)
+                return compress_chunk(compressor, body, zlib.Z_FINISH)
+
+            size = len(compress())
+            elapsed = min(timeit.repeat(compress, number=5, repeat=3)) / 5
+            print(
+                f"{encoding:<8} level {level}  {size / 1024:>8.0f} KB"
+                f"  saved {100 * (1 - size / len(body)):>5.1f}%"
+                f"  {elapsed * 1e3:>7.2f} ms"
+                f"  {len(body) / elapsed / 2**20:>7.1f} MB/s"
+            )
+    template = zlib.compressobj(6, zlib.DEFLATED, WINDOW_BITS["gzip"])
+    for name, call in (
+        ("zlib.compressobj()", lambda: zlib.compressobj(6, zlib.DEFLATED, 31)),
+        ("template.copy()", template.copy),
+    ):
+        elapsed = min(timeit.repeat(call, number=10_000, repeat=3))
+        print(f"{name:<22} {elapsed / 10_000 * 1e6:>8.2f} us/compressor")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Framework overhead per request on hello-world style routes.
+
+Calls the ASGI app directly with an in-memory receive/send pair, so the
+numbers are the cost of SecurAPI itself without any server or network.
+
+    python -m securapi.benchmarks.bench_dispatch
+"""
+import asyncio
+import logging
+import time
+from ..main import SecurAPI
+
+
+def build_app() -> SecurAPI:
+    app = SecurAPI()
+
+    @app.add_endpoint("/health", inline=True)
+    def health():
+        return {"response": "OK"}
+
+    # The same handler in the thread pool, the default for sync handlers
+    @app.add_endpoint("/pooled-health")
+    def pooled_health():
+        return {"response": "OK"}
+
+    @app.add_endpoint("/async-health")
+    async def async_health():
+        return {"response": "OK"}
+
+    @app.add_endpoint("/params", inline=True)
+    def params(name, greeting="hello"):
+        return {"response": f"{greeting} {name}"}
+
+    @app.add_endpoint("/users/{id:int}", inline=True)
+    def user(id):
+        return {"id": id}
+
+    return app
+
+
+def make_scope(path: str, query_string: bytes = b"") -> dict:
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query_string,
+        "headers": [(b"host", b"localhost"), (b"accept", b"*/*")],
+        "client": ("127.0.0.1", 5000),
+    }
+
+
+async def run(app: SecurAPI, scope: dict, requests: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app.request_manager(scope, receive, send)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    logging.disable(logging.INFO)
+    app = build_app()
+    requests = 100_000
+    cases = {
+        "sync health": make_scope("/health"),
+        "pooled health": make_scope("/pooled-health"),
+        "async health": make_scope("/async-health"),
+        "query params": make_scope("/params", b"name=world"),
+        "path params": make_scope("/users/42"),
+        "not found": make_scope("/missing"),
+    }
+    for name, scope in cases.items():
+        elapsed = min(asyncio.run(run(app, scope, requests)) for _ in range(3))
+        print(f"{name:>14}: {elapsed / requests * 1e6:6.2f} us/request")
+    app.worker_pools.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""CIDR filter lookup cost and memory against the number of listed prefixes.
+
+Run from the directory that contains the package:
+    python -m securapi.benchmarks.bench_ip_filter
+"""
+import random
+import timeit
+from ..security.ipFiltering import IPFilter
+
+
+def random_ipv4(rng: random.Random) -> str:
+    return ".".join(str(rng.randrange(256)) for _ in range(4))
+
+
+def main() -> None:
+    rng = random.Random(1)
+    number = 200_000
+    print(f"{'prefixes':>9} {'nodes':>10} {'memory (KB)':>12} {'ipv4 (ns)':>10} {'ipv6 (ns)':>10}")
+    for prefix_count in (10, 1_000, 100_000):
+        ip_filter = IPFilter()
+        for _ in range(prefix_count):
+            ip_filter.deny(f"{random_ipv4(rng)}/{rng.randint(16, 32)}")
+            ip_filter.deny(f"2001:db8:{rng.randrange(65536):x}:{rng.randrange(65536):x}::/64")
+        ipv4 = random_ipv4(rng)
+        ipv6 = "2001:db8:1234:5678::1"
+        results = []
+        for ip in (ipv4, ipv6):
+            elapsed = min(
+                timeit.repeat(lambda: ip_filter.check(ip), number=number, repeat=3)
+            )
+            results.append(elapsed / number * 1e9)
+        stats = ip_filter.stats()
+        print(
+            f"{stats['prefixes']:>9} {stats['nodes']:>10} {stats['memory_bytes'] / 1024:>12.0f}"
+            f" {results[0]:>10.0f} {results[1]:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
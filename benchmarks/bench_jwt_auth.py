@@ -0,0 +1,68 @@
+"""Verified tokens per second: JWTVerifier against a naive jwt.decode middleware.
+
+Run from the directory that contains the package:
+    python -m securapi.benchmarks.bench_jwt_auth
+"""
+import time
+import timeit
+import jwt
+from ..security.jwtAuth import JWTVerifier
+
+SECRET = "benchmark-secret-benchmark-secret-benchmark"
+
+
+def naive_middleware(key, algorithm):
+    def auth_middleware(token):
+        try:
+            return jwt.decode(
+                token,
+                key,
+                algorithms=[algorithm],
+                audience="api",
+                options={"require": ["exp"]},
+            )
+        except jwt.InvalidTokenError:
+            return None
+
+    return auth_middleware
+
+
+def cases():
+    """(algorithm, signing key, verification key)"""
+    yield "HS256", SECRET, SECRET
+    if jwt.algorithms.has_crypto:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        yield "RS256", private_key, public_pem
+
+
+def main() -> None:
+    number = 20_000
+    print(f"{'algorithm':<10} {'middleware':<24} {'tokens/s':>12}")
+    for algorithm, signing_key, verification_key in cases():
+        token = jwt.encode(
+            {"sub": "alice", "aud": "api", "exp": int(time.time()) + 3600},
+            signing_key,
+            algorithm=algorithm,
+        )
+        middlewares = (
+            ("naive jwt.decode", naive_middleware(verification_key, algorithm)),
+            (
+                "JWTVerifier, no cache",
+                JWTVerifier(verification_key, [algorithm], audience="api", cache_size=0),
+            ),
+            ("JWTVerifier", JWTVerifier(verification_key, [algorithm], audience="api")),
+        )
+        for name, middleware in middlewares:
+            assert middleware(token)["sub"] == "alice"
+            elapsed = min(timeit.repeat(lambda: middleware(token), number=number, repeat=3))
+            print(f"{algorithm:<10} {name:<24} {number / elapsed:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
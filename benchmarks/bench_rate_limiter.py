@@ -0,0 +1,51 @@
+"""Cost of RateLimiterMiddleware.new_request_allowed per mode and limit.
+
+A single client sends requests at 90% of its limit, so the exact mode keeps
+close to max_requests timestamps in its window, the worst realistic case.
+
+    python -m securapi.benchmarks.bench_rate_limiter
+"""
+import time
+import tracemalloc
+from ..security.rateLimiting import MODES, RateLimiterMiddleware
+
+
+class SteppingClock:
+    def __init__(self, step: float) -> None:
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self) -> float:
+        self.now += self.step
+        return self.now
+
+
+def run(mode: str, max_requests: int, requests: int):
+    time_window = 60
+    clock = SteppingClock(time_window / (max_requests * 0.9))
+    rate_limiter = RateLimiterMiddleware(max_requests, time_window, mode=mode, clock=clock)
+    check = rate_limiter.new_request_allowed
+    start = time.perf_counter()
+    for _ in range(requests):
+        check("10.0.0.1")
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    rate_limiter = RateLimiterMiddleware(max_requests, time_window, mode=mode, clock=clock)
+    for _ in range(max_requests):
+        rate_limiter.new_request_allowed("10.0.0.1")
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed / requests * 1e9, memory
+
+
+def main() -> None:
+    requests = 100_000
+    print(f"{'mode':>15} {'max_requests':>13} {'ns/request':>11} {'bytes/client':>13}")
+    for max_requests in (10, 100, 1_000):
+        for mode in MODES:
+            ns, memory = run(mode, max_requests, requests)
+            print(f"{mode:>15} {max_requests:>13} {ns:>11.0f} {memory:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Route lookup cost against the number of registered routes.
+
+Run from the directory that contains the package:
+    python -m securapi.benchmarks.bench_router
+"""
+import logging
+import timeit
+from ..main import SecurAPI
+
+
+def build_app(route_count: int) -> SecurAPI:
+    app = SecurAPI()
+    for i in range(route_count):
+
+        @app.add_endpoint(f"/resource{i}/{{id:int}}/orders/{{order_id}}")
+        def handler(id, order_id):
+            return {"id": id, "order_id": order_id}
+
+        @app.add_endpoint(f"/static{i}/health")
+        def health():
+            return {"response": "OK"}
+
+    return app
+
+
+def main() -> None:
+    logging.disable(logging.INFO)
+    number = 200_000
+    print(f"{'routes':>8} {'static (ns)':>12} {'params (ns)':>12} {'miss (ns)':>10}")
+    for route_count in (10, 100, 1_000, 10_000):
+        app = build_app(route_count)
+        tree = app.route_tree
+        target = route_count // 2
+        static_path = f"/static{target}/health/"
+        param_path = f"/resource{target}/42/orders/abc/"
+        miss_path = f"/resource{target}/not-a-number/orders/abc/"
+        assert tree.resolve("GET", static_path) is not None
+        assert tree.resolve("GET", param_path)[1] == {"id": 42, "order_id": "abc"}
+        assert tree.resolve("GET", miss_path) is None
+        results = []
+        for path in (static_path, param_path, miss_path):
+            elapsed = min(
+                timeit.repeat(
+                    lambda: tree.resolve("GET", path), number=number, repeat=3
+                )
+            )
+            results.append(elapsed / number * 1e9)
+        print(f"{route_count * 2:>8} {results[0]:>12.0f} {results[1]:>12.0f} {results[2]:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
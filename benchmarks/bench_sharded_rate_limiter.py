@@ -0,0 +1,50 @@
+"""Throughput of ShardedRateLimiter by thread count.
+
+shards=1 is the single global lock baseline. On a GIL build threads can't run
+Python code in parallel, so the interesting numbers are on free-threaded
+CPython (python3.13t and later), where sharding lets throughput scale.
+
+    python -m securapi.benchmarks.bench_sharded_rate_limiter
+"""
+import sys
+import threading
+import time
+from ..security.shardedRateLimiting import ShardedRateLimiter
+
+
+def run(shards: int, threads: int, requests_per_thread: int) -> float:
+    rate_limiter = ShardedRateLimiter(
+        max_requests=10**9, time_window=60, mode="sliding_window", shards=shards
+    )
+    ip_addresses = [f"10.{i // 65536}.{i // 256 % 256}.{i % 256}" for i in range(4096)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(offset):
+        check = rate_limiter.new_request_allowed
+        barrier.wait()
+        for i in range(requests_per_thread):
+            check(ip_addresses[(i * 7 + offset) % 4096])
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return threads * requests_per_thread / elapsed
+
+
+def main() -> None:
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"GIL enabled: {gil}")
+    print(f"{'threads':>8} {'1 shard (req/s)':>16} {'64 shards (req/s)':>18}")
+    for threads in (1, 2, 4, 8):
+        single = run(1, threads, 50_000)
+        sharded = run(64, threads, 50_000)
+        print(f"{threads:>8} {single:>16,.0f} {sharded:>18,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import time
+from collections import OrderedDict
+from string import Formatter
+from .etags import match_etag, send_not_modified
+
+
+class CachedResponse:
+    """Encoded response kept by a ResponseCache, or shared by coalesced requests"""
+
+    __slots__ = ("status", "headers", "body", "expires", "tags", "size", "etag")
+
+    def __init__(self, status: int, headers: list, body: bytes, expires: float, tags) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires = expires
+        self.tags = tags
+        self.size = len(body) + sum(len(name) + len(value) for name, value in headers)
+        self.etag = dict(headers).get(b"etag")
+
+    async def send(self, send, if_none_match=None) -> None:
+        """Send it, or a 304 if If-None-Match has its ETag"""
+        if if_none_match and self.etag is not None:
+            matched = match_etag(if_none_match, self.etag)
+            if matched is not None:
+                await send_not_modified(send, matched)
+                return
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status,
+                "headers": self.headers,
+            }
+        )
+        await send(
+            {
+                "type": "http.response.body",
+                "body": self.body,
+            }
+        )
+
+
+class ResponseCache:
+    """LRU cache of encoded GET responses, for endpoints with a cache_ttl.\n
+    Holds at most max_entries responses and max_bytes of bodies and headers,
+    the least recently used are evicted first. Only 200 responses sent in a
+    single message are kept (not streams nor chunked JSON).\n
+    Entries can be tagged and dropped by tag with invalidate(), which endpoints
+    with invalidates=(...) call after a successful response. Tags can name
+    params of the endpoint, "product:{id}" is formatted with each request."""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.entries = OrderedDict()
+        # tag -> keys of the entries with that tag
+        self.tagged = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, key):
+        """Cached response of key, None if there is none"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry.expires > self.clock():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.remove(key)
+        self.misses += 1
+        return None
+
+    def store(self, key, status: int, headers: list, body: bytes, ttl: float, tags=()) -> None:
+        entry = CachedResponse(status, headers, body, self.clock() + ttl, tags)
+        if entry.size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.remove(key)
+        entries = self.entries
+        while entries and (
+            len(entries) >= self.max_entries or self.size + entry.size > self.max_bytes
+        ):
+            self.remove(next(iter(entries)))
+            self.evictions += 1
+        entries[key] = entry
+        self.size += entry.size
+        for tag in tags:
+            self.tagged.setdefault(tag, set()).add(key)
+
+    def remove(self, key) -> None:
+        entry = self.entries.pop(key)
+        self.size -= entry.size
+        for tag in entry.tags:
+            keys = self.tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tagged[tag]
+
+    def invalidate(self, *tags) -> int:
+        """Drop the entries with any of the tags, returns how many were cached"""
+        removed = 0
+        for tag in tags:
+            for key in list(self.tagged.get(tag, ())):
+                self.remove(key)
+                removed += 1
+        self.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.tagged.clear()
+        self.size = 0
+
+    def capture(self, key, send, ttl: float, tags=()):
+        """ASGI send that stores the response in the cache as it is sent"""
+        return CachingSend(self, key, send, ttl, tags)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class CachingSend:
+    """Wraps the ASGI send of one response and caches it if it is a 200 sent
+    in a single body message"""
+
+    __slots__ = ("cache", "key", "send", "ttl", "tags", "start")
+
+    def __init__(self, cache: ResponseCache, key, send, ttl: float, tags) -> None:
+        self.cache = cache
+        self.key = key
+        self.send = send
+        self.ttl = ttl
+        self.tags = tags
+        self.start = None
+
+    async def __call__(self, message) -> None:
+        if message["type"] == "http.response.start":
+            if message["status"] == 200:
+                self.start = message
+        elif self.start is not None:
+            start, self.start = self.start, None
+            if not message.get("more_body", False):
+                self.cache.store(
+                    self.key,
+                    start["status"],
+                    start["headers"],
+                    message.get("body", b""),
+                    self.ttl,
+                    self.tags,
+                )
+        await self.send(message)
+
+
+def tag_fields(tags) -> set:
+    """Names of the {param} placeholders of tags"""
+    return {
+        field
+        for tag in tags
+        for _, field, _, _ in Formatter().parse(tag)
+        if field is not None
+    }
+
+
+def format_tags(tags, args) -> tuple:
+    """Tags with their {param} placeholders replaced by the request params"""
+    return tuple(tag.format_map(args) if "{" in tag else tag for tag in tags)
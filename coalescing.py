@@ -0,0 +1,89 @@
+import asyncio
+from .caching import CachedResponse
+
+
+class Flight:
+    """A handler call in progress, that identical requests wait for"""
+
+    __slots__ = ("done", "response", "error", "waiters")
+
+    def __init__(self) -> None:
+        self.done = asyncio.Event()
+        self.response = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces identical concurrent requests of endpoints with coalesce=True.\n
+    The first request for a key runs the handler, the ones that arrive while it
+    runs wait for it and get the same encoded response, or the same exception.
+    More than max_waiters waiting on a key get a 503. When the response can't
+    be shared (a stream) or the first request is cancelled, the waiters run the
+    handler themselves."""
+
+    def __init__(self, max_waiters=1000) -> None:
+        self.max_waiters = max_waiters
+        self.flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def lead(self, key) -> Flight:
+        flight = self.flights[key] = Flight()
+        self.leaders += 1
+        return flight
+
+    def land(self, key, flight: Flight) -> None:
+        """Release the waiters of a flight"""
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        flight.done.set()
+
+    async def wait(self, flight: Flight):
+        """Response of the flight (a CachedResponse), None to run the handler"""
+        flight.waiters += 1
+        self.coalesced += 1
+        try:
+            await flight.done.wait()
+        finally:
+            flight.waiters -= 1
+        if flight.error is not None:
+            raise flight.error
+        return flight.response
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self.flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+
+class RecordingSend:
+    """ASGI send that keeps a response sent in a single message instead of
+    sending it. Streamed responses are passed through as they come"""
+
+    __slots__ = ("send", "start", "response", "passthrough")
+
+    def __init__(self, send) -> None:
+        self.send = send
+        self.start = None
+        self.response = None
+        self.passthrough = False
+
+    async def __call__(self, message) -> None:
+        if self.passthrough:
+            await self.send(message)
+        elif message["type"] == "http.response.start":
+            self.start = message
+        elif message.get("more_body", False):
+            self.passthrough = True
+            await self.send(self.start)
+            await self.send(message)
+        else:
+            start = self.start
+            self.response = CachedResponse(
+                start["status"], start["headers"], message.get("body", b""), 0, ()
+            )
@@ -0,0 +1,169 @@
+import zlib
+from .negotiation import HeaderCache, quality_values
+from .offloading import THREAD
+
+GZIP = "gzip"
+DEFLATE = "deflate"
+ENCODINGS = (GZIP, DEFLATE)
+# zlib window bits of each encoding, HTTP deflate is the zlib format
+WINDOW_BITS = {GZIP: 31, DEFLATE: 15}
+# Content types that are already compressed
+INCOMPRESSIBLE_TYPES = (
+    b"image/",
+    b"video/",
+    b"audio/",
+    b"application/zip",
+    b"application/gzip",
+    b"font/woff",
+)
+
+
+class Compression:
+    """gzip / deflate compression of responses, negotiated with Accept-Encoding
+    (the first of encodings wins a tie).\n
+    Bodies under min_size bytes are sent as they are. Each response gets a new
+    compressor at level: zlib can't reset a finished one, and copying a prepared
+    one costs more than a new one (bench_compression). Chunks of offload_size
+    bytes or more are compressed in the app thread pool, zlib releases the GIL,
+    so a big response doesn't stop the event loop.\n
+    Streamed and chunked responses are compressed as they are sent, each
+    message is flushed so the client gets it without waiting for the next."""
+
+    def __init__(self, min_size=1024, level=6, encodings=ENCODINGS, offload_size=128 * 1024):
+        for encoding in encodings:
+            if encoding not in WINDOW_BITS:
+                raise ValueError(
+                    f"Invalid encoding {encoding}. Allowed encodings: {', '.join(ENCODINGS)}"
+                )
+        self.min_size = min_size
+        self.level = level
+        self.encodings = tuple(encodings)
+        self.offload_size = offload_size
+        self.accept_cache = HeaderCache()
+        self.responses = 0
+        self.offloaded = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def select(self, accept_encoding):
+        """Encoding for the Accept-Encoding header value (bytes), None to send
+        the response as it is"""
+        if not accept_encoding:
+            return None
+        try:
+            return self.accept_cache[accept_encoding]
+        except KeyError:
+            pass
+        qualities = dict(quality_values(accept_encoding.decode("latin-1")))
+        selected, best = None, 0.0
+        for encoding in self.encodings:
+            quality = qualities.get(encoding, qualities.get("*", 0.0))
+            if quality > best:
+                selected, best = encoding, quality
+        self.accept_cache.store(accept_encoding, selected)
+        return selected
+
+    def wrap(self, send, encoding: str, worker_pools):
+        """ASGI send that compresses the response with encoding"""
+        return CompressingSend(self, send, encoding, worker_pools)
+
+    def stats(self) -> dict:
+        return {
+            "responses": self.responses,
+            "offloaded": self.offloaded,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+def compress_chunk(compressor, data: bytes, mode: int) -> bytes:
+    return compressor.compress(data) + compressor.flush(mode)
+
+
+def compressible(headers) -> bool:
+    for name, value in headers:
+        if name == b"content-encoding":
+            return False
+        if name == b"content-type" and value.startswith(INCOMPRESSIBLE_TYPES):
+            return False
+    return True
+
+
+class CompressingSend:
+    """Wraps the ASGI send of one response.\n
+    The start message is held until the first body one: a whole body under
+    min_size (or already compressed) goes out untouched, otherwise
+    Content-Encoding is added and Content-Length is replaced by the compressed
+    one, or dropped when more body follows. An ETag gets the encoding as a
+    suffix ("tag-gzip")."""
+
+    __slots__ = ("compression", "send", "encoding", "worker_pools", "start", "compressor")
+
+    def __init__(self, compression: Compression, send, encoding: str, worker_pools) -> None:
+        self.compression = compression
+        self.send = send
+        self.encoding = encoding
+        self.worker_pools = worker_pools
+        self.start = None
+        self.compressor = None
+
+    async def __call__(self, message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        start = self.start
+        if start is None:
+            if self.compressor is None:
+                await self.send(message)
+                return
+            more_body = message.get("more_body", False)
+            await self.send(
+                {
+                    "type": "http.response.body",
+                    "body": await self.compress(message.get("body", b""), more_body),
+                    "more_body": more_body,
+                }
+            )
+            return
+        self.start = None
+        compression = self.compression
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        headers = start["headers"]
+        small = not more_body and (not body or len(body) < compression.min_size)
+        if small or not compressible(headers):
+            await self.send(start)
+            await self.send(message)
+            return
+        compression.responses += 1
+        self.compressor = zlib.compressobj(
+            compression.level, zlib.DEFLATED, WINDOW_BITS[self.encoding]
+        )
+        body = await self.compress(body, more_body)
+        suffix = b'-%s"' % self.encoding.encode()
+        headers = [
+            # A strong ETag identifies the bytes sent, the compressed ones get their own
+            (name, value[:-1] + suffix) if name == b"etag" else (name, value)
+            for name, value in headers
+            if name != b"content-length"
+        ]
+        headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"vary", b"accept-encoding"))
+        if not more_body:
+            headers.append((b"content-length", str(len(body)).encode()))
+        await self.send({**start, "headers": headers})
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def compress(self, data: bytes, more_body: bool) -> bytes:
+        compression = self.compression
+        mode = zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH
+        if len(data) >= compression.offload_size:
+            compression.offloaded += 1
+            compressed = await self.worker_pools.run(
+                THREAD, compress_chunk, self.compressor, data, mode
+            )
+        else:
+            compressed = compress_chunk(self.compressor, data, mode)
+        compression.bytes_in += len(data)
+        compression.bytes_out += len(compressed)
+        return compressed
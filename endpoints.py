@@ -1,5 +1,7 @@
 from typing import Callable, Dict, List
 from urllib.parse import parse_qsl
+from .request import BODY_TEXT, MAX_BODY_SIZE, body_kind
+from .routing import path_param_names
 
 class Endpoint:
     handler: Callable
@@ -7,18 +9,54 @@ class Endpoint:
     path: str
     params: Dict
     required_params: List
+    path_params: List
     request_body: bool = False
+    body_kind: str = BODY_TEXT
+    max_body_size: int = MAX_BODY_SIZE
+    wants_auth: bool = False
+    wants_request: bool = False
     body_required: bool
     auth_middleware: Callable | None = None
+    constant: bool = False
+    preencoded = None
+    rate_limit_policy = None
+    auth_cache = None
+    etag: bool = False
+    etag_func: Callable | None = None
+    cache_ttl: float | None = None
+    cache_tags: tuple = ()
+    invalidates: tuple = ()
+    coalesce: bool = False
+    inline: bool = False
+    dispatch: Callable
+    allowlisted_dispatch: Callable
 
-    def __init__(self, handler: Callable, argspecs, method, body_required, auth_middleware, path: str = "/") -> None:
+    def __init__(self, handler: Callable, argspecs, method, body_required, auth_middleware, path: str = "/", constant: bool = False, rate_limit_policy=None, auth_cache=None, max_body_size=None, etag=False, etag_func=None, cache_ttl=None, cache_tags=(), invalidates=(), coalesce=False, inline=False) -> None:
         self.handler = handler
+        # An etag_func implies ETags
+        self.etag = etag or etag_func is not None
+        self.etag_func = etag_func
+        self.cache_ttl = cache_ttl
+        self.cache_tags = tuple(cache_tags)
+        self.invalidates = tuple(invalidates)
+        self.coalesce = coalesce
+        self.inline = inline
+        self.constant = constant
+        self.rate_limit_policy = rate_limit_policy
+        self.auth_cache = auth_cache
+        if max_body_size is not None:
+            self.max_body_size = max_body_size
+        self.body_kind = body_kind(argspecs.annotations.get("request_body"))
         self.method = method
         self.path = path
         self.params = {}
         self.required_params = []
         self.auth_middleware = auth_middleware
         self.body_required = body_required
+        self.path_params = path_param_names(path)
+        missing = [name for name in self.path_params if name not in argspecs.args]
+        if missing:
+            raise ValueError(f"Path parameters {missing} are not arguments of the handler")
         if argspecs.args:
             self.map_params(argspecs)
     
@@ -31,7 +69,12 @@ class Endpoint:
             while req_left != 0:
                 if argspecs.args[index] == "request_body":
                     self.request_body = True
-
+                elif argspecs.args[index] == "auth":
+                    self.wants_auth = True
+                elif argspecs.args[index] == "request":
+                    self.wants_request = True
+                elif argspecs.args[index] in self.path_params:
+                    pass
                 else:
                     self.params[argspecs.args[index]] = ""
                     self.required_params.append(argspecs.args[index])
@@ -40,6 +83,12 @@ class Endpoint:
         while index != number_of_params:
             if argspecs.args[index] == "request_body":
                 self.request_body = True
+            elif argspecs.args[index] == "auth":
+                self.wants_auth = True
+            elif argspecs.args[index] == "request":
+                self.wants_request = True
+            elif argspecs.args[index] in self.path_params:
+                pass
             else:
                 self.params[argspecs.args[index]] = argspecs.defaults[index - required_params]
             index += 1
@@ -48,7 +97,7 @@ class Endpoint:
         if not q_params:
             if self.required_params:
                 raise ValueError(f"Missing required parameters: {self.required_params}")
-            return self.params
+            return self.params.copy()
         pairs = parse_qsl(q_params, keep_blank_values=True)
         new_params = self.params.copy()
         remaining_required = set(self.required_params)
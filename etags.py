@@ -0,0 +1,48 @@
+import hashlib
+from .compression import ENCODINGS
+
+# Compressed responses carry the ETag of the uncompressed one with this suffix
+ENCODING_SUFFIXES = tuple(b'-%s"' % encoding.encode() for encoding in ENCODINGS)
+
+
+def body_etag(body) -> bytes:
+    """Strong ETag of an encoded body, a 128 bit blake2b of its bytes"""
+    return b'"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest().encode()
+
+
+def version_etag(version, media_type: str) -> bytes:
+    """ETag of a version returned by an etag_func. The media type is part of it,
+    each serializer encodes the same version differently"""
+    digest = hashlib.blake2b(f"{media_type}\0{version}".encode(), digest_size=16)
+    return b'"%s"' % digest.hexdigest().encode()
+
+
+def match_etag(if_none_match, etag: bytes):
+    """The If-None-Match tag that matches etag (weak comparison, compressed
+    variants included), None if none does or the response has no etag"""
+    if not if_none_match or etag is None:
+        return None
+    if if_none_match.strip() == b"*":
+        return etag
+    for tag in if_none_match.split(b","):
+        tag = tag.strip()
+        if tag.startswith(b"W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return tag
+        for suffix in ENCODING_SUFFIXES:
+            if tag.endswith(suffix) and tag[: -len(suffix)] == etag[:-1]:
+                return tag
+    return None
+
+
+async def send_not_modified(send, etag: bytes) -> None:
+    """Header only 304, with the tag the client already has"""
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 304,
+            "headers": [(b"etag", etag)],
+        }
+    )
+    await send({"type": "http.response.body", "body": b""})
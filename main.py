@@ -1,15 +1,80 @@
+import asyncio
 import inspect
+from functools import partial
 from typing import Callable
+from .caching import ResponseCache, format_tags, tag_fields
+from .coalescing import RecordingSend, SingleFlight
+from .compression import Compression
 from .endpoints import Endpoint
-import json
+from .etags import body_etag, match_etag, send_not_modified, version_etag
+from .offloading import THREAD, WorkerPools, offload_pool
+from .request import (
+    BODY_BYTES,
+    BODY_MEMORYVIEW,
+    BODY_STREAM,
+    Request,
+    check_content_length,
+    content_length,
+    find_header,
+    iter_body,
+    read_body,
+)
+from .routing import RouteTree
+from .responses import (
+    AUTH_REQUIRED,
+    BINARY_TYPES,
+    FORBIDDEN,
+    JSON_ENCODER,
+    NOT_ACCEPTABLE,
+    ONLY_HTTP_ACCEPTED,
+    SERVER_ERROR,
+    SERVICE_UNAVAILABLE,
+    PreencodedResponse,
+    StreamingResponse,
+    is_stream,
+    json_response,
+    not_found_response,
+    rate_limited_response,
+    send_pieces,
+)
+from .serializers import JSONSerializer, Serializer, SerializerRegistry
 from http import HTTPStatus
 import logging
-from .security.rateLimiting import RateLimiterMiddleware, RateLimitException
+from .security.authCache import MISS, AuthCache
+from .security.ipFiltering import ALLOW, DENY, IPFilter
+from .security.rateLimiting import (
+    RateLimiterMiddleware,
+    RateLimitException,
+    RateLimitPolicy,
+)
+
+
+DEFAULT_STATUS = {
+    "GET": 200,
+    "POST": 201,
+    "PUT": 200,
+    "DELETE": 204,
+    "PATCH": 200,
+    "HEAD": 200,
+    "OPTIONS": 200,
+}
 
 
 class SecurAPI:
 
-    def __init__(self, allowed_methods=None, rate_limiter=None) -> None:
+    def __init__(
+        self,
+        allowed_methods=None,
+        rate_limiter=None,
+        allowlist=None,
+        denylist=None,
+        max_workers=None,
+        serializers=None,
+        compression=None,
+        response_cache=None,
+        single_flight=None,
+        offload_auth=False,
+    ) -> None:
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.INFO)
         if not self.logger.handlers:
@@ -29,11 +94,38 @@ class SecurAPI:
         else:
             self.allowed_methods = {"GET", "POST", "PUT", "DELETE"}
         self.routes = {m: {} for m in self.allowed_methods}
+        self.method_not_allowed = json_response(
+            405, {"error": f"only {', '.join(self.allowed_methods)} requests accepted"}
+        )
+        self.route_tree = RouteTree(self.allowed_methods)
         self.logger.info("SecurAPI initialized")
         if rate_limiter is not None and isinstance(rate_limiter, RateLimiterMiddleware):
             self.rate_limiter = rate_limiter
+            self.rate_limit_policy = RateLimitPolicy(rate_limiter)
         else:
             self.rate_limiter = None
+            self.rate_limit_policy = None
+        # CIDR lists checked before anything else, see IPFilter
+        self.ip_filter = IPFilter(allowlist or (), denylist or ())
+        # Where sync handlers and functions marked with cpu_bound run
+        self.worker_pools = WorkerPools(max_workers)
+        # Run every sync auth_middleware in the thread pool, not only cpu_bound ones
+        self.offload_auth = offload_auth
+        # How responses are encoded, picked by the Accept header. The first is the default
+        self.serializers = SerializerRegistry(serializers or (JSONSerializer(),))
+        if compression is not None and not isinstance(compression, Compression):
+            raise ValueError("compression must be a Compression")
+        # Off unless given, see Compression
+        self.compression = compression
+        if response_cache is not None and not isinstance(response_cache, ResponseCache):
+            raise ValueError("response_cache must be a ResponseCache")
+        # Shared by the endpoints with a cache_ttl
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        if single_flight is not None and not isinstance(single_flight, SingleFlight):
+            raise ValueError("single_flight must be a SingleFlight")
+        # Shared by the endpoints with coalesce=True
+        self.single_flight = single_flight if single_flight is not None else SingleFlight()
+        self.background_tasks = []
 
     def __call__(self, scope):
         """ASGI interface - returns a coroutine that takes (receive, send)"""
@@ -43,208 +135,468 @@ class SecurAPI:
 
         return asgi_wrapper
 
+    def add_serializer(self, serializer: Serializer) -> None:
+        """Serve responses in one more media type, to clients that ask for it in
+        their Accept header. Replaces the serializer of the same media type"""
+        self.serializers.register(serializer)
+
     def is_valid_route(self, path, method) -> bool:
-        return path in self.routes[method]
+        return self.route_tree.resolve(method, path) is not None
+
+    def rate_limiters(self) -> list:
+        """Every distinct limiter used by the app and its endpoints"""
+        rate_limiters = {}
+        if self.rate_limiter is not None:
+            rate_limiters[id(self.rate_limiter)] = self.rate_limiter
+        for routes in self.routes.values():
+            for endpoint in routes.values():
+                if endpoint.rate_limit_policy is not None:
+                    rate_limiter = endpoint.rate_limit_policy.rate_limiter
+                    rate_limiters[id(rate_limiter)] = rate_limiter
+        return list(rate_limiters.values())
+
+    async def lifespan(self, receive, send):
+        """ASGI lifespan protocol: starts and stops the app background tasks"""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                for rate_limiter in self.rate_limiters():
+                    self.background_tasks.append(
+                        asyncio.create_task(rate_limiter.run_sweeper())
+                    )
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for task in self.background_tasks:
+                    task.cancel()
+                await asyncio.gather(*self.background_tasks, return_exceptions=True)
+                self.background_tasks.clear()
+                # Distributed limiters hold connections to their store
+                for rate_limiter in self.rate_limiters():
+                    if rate_limiter.is_async:
+                        await rate_limiter.close()
+                self.worker_pools.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
 
     async def request_manager(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
         try:
-            if self.rate_limiter is not None and scope["type"] == "http":
-                
-                if not self.rate_limiter.new_request_allowed(scope["client"][0]):
-                    raise RateLimitException("Rate limit exceeded")
-            if scope["type"] not in ["http", "lifespan"]:
+            if scope["type"] != "http":
                 raise ValueError(
                     f"Expected HTTP scope, got {scope['type']}."
                     "Only HTTP requests are supported."
                 )
+            # Denied clients never reach the rate limiter, allowlisted ones skip it
+            verdict = self.ip_filter.check(scope["client"][0]) if self.ip_filter else 0
+            if verdict == DENY:
+                await FORBIDDEN.send(send)
+                return
+            rate_limited = self.rate_limit_policy is not None and verdict != ALLOW
             method = scope["method"].upper()
             path = scope["path"]
             if not path.endswith("/"):
                 path += "/"
-            q_params = scope["query_string"].decode()
 
+            # Matched endpoints check their own rate limit policy in their dispatch plan
             if method not in self.allowed_methods:
-                await self.bad_request(
-                    405,
-                    {"error": f"only {', '.join(self.allowed_methods)} requests accepted"},
-                    send,
-                )
+                if rate_limited:
+                    await self.rate_limit_policy.check_async(scope)
+                await self.method_not_allowed.send(send)
                 return
-            if not self.is_valid_route(path, method):
-                response_body = json.dumps({"error": f"Path {path} not found"})
-                content_length = str(len(response_body.encode("utf-8")))
-                await send(
-                    {
-                        "type": "http.response.start",
-                        "status": 404,  # Not found
-                        "headers": [
-                            (b"content-type", b"application/json"),
-                            (b"content-length", content_length.encode()),
-                        ],
-                    }
-                )
-                await send(
-                    {
-                        "type": "http.response.body",
-                        "body": response_body.encode("utf-8"),
-                    }
-                )
+            route = self.route_tree.resolve(method, path)
+            if route is None:
+                if rate_limited:
+                    await self.rate_limit_policy.check_async(scope)
+                await not_found_response(path).send(send)
             else:
-                headers = scope["headers"]
-                await self.router(method, path, headers, q_params, receive, send)
+                endpoint, path_params = route
+                if verdict == ALLOW:
+                    await endpoint.allowlisted_dispatch(scope, path_params, receive, send)
+                else:
+                    await endpoint.dispatch(scope, path_params, receive, send)
         except RateLimitException as e:
             self.logger.warning(e)
-            await send(
-                {
-                    "type": "http.response.start",
-                    "status": 429,  # Too many requests
-                    "headers": [
-                        (b"content-type", b"application/json"),
-                        (b"content-length", b"26"),
-                    ],
-                }
-            )
-            await send(
-                {
-                    "type": "http.response.body",
-                    "body": b"ERROR: Rate limit exceeded",
-                }
-            )
+            await rate_limited_response(e.retry_after).send(send)
         except ValueError as e:
             self.logger.exception(e)
+            await ONLY_HTTP_ACCEPTED.send(send)
+
+    def compile_dispatch(self, endpoint: Endpoint, rate_limited=True) -> Callable:
+        """Build the request handler for an endpoint once, at registration.\n
+        Everything that only depends on the endpoint definition (async handler,
+        params, body, auth, default status code) is resolved here, so a request
+        only pays for the steps its endpoint actually needs.\n
+        rate_limited=False builds the plan for allowlisted clients, without any
+        rate limit check."""
+        handler = endpoint.handler
+        is_async = inspect.iscoroutinefunction(handler)
+        default_status = DEFAULT_STATUS[endpoint.method]
+        auth_middleware = endpoint.auth_middleware
+        auth_cache = endpoint.auth_cache
+        # Async and cpu_bound auth middlewares are awaited, sync ones called inline
+        # unless the app has offload_auth
+        auth_pool = offload_pool(auth_middleware)
+        if (
+            auth_pool is None
+            and self.offload_auth
+            and auth_middleware is not None
+            and not is_async_callable(auth_middleware)
+        ):
+            auth_pool = THREAD
+        auth_is_async = auth_pool is not None or is_async_callable(auth_middleware)
+        worker_pools = self.worker_pools
+        if auth_pool is not None:
+
+            async def validate(token):
+                return await worker_pools.run(auth_pool, auth_middleware, token)
+
+        else:
+            validate = auth_middleware
+        # Sync handlers run in the thread pool (or the pool of cpu_bound) so a
+        # blocking one doesn't stall the event loop, inline=True calls them here.
+        # Calling a generator function runs none of its code, its items are pulled
+        # in the thread pool when the response is streamed (stream_offload)
+        handler_pool = None
+        if not (
+            is_async
+            or endpoint.inline
+            or inspect.isgeneratorfunction(handler)
+            or inspect.isasyncgenfunction(handler)
+        ):
+            handler_pool = offload_pool(handler) or THREAD
+        stream_offload = None if endpoint.inline else partial(worker_pools.run, THREAD)
+        wants_auth = endpoint.wants_auth
+        wants_request = endpoint.wants_request
+        etag = endpoint.etag
+        etag_func = endpoint.etag_func
+        etag_func_is_async = inspect.iscoroutinefunction(etag_func)
+        # Auth reads the Authorization header from the request header index,
+        # etag_func gets the request
+        builds_request = (
+            wants_request or auth_middleware is not None or etag_func is not None
+        )
+        has_params = bool(endpoint.params)
+        has_path_params = bool(endpoint.path_params)
+        wants_body = endpoint.request_body
+        body_kind = endpoint.body_kind
+        max_body_size = endpoint.max_body_size
+        body_required = endpoint.body_required
+        needs_args = (
+            has_params or has_path_params or wants_body or wants_auth or wants_request
+        )
+        is_constant = endpoint.constant
+        # The endpoint policy replaces the app one, a request is checked at most
+        # once by each (only principal keyed policies leave the app one in front)
+        policy = endpoint.rate_limit_policy or self.rate_limit_policy
+        if policy is not None and policy.key == "principal" and auth_middleware is None:
+            raise ValueError("Rate limits keyed by principal need an auth_middleware")
+        if not rate_limited:
+            policy = None
+        limit_after_auth = (
+            policy is not None and policy.uses_principal and auth_middleware is not None
+        )
+        limit_before_auth = policy is not None and not limit_after_auth
+        # Failed authentications never get a principal, the client address is
+        # limited in front of auth: by the app limiter when there is one, if not
+        # failures are counted by address in the endpoint limiter
+        address_policy = None
+        if limit_after_auth:
+            address_policy = self.rate_limit_policy or RateLimitPolicy(policy.rate_limiter)
+        counts_failed_auth = limit_after_auth and self.rate_limit_policy is None
+        async_limit = policy is not None and policy.is_async
+        logger = self.logger
+        serializers = self.serializers
+        compression = self.compression
+        response_cache = self.response_cache
+        cache_ttl = endpoint.cache_ttl
+        cache_tags = endpoint.cache_tags
+        invalidates = endpoint.invalidates
+        coalesce = endpoint.coalesce
+        single_flight = self.single_flight
+        endpoint_path = endpoint.path
+
+        async def call_handler(args):
+            if handler_pool is not None:
+                return await worker_pools.run(handler_pool, partial(handler, **args))
+            if needs_args:
+                if is_async:
+                    return await handler(**args)
+                return handler(**args)
+            if is_async:
+                return await handler()
+            return handler()
+
+        async def lead(key, args, send, serializer, etag_header, if_none_match):
+            """Run the handler for the requests of key that arrive meanwhile"""
+            flight = single_flight.lead(key)
+            recorder = RecordingSend(send)
+            try:
+                response = await call_handler(args)
+                # Encoded once for everyone, each request checks its own If-None-Match
+                await respond(response, recorder, serializer, etag_header)
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                flight.response = recorder.response
+                single_flight.land(key, flight)
+            if recorder.response is not None:
+                await recorder.response.send(send, if_none_match)
+
+        async def respond(response, send, serializer, etag_header=None, if_none_match=None):
+            status_code, content = split_response(response, default_status)
+            if status_code != 200:
+                etag_header = None
+            if isinstance(content, (dict, list)):
+                if serializer.is_large(content):
+                    headers = response_headers(serializer, serializers)
+                    if etag_header is not None:
+                        headers.append((b"etag", etag_header))
+                    # Only bodies sent before they are whole go without an ETag
+                    # of their bytes, the ones that fit in a message get it
+                    send_whole = None
+                    if etag:
+                        send_whole = partial(
+                            send_body, send, status_code, serializer, etag_header, if_none_match
+                        )
+                    pieces = serializer.pieces(content)
+                    await send_pieces(send, status_code, pieces, headers, logger, send_whole)
+                    return
+                response_bytes = serializer.encode(content)
+            elif isinstance(content, BINARY_TYPES):
+                # Already serialized by the handler, sent as is
+                response_bytes = content if type(content) is bytes else bytes(content)
+            elif isinstance(content, PreencodedResponse):
+                await content.send(send)
+                return
+            elif is_stream(content):
+                if not isinstance(content, StreamingResponse):
+                    content = StreamingResponse(content)
+                await content.send(send, status_code, logger, stream_offload)
+                return
+            else:
+                response_bytes = serializer.encode(content)
+            await send_body(
+                send, status_code, serializer, etag_header, if_none_match, response_bytes
+            )
+
+        async def send_body(
+            send, status_code, serializer, etag_header, if_none_match, response_bytes
+        ):
+            headers = response_headers(serializer, serializers)
+            if etag and status_code == 200:
+                if etag_header is None:
+                    etag_header = body_etag(response_bytes)
+                    matched = match_etag(if_none_match, etag_header)
+                    if matched is not None:
+                        await send_not_modified(send, matched)
+                        return
+                headers.append((b"etag", etag_header))
+            headers.append((b"content-length", str(len(response_bytes)).encode()))
             await send(
                 {
                     "type": "http.response.start",
-                    "status": 400,  # BAD request
-                    "headers": [
-                        (b"content-type", b"application/json"),
-                        (b"content-length", b"34"),
-                    ],
+                    "status": status_code,
+                    "headers": headers,
                 }
             )
             await send(
                 {
                     "type": "http.response.body",
-                    "body": b"ERROR: only http requests accepted",
+                    "body": response_bytes,
                 }
             )
 
-            
+        async def build_args(scope, path_params, receive, request):
+            if has_params:
+                args = endpoint.update_params(scope["query_string"].decode())
+            else:
+                args = {}
+            if has_path_params:
+                args.update(path_params)
+            if wants_body:
+                if request is not None:
+                    body = request.stream() if body_kind == BODY_STREAM else await request.body()
+                else:
+                    check_content_length(content_length(scope["headers"]), max_body_size)
+                    if body_kind == BODY_STREAM:
+                        body = iter_body(receive, max_body_size)
+                    else:
+                        body = await read_body(receive, max_body_size)
+                if body_kind == BODY_STREAM:
+                    # Whether it is empty is only known once the handler reads it
+                    args["request_body"] = body
+                elif body:
+                    if body_kind == BODY_BYTES:
+                        body = bytes(body)
+                    elif body_kind == BODY_MEMORYVIEW:
+                        body = memoryview(body)
+                    else:
+                        body = body.decode("utf-8")
+                    args["request_body"] = body
+                elif body_required:
+                    raise ValueError("Missing required request body")
+            if wants_request:
+                args["request"] = request
+            return args
 
-    async def router(self, method, path, headers, q_params, receive, send):
-        default_status = {
-            "GET": 200,
-            "POST": 201,
-            "PUT": 200,
-            "DELETE": 204,
-            "PATCH": 200,
-            "HEAD": 200,
-            "OPTIONS": 200,
-        }
+        if is_constant:
+            if needs_args:
+                raise ValueError("Constant endpoints can't take params or a request body")
+            if etag_func is not None:
+                raise ValueError("Constant endpoints take etag=True instead of an etag_func")
 
-        try:
-            endpoint: Endpoint = self.routes[method][path]
-            args = {}
-            if endpoint.auth_middleware:
-                auth_header = None
-                for header in headers:
-                    if header[0].decode().lower() == "authorization":
-                        auth_header = header[1].decode()
-                        break
-                if auth_header is None or not auth_header.startswith("Bearer "):
-                    await self.bad_request(
-                        401, {"response": "Authentication required"}, send
+            def preencode(response) -> PreencodedResponse:
+                """Encoded with the default serializer, the ETag is computed once too"""
+                status_code, body = encode_response(
+                    response, default_status, serializers.default
+                )
+                headers = [serializers.default.content_type]
+                if etag and status_code == 200:
+                    headers.append((b"etag", body_etag(body)))
+                return PreencodedResponse(status_code, body, headers)
+
+            # Sync handlers are encoded now, async ones on their first request.
+            # Kept in the endpoint so every plan of the endpoint shares it
+            if not is_async and endpoint.preencoded is None:
+                endpoint.preencoded = preencode(handler())
+
+            async def call_constant(send, if_none_match):
+                if endpoint.preencoded is None:
+                    endpoint.preencoded = preencode(await handler())
+                if if_none_match is not None:
+                    etag_header = dict(endpoint.preencoded.headers).get(b"etag")
+                    matched = match_etag(if_none_match, etag_header)
+                    if matched is not None:
+                        await send_not_modified(send, matched)
+                        return
+                await endpoint.preencoded.send(send)
+
+        async def dispatch(scope, path_params, receive, send):
+            try:
+                request = (
+                    Request(scope, receive, path_params, max_body_size)
+                    if builds_request
+                    else None
+                )
+                if limit_before_auth:
+                    if async_limit:
+                        await policy.check_async(scope)
+                    else:
+                        policy.check(scope)
+                elif counts_failed_auth:
+                    address_policy.check_blocked(scope)
+                elif address_policy is not None:
+                    await address_policy.check_async(scope)
+                if auth_middleware is not None:
+                    token = bearer_token(request.raw_header(b"authorization"))
+                    if auth_is_async:
+                        principal = await authenticate_async(validate, token, auth_cache)
+                    else:
+                        principal = authenticate(auth_middleware, token, auth_cache)
+                    if not principal:
+                        if counts_failed_auth:
+                            await address_policy.check_async(scope)
+                        await AUTH_REQUIRED.send(send)
+                        return
+                    if limit_after_auth:
+                        if async_limit:
+                            await policy.check_async(scope, principal)
+                        else:
+                            policy.check(scope, principal)
+                if compression is not None:
+                    encoding = compression.select(
+                        request_header(scope, request, b"accept-encoding")
                     )
+                    if encoding is not None:
+                        send = compression.wrap(send, encoding, worker_pools)
+                if_none_match = None
+                if etag:
+                    if_none_match = request_header(scope, request, b"if-none-match")
+                if is_constant:
+                    await call_constant(send, if_none_match)
                     return
-                token = auth_header.split(" ")[1]
-                valid_token = endpoint.auth_middleware(token)
-                if not valid_token:
-                    await self.bad_request(
-                        401, {"response": "Authentication required"}, send
+                serializer = serializers.default
+                if serializers.negotiated:
+                    # Before the handler runs, it has no use if nothing fits
+                    serializer = serializers.select(request_header(scope, request, b"accept"))
+                    if serializer is None:
+                        await NOT_ACCEPTABLE.send(send)
+                        return
+                etag_header = None
+                if etag_func is not None:
+                    # A cheap version of the resource, a match skips the handler
+                    if etag_func_is_async:
+                        version = await etag_func(request)
+                    else:
+                        version = etag_func(request)
+                    if version is not None:
+                        etag_header = version_etag(version, serializer.media_type)
+                        matched = match_etag(if_none_match, etag_header)
+                        if matched is not None:
+                            await send_not_modified(send, matched)
+                            return
+                args = {}
+                if needs_args:
+                    args = await build_args(scope, path_params, receive, request)
+                if cache_ttl is not None or coalesce:
+                    # Keyed on the params as the handler gets them, not on the raw
+                    # query string, so their order and unknown ones don't matter.
+                    # The token is kept as its hash, like in AuthCache
+                    key = (
+                        endpoint_path,
+                        serializer.media_type,
+                        AuthCache.key(token) if wants_auth else None,
+                        tuple(args.items()),
                     )
-                    return
-                
-            if endpoint.request_body or endpoint.params:
-                if endpoint.params:
-                    response_params = endpoint.update_params(q_params)
-                    args = response_params
-                if endpoint.request_body:
-                    request_body = (await read_body(receive)).decode("utf-8")
-                    if not request_body and endpoint.body_required:
-                        await self.bad_request(
-                            400, {"error": "Missing required request body"}, send
-                        )
+                if cache_ttl is not None:
+                    cached = response_cache.lookup(key)
+                    if cached is not None:
+                        await cached.send(send, if_none_match)
                         return
-                    elif request_body:
-                        args["request_body"] = request_body
-
-                if inspect.iscoroutinefunction(endpoint.handler):
-                    response = await endpoint.handler(**args)
-                else:
-                    response = endpoint.handler(**args)
-            else:
-                if inspect.iscoroutinefunction(endpoint.handler):
-                    response = await endpoint.handler()
+                    send = response_cache.capture(
+                        key, send, cache_ttl, format_tags(cache_tags, args)
+                    )
+                if wants_auth:
+                    args["auth"] = principal
+                if coalesce:
+                    flight = single_flight.flights.get(key)
+                    if flight is None:
+                        await lead(key, args, send, serializer, etag_header, if_none_match)
+                        return
+                    if flight.waiters >= single_flight.max_waiters:
+                        single_flight.rejected += 1
+                        await SERVICE_UNAVAILABLE.send(send)
+                        return
+                    recorded = await single_flight.wait(flight)
+                    if recorded is not None:
+                        await recorded.send(send, if_none_match)
+                        return
+                    # Streamed or cancelled, this request runs the handler itself
+                response = await call_handler(args)
+                if invalidates:
+                    status_code = response[0] if isinstance(response, tuple) else default_status
+                    if 200 <= status_code < 300:
+                        response_cache.invalidate(*format_tags(invalidates, args))
+                await respond(response, send, serializer, etag_header, if_none_match)
+            except (ValueError, TypeError, KeyError) as e:
+                logger.exception(e)
+                if isinstance(e, ValueError) and "Invalid HTTP status code" in str(e):
+                    await self.internal_error(send)
+                elif isinstance(e, TypeError):
+                    await self.internal_error(send)
                 else:
-                    response = endpoint.handler()
-            if isinstance(response, tuple):
-                status_code = response[0]
-                if not valid_status_code(status_code):
-                    raise ValueError("Invalid HTTP status code returned by endpoint")
-                response_body = json.dumps(response[1])
-            else:
-                status_code = default_status[method]
-                response_body = json.dumps(response)
+                    await self.bad_request(400, {"error": str(e)}, send)
 
-            if not isinstance(status_code, int):
-                raise TypeError("Status code MUST be an integer")
-            content_length = str(len(response_body))
-            await send(
-                {
-                    "type": "http.response.start",
-                    "status": status_code,
-                    "headers": [
-                        (b"content-type", b"application/json"),
-                        (b"content-length", content_length.encode()),
-                    ],
-                }
-            )
-            await send(
-                {
-                    "type": "http.response.body",
-                    "body": response_body.encode(),
-                }
-            )
-            return
-        except (ValueError, TypeError, KeyError) as e:
-            self.logger.exception(e)
-            if isinstance(e, ValueError) and "Invalid HTTP status code" in str(e):
-                await self.internal_error(send)
-            elif isinstance(e, TypeError):
-                await self.internal_error(send)
-            else:
-                await self.bad_request(400, {"error": str(e)}, send)
+        return dispatch
 
     async def internal_error(self, send) -> None:
-        await send(
-            {
-                "type": "http.response.start",
-                "status": 500,
-                "headers": [
-                    (b"content-type", b"application/json"),
-                    (b"content-length", b"27"),
-                ],
-            }
-        )
-        await send(
-            {
-                "type": "http.response.body",
-                "body": b'{"response":"Server Error"}',
-            }
-        )
+        await SERVER_ERROR.send(send)
 
     async def bad_request(self, status_code: int, message: dict, send):
-        response_body = json.dumps(message)
+        response_body = JSON_ENCODER.encode(message)
         response_bytes = response_body.encode("utf-8")
         await send(
             {
@@ -264,11 +616,69 @@ class SecurAPI:
         )
 
     # Endpoints decorators:
-    def add_endpoint(self, path: str, method: str = "GET", auth_middleware=None) -> Callable:
+    def add_endpoint(
+        self,
+        path: str,
+        method: str = "GET",
+        auth_middleware=None,
+        constant=False,
+        rate_limit=None,
+        auth_cache=None,
+        max_body_size=None,
+        etag=False,
+        etag_func=None,
+        cache_ttl=None,
+        cache_tags=(),
+        invalidates=(),
+        coalesce=False,
+        inline=False,
+    ) -> Callable:
         """Add endpoint (default: GET).\n
         The return must be a dict with this fields: {"status": httpstatusCode, "response": responseBody}\n
         To accept query params, add parameters to the function.\n
-        To make the query params optional, add a default to the parameter"""
+        To make the query params optional, add a default to the parameter\n
+        Path parameters are declared in the path: /users/{id:int}/orders/{order_id}/
+        (types: str (default), int, float and the catch-all {path:*}) and passed
+        to the handler argument with the same name\n
+        With constant=True the handler takes no arguments and is called only once,
+        its encoded response is reused for every request\n
+        rate_limit (a RateLimiterMiddleware or a RateLimitPolicy) replaces the app
+        rate limiter for this endpoint\n
+        auth_cache (an AuthCache) reuses the auth_middleware result of tokens seen
+        recently instead of validating them again\n
+        auth_middleware can be an async function, and sync ones marked with
+        cpu_bound (or all of them, with SecurAPI(offload_auth=True)) run in the
+        app worker pools. What it returns is passed to the
+        handler argument named auth\n
+        A handler argument named request receives the Request, with lazily parsed
+        headers, query, cookies, client address and body\n
+        request_body is a str by default, annotate it as bytes, memoryview or
+        AsyncIterator[bytes] (the chunks as they arrive) to skip the decoding.
+        Bodies over max_body_size bytes (default 1MB) are rejected, from their
+        Content-Length when the client sends one\n
+        Handlers can return a generator, an async generator or a StreamingResponse
+        to send the response in chunks as it is produced\n
+        Responses are encoded by the serializer the Accept header asks for (JSON
+        by default, see add_serializer). bytes are sent as they are, and a
+        PreencodedResponse with its own status and headers\n
+        With SecurAPI(compression=Compression()) responses are compressed with
+        the gzip or deflate the client accepts\n
+        etag=True (GET only) adds an ETag hashed from the encoded body and answers
+        a matching If-None-Match with a 304 without body. etag_func(request)
+        returns a cheap version of the resource (or None) and is called before
+        the handler, which doesn't run when the client has that version\n
+        cache_ttl (GET only) keeps the encoded response in the app ResponseCache
+        for cache_ttl secs, per params (and token, for handlers that take auth).
+        It is tagged with cache_tags, and endpoints with invalidates drop the
+        entries of those tags after a 2xx response. Tags can name params, as in
+        product:{id}\n
+        coalesce=True (GET only) runs the handler once for identical requests
+        (same params and token) that arrive while it runs, they all get its
+        encoded response. See SingleFlight\n
+        Sync handlers, and the items of the sync generators they stream, run in
+        the app thread pool (SecurAPI(max_workers=...)), so one that blocks doesn't
+        hold the other requests. inline=True runs them on the event loop instead,
+        for trivially fast ones"""
 
         def decorator(handler: Callable):
             try:
@@ -279,6 +689,46 @@ class SecurAPI:
                 if auth_middleware is not None:
                     if not callable(auth_middleware):
                         raise ValueError("auth_middleware must be a callable function")
+                if auth_cache is not None:
+                    if not isinstance(auth_cache, AuthCache):
+                        raise ValueError("auth_cache must be an AuthCache")
+                    if auth_middleware is None:
+                        raise ValueError("auth_cache needs an auth_middleware")
+                if "auth" in inspect.getfullargspec(handler).args and auth_middleware is None:
+                    raise ValueError("The auth argument needs an auth_middleware")
+                if etag_func is not None and not callable(etag_func):
+                    raise ValueError("etag_func must be a callable function")
+                if (etag or etag_func is not None) and method != "GET":
+                    raise ValueError("ETags are only supported on GET endpoints")
+                if cache_ttl is not None:
+                    if method != "GET" or constant:
+                        raise ValueError(
+                            "cache_ttl is only supported on non constant GET endpoints"
+                        )
+                    if {"request", "request_body"} & set(inspect.getfullargspec(handler).args):
+                        raise ValueError("Cached endpoints can't take the request or its body")
+                if coalesce:
+                    if method != "GET" or constant:
+                        raise ValueError(
+                            "coalesce is only supported on non constant GET endpoints"
+                        )
+                    if {"request", "request_body"} & set(inspect.getfullargspec(handler).args):
+                        raise ValueError("Coalesced endpoints can't take the request or its body")
+                missing = tag_fields((*cache_tags, *invalidates)) - set(
+                    inspect.getfullargspec(handler).args
+                )
+                if missing:
+                    raise ValueError(
+                        f"Cache tags use {missing}, which are not arguments of the handler"
+                    )
+                if isinstance(rate_limit, RateLimiterMiddleware):
+                    rate_limit_policy = RateLimitPolicy(rate_limit)
+                elif rate_limit is None or isinstance(rate_limit, RateLimitPolicy):
+                    rate_limit_policy = rate_limit
+                else:
+                    raise ValueError(
+                        "rate_limit must be a RateLimiterMiddleware or a RateLimitPolicy"
+                    )
                 formated_path = path
                 argspec = inspect.getfullargspec(handler)
                 body_required = False
@@ -290,8 +740,40 @@ class SecurAPI:
                 if not path.endswith("/"):
                     formated_path = path + "/"
                 endpoint = Endpoint(
-                    handler, argspec, method, body_required, auth_middleware, formated_path
+                    handler,
+                    argspec,
+                    method,
+                    body_required,
+                    auth_middleware,
+                    formated_path,
+                    constant=constant,
+                    rate_limit_policy=rate_limit_policy,
+                    auth_cache=auth_cache,
+                    max_body_size=max_body_size,
+                    etag=etag,
+                    etag_func=etag_func,
+                    cache_ttl=cache_ttl,
+                    cache_tags=cache_tags,
+                    invalidates=invalidates,
+                    coalesce=coalesce,
+                    inline=inline,
                 )
+                if cache_ttl is not None or coalesce:
+                    # Params end up in the cache and coalescing keys
+                    try:
+                        hash(tuple(endpoint.params.items()))
+                    except TypeError:
+                        raise ValueError(
+                            "Cached and coalesced endpoints need hashable param defaults"
+                        )
+                endpoint.dispatch = self.compile_dispatch(endpoint)
+                if endpoint.rate_limit_policy or self.rate_limit_policy:
+                    endpoint.allowlisted_dispatch = self.compile_dispatch(
+                        endpoint, rate_limited=False
+                    )
+                else:
+                    endpoint.allowlisted_dispatch = endpoint.dispatch
+                self.route_tree.add(method, formated_path, endpoint)
                 self.routes[method][formated_path] = endpoint
                 return handler
             except (ValueError) as e:
@@ -301,6 +783,103 @@ class SecurAPI:
         return decorator
 
 
+def encode_response(response, default_status: int, serializer: Serializer):
+    """Return (status_code, body bytes) for a handler return value"""
+    status_code, response = split_response(response, default_status)
+    if isinstance(response, BINARY_TYPES):
+        return status_code, bytes(response)
+    return status_code, serializer.encode(response)
+
+
+def request_header(scope, request, name: bytes):
+    """Raw value of a request header (lowercase name), from the Request when
+    the endpoint builds one"""
+    if request is not None:
+        return request.raw_header(name)
+    return find_header(scope["headers"], name)
+
+
+def response_headers(serializer: Serializer, serializers: SerializerRegistry) -> list:
+    """Headers of an encoded response, Vary tells caches it depends on Accept"""
+    if serializers.negotiated:
+        return [serializer.content_type, (b"vary", b"accept")]
+    return [serializer.content_type]
+
+
+def split_response(response, default_status: int):
+    """Return (status_code, content) for a handler return value"""
+    if isinstance(response, tuple):
+        status_code = response[0]
+        if not valid_status_code(status_code):
+            raise ValueError("Invalid HTTP status code returned by endpoint")
+        response = response[1]
+    else:
+        status_code = default_status
+    if not isinstance(status_code, int):
+        raise TypeError("Status code MUST be an integer")
+    return status_code, response
+
+
+def is_async_callable(function) -> bool:
+    """Whether calling function returns a coroutine: async def functions and
+    objects with an async __call__ (like a verifier class)"""
+    return inspect.iscoroutinefunction(function) or inspect.iscoroutinefunction(
+        getattr(type(function), "__call__", None)
+    )
+
+
+def checked_principal(principal):
+    """An awaitable is never a principal, it is truthy and would let any token in"""
+    if inspect.isawaitable(principal):
+        if inspect.iscoroutine(principal):
+            principal.close()
+        raise TypeError("auth_middleware returned an awaitable to a sync caller")
+    return principal
+
+
+def authenticate(auth_middleware: Callable, token, auth_cache: AuthCache = None):
+    """Validate the bearer token of a request.\n
+    Returns what auth_middleware returned, None if there is no bearer token"""
+    if token is None:
+        return None
+    if auth_cache is None:
+        return checked_principal(auth_middleware(token))
+    principal = auth_cache.lookup(token)
+    if principal is MISS:
+        principal = checked_principal(auth_middleware(token))
+        auth_cache.store(token, principal)
+    return principal
+
+
+async def authenticate_async(validate: Callable, token, auth_cache: AuthCache = None):
+    """authenticate() for validators that must be awaited"""
+    if token is None:
+        return None
+    if auth_cache is None:
+        return await resolve_principal(validate, token)
+    principal = auth_cache.lookup(token)
+    if principal is MISS:
+        principal = await resolve_principal(validate, token)
+        auth_cache.store(token, principal)
+    return principal
+
+
+async def resolve_principal(validate: Callable, token):
+    """Await what validate returns, and what that returns too if it is
+    awaitable (an async callable run in a worker pool returns a coroutine)"""
+    principal = await validate(token)
+    while inspect.isawaitable(principal):
+        principal = await principal
+    return principal
+
+
+def bearer_token(auth_header: bytes):
+    """Token of an Authorization: Bearer header value, None if there is none"""
+    if auth_header is None or not auth_header.startswith(b"Bearer "):
+        return None
+    return auth_header.decode().split(" ")[1]
+
+
 def valid_status_code(status_code: int) -> bool:
     """Validate if status code is a valid HTTP status code"""
     try:
@@ -315,19 +894,3 @@ def valid_method(method: str) -> bool:
     """Validate if method is a valid HTTP method"""
     valid_methods = {"GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"}
     return method.upper() in valid_methods
-
-
-async def read_body(receive) -> bytes:
-    """
-    Read and return the entire body from an incoming ASGI message.
-    """
-    body = b""
-    more_body = True
-    MAX_BODY_SIZE = 1024 * 1024  # 1MB limit
-    while more_body:
-        message = await receive()
-        body += message.get("body", b"")
-        more_body = message.get("more_body", False)
-        if len(body) > MAX_BODY_SIZE:
-            raise ValueError("Request body too large")
-    return body
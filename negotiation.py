@@ -0,0 +1,34 @@
+# Negotiated results kept per header value, most clients send a few
+HEADER_CACHE_SIZE = 256
+
+
+def quality_values(header: str) -> list:
+    """(value, quality) of each element of an Accept like header, in order.
+    Values are lowercased, a q that is not a number counts as 0"""
+    elements = []
+    for element in header.split(","):
+        value, *params = element.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, q = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(q)
+                except ValueError:
+                    quality = 0.0
+        elements.append((value.strip().lower(), quality))
+    return elements
+
+
+class HeaderCache(dict):
+    """Negotiation result per raw header value. Cleared when it reaches
+    max_entries, a client with a new value each time can't make it grow"""
+
+    def __init__(self, max_entries=HEADER_CACHE_SIZE) -> None:
+        super().__init__()
+        self.max_entries = max_entries
+
+    def store(self, header, result) -> None:
+        if len(self) >= self.max_entries:
+            self.clear()
+        self[header] = result
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable
+
+THREAD = "thread"
+PROCESS = "process"
+POOLS = (THREAD, PROCESS)
+# Waits kept for the percentiles of WorkerPools.stats()
+WAIT_SAMPLES = 1024
+QUEUED = 0
+RUNNING = 1
+ABANDONED = 2
+
+
+def cpu_bound(function: Callable = None, *, pool=THREAD) -> Callable:
+    """Mark a sync function as blocking, so the app runs it in a worker pool
+    instead of on the event loop.\n
+    pool="thread" (default) suits validators that release the GIL, like argon2.
+    pool="process" suits pure Python ones, the function must then be defined at
+    module level so it can be pickled."""
+    if pool not in POOLS:
+        raise ValueError(f"Invalid pool {pool}. Allowed pools: {', '.join(POOLS)}")
+
+    def mark(function: Callable) -> Callable:
+        function.offload_pool = pool
+        return function
+
+    return mark(function) if function is not None else mark
+
+
+def offload_pool(function: Callable):
+    """Pool a function was marked to run in, None if it runs on the event loop"""
+    return getattr(function, "offload_pool", None)
+
+
+class PoolTask:
+    """A function call submitted to the thread pool, it records how long it
+    waited for a worker. It is skipped if its request gave up before that"""
+
+    __slots__ = ("pools", "function", "args", "submitted", "state")
+
+    def __init__(self, pools, function: Callable, args) -> None:
+        self.pools = pools
+        self.function = function
+        self.args = args
+        self.submitted = time.perf_counter()
+        self.state = QUEUED
+
+    def __call__(self):
+        pools = self.pools
+        wait = time.perf_counter() - self.submitted
+        with pools.lock:
+            if self.state == ABANDONED:
+                return None
+            self.state = RUNNING
+            pools.queued -= 1
+            pools.running += 1
+            pools.started += 1
+            pools.wait_total += wait
+            if wait > pools.wait_max:
+                pools.wait_max = wait
+            pools.waits.append(wait)
+        try:
+            return self.function(*self.args)
+        finally:
+            with pools.lock:
+                pools.running -= 1
+                pools.completed += 1
+
+    def abandon(self) -> None:
+        """Drop it if no worker took it yet"""
+        with self.pools.lock:
+            if self.state == QUEUED:
+                self.state = ABANDONED
+                self.pools.queued -= 1
+
+
+class WorkerPools:
+    """Thread and process pools owned by the app, each created on first use
+    with at most max_workers workers.\n
+    The thread pool runs sync handlers, cpu_bound functions and large
+    compressions, stats() tells how loaded it is."""
+
+    def __init__(self, max_workers=None) -> None:
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.executors = {}
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.started = 0
+        self.completed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    def executor(self, pool: str):
+        executor = self.executors.get(pool)
+        if executor is None:
+            if pool == PROCESS:
+                executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="securapi"
+                )
+            self.executors[pool] = executor
+        return executor
+
+    async def run(self, pool: str, function: Callable, *args):
+        loop = asyncio.get_running_loop()
+        if pool == PROCESS:
+            return await loop.run_in_executor(self.executor(pool), function, *args)
+        task = PoolTask(self, function, args)
+        with self.lock:
+            self.queued += 1
+        try:
+            return await loop.run_in_executor(self.executor(pool), task)
+        finally:
+            task.abandon()
+
+    def stats(self) -> dict:
+        """Thread pool load: tasks waiting for a worker (queued), running and
+        completed, and how long they waited in secs (p99 of the latest 1024)"""
+        with self.lock:
+            waits = sorted(self.waits)
+            return {
+                "workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "wait_avg": self.wait_total / self.started if self.started else 0.0,
+                "wait_p99": waits[int(len(waits) * 0.99)] if waits else 0.0,
+                "wait_max": self.wait_max,
+            }
+
+    def shutdown(self) -> None:
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.executors.clear()
@@ -0,0 +1,209 @@
+import collections.abc
+import json
+import typing
+from urllib.parse import parse_qsl, unquote
+
+MAX_BODY_SIZE = 1024 * 1024  # 1MB limit
+# How the request_body argument is passed, picked from its annotation
+BODY_TEXT = "text"
+BODY_BYTES = "bytes"
+BODY_MEMORYVIEW = "memoryview"
+BODY_STREAM = "stream"
+
+
+class Request:
+    """The incoming request, for handlers that take an argument named request.\n
+    Headers, query, cookies and body are parsed the first time they are used and
+    kept, so a request only pays for what its handler (or auth) looks at. Header
+    names are case insensitive."""
+
+    __slots__ = (
+        "scope",
+        "receive",
+        "path_params",
+        "header_index",
+        "header_map",
+        "query_map",
+        "cookie_map",
+        "body_bytes",
+        "max_body_size",
+    )
+
+    def __init__(
+        self, scope, receive=None, path_params=None, max_body_size=MAX_BODY_SIZE
+    ) -> None:
+        self.scope = scope
+        self.receive = receive
+        self.path_params = path_params or {}
+        self.max_body_size = max_body_size
+        self.header_index = None
+        self.header_map = None
+        self.query_map = None
+        self.cookie_map = None
+        self.body_bytes = None
+
+    @property
+    def method(self) -> str:
+        return self.scope["method"]
+
+    @property
+    def path(self) -> str:
+        return self.scope["path"]
+
+    @property
+    def client(self):
+        """Client address, None when the server doesn't know it"""
+        client = self.scope.get("client")
+        return client[0] if client else None
+
+    def index_headers(self) -> dict:
+        """Lowercase header name -> value, as bytes. Built on first use"""
+        if self.header_index is None:
+            index = {}
+            for key, value in self.scope["headers"]:
+                key = key.lower()
+                if key in index:
+                    # Repeated headers are combined into one, as RFC 9110 allows
+                    separator = b"; " if key == b"cookie" else b", "
+                    index[key] += separator + value
+                else:
+                    index[key] = value
+            self.header_index = index
+        return self.header_index
+
+    def raw_header(self, name: bytes):
+        """Value of a header as bytes, name must be lowercase"""
+        return self.index_headers().get(name)
+
+    def header(self, name: str, default=None):
+        value = self.raw_header(name.lower().encode("latin-1"))
+        return value.decode("latin-1") if value is not None else default
+
+    @property
+    def headers(self) -> dict:
+        if self.header_map is None:
+            self.header_map = {
+                key.decode("latin-1"): value.decode("latin-1")
+                for key, value in self.index_headers().items()
+            }
+        return self.header_map
+
+    @property
+    def query(self) -> dict:
+        """Query params, the last value wins when a param is repeated"""
+        if self.query_map is None:
+            self.query_map = dict(
+                parse_qsl(self.scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+            )
+        return self.query_map
+
+    @property
+    def cookies(self) -> dict:
+        if self.cookie_map is None:
+            self.cookie_map = parse_cookies(self.header("cookie", ""))
+        return self.cookie_map
+
+    async def body(self):
+        """The whole body (bytes or bytearray), read from the client only once"""
+        if self.body_bytes is None:
+            check_content_length(self.raw_header(b"content-length"), self.max_body_size)
+            self.body_bytes = await read_body(self.receive, self.max_body_size)
+        return self.body_bytes
+
+    def stream(self):
+        """Async iterator over the body chunks as they arrive, without buffering them"""
+        check_content_length(self.raw_header(b"content-length"), self.max_body_size)
+        return iter_body(self.receive, self.max_body_size)
+
+    async def text(self) -> str:
+        return (await self.body()).decode("utf-8")
+
+    async def json(self):
+        return json.loads(await self.body())
+
+
+def parse_cookies(cookie_header: str) -> dict:
+    """Cookie header to a dict. Like browsers, malformed pairs are skipped"""
+    cookies = {}
+    for pair in cookie_header.split(";"):
+        name, separator, value = pair.partition("=")
+        name = name.strip()
+        if not separator or not name:
+            continue
+        value = value.strip()
+        if len(value) > 1 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        cookies[name] = unquote(value)
+    return cookies
+
+
+def body_kind(annotation) -> str:
+    """How a request_body argument with this annotation is passed"""
+    if annotation is bytes:
+        return BODY_BYTES
+    if annotation is memoryview:
+        return BODY_MEMORYVIEW
+    origin = typing.get_origin(annotation) or annotation
+    if origin in (collections.abc.AsyncIterator, collections.abc.AsyncIterable):
+        return BODY_STREAM
+    return BODY_TEXT
+
+
+def find_header(headers, name: bytes):
+    """Raw value of a header from an ASGI header list, None if missing.\n
+    name must be lowercase. For requests that don't build a Request"""
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def content_length(headers):
+    """Raw Content-Length header value from an ASGI header list, None if missing"""
+    return find_header(headers, b"content-length")
+
+
+def check_content_length(content_length: bytes, max_body_size: int) -> None:
+    """Reject a body from its declared size, before reading any of it"""
+    if content_length is not None and int(content_length) > max_body_size:
+        raise ValueError("Request body too large")
+
+
+async def read_body(receive, max_body_size=MAX_BODY_SIZE):
+    """
+    Read and return the entire body from an incoming ASGI message.\n
+    A body sent in a single message is returned as is, without a copy. Longer ones
+    are accumulated in a bytearray, so reading them is linear in their size.
+    """
+    message = await receive()
+    body = message.get("body", b"")
+    if not message.get("more_body", False):
+        if len(body) > max_body_size:
+            raise ValueError("Request body too large")
+        return body
+    buffer = bytearray(body)
+    more_body = True
+    while more_body:
+        if len(buffer) > max_body_size:
+            raise ValueError("Request body too large")
+        message = await receive()
+        buffer += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    if len(buffer) > max_body_size:
+        raise ValueError("Request body too large")
+    return buffer
+
+
+async def iter_body(receive, max_body_size=MAX_BODY_SIZE):
+    """Yield the body chunks as they arrive, the limit is checked as they add up"""
+    received = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunk = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        received += len(chunk)
+        if received > max_body_size:
+            raise ValueError("Request body too large")
+        if chunk:
+            yield chunk
@@ -0,0 +1,372 @@
+import json
+import math
+from collections.abc import AsyncIterator, Iterator
+from functools import lru_cache
+from typing import Iterable, Tuple
+
+JSON_CONTENT_TYPE = (b"content-type", b"application/json")
+# Compact, and non ASCII text as UTF-8 instead of \u escapes. Built once
+JSON_ENCODER = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+# Stream framings
+RAW = "raw"
+NDJSON = "ndjson"
+JSON_ARRAY = "json_array"
+STREAM_CONTENT_TYPES = {
+    NDJSON: b"application/x-ndjson",
+    JSON_ARRAY: b"application/json",
+}
+# Items of sync iterators are sent in messages of about this many bytes
+STREAM_CHUNK_SIZE = 64 * 1024
+# next() default of an exhausted iterator, StopIteration can't cross an executor
+NO_ITEM = object()
+# JSON responses over this many bytes are encoded and sent in chunks
+JSON_STREAM_THRESHOLD = 1024 * 1024
+# Entries of a big list or dict encoded per json.dumps call
+JSON_CHUNK_ENTRIES = 1024
+BINARY_TYPES = (bytes, bytearray, memoryview)
+
+
+class PreencodedResponse:
+    """Response whose header list and body bytes are built once and reused.\n
+    The header list is shared between requests, it must not be mutated."""
+
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(
+        self,
+        status: int,
+        body: bytes,
+        headers: Iterable[Tuple[bytes, bytes]] = (JSON_CONTENT_TYPE,),
+    ) -> None:
+        self.status = status
+        self.body = body
+        self.headers = [*headers, (b"content-length", str(len(body)).encode())]
+
+    async def send(self, send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status,
+                "headers": self.headers,
+            }
+        )
+        await send(
+            {
+                "type": "http.response.body",
+                "body": self.body,
+            }
+        )
+
+
+def json_response(status: int, content) -> PreencodedResponse:
+    return PreencodedResponse(status, JSON_ENCODER.encode(content).encode("utf-8"))
+
+
+@lru_cache(maxsize=1024)
+def not_found_response(path: str) -> PreencodedResponse:
+    """404 for a path, cached for the most recently requested paths"""
+    return json_response(404, {"error": f"Path {path} not found"})
+
+
+AUTH_REQUIRED = json_response(401, {"response": "Authentication required"})
+FORBIDDEN = json_response(403, {"error": "Forbidden"})
+NOT_ACCEPTABLE = json_response(406, {"error": "Not Acceptable"})
+SERVER_ERROR = PreencodedResponse(500, b'{"response":"Server Error"}')
+SERVICE_UNAVAILABLE = json_response(503, {"error": "Service Unavailable"})
+RATE_LIMIT_EXCEEDED = json_response(429, {"error": "Rate limit exceeded"})
+ONLY_HTTP_ACCEPTED = PreencodedResponse(400, b"ERROR: only http requests accepted")
+
+
+@lru_cache(maxsize=256)
+def retry_after_response(seconds: int) -> PreencodedResponse:
+    return PreencodedResponse(
+        429,
+        RATE_LIMIT_EXCEEDED.body,
+        (JSON_CONTENT_TYPE, (b"retry-after", str(seconds).encode())),
+    )
+
+
+def rate_limited_response(retry_after) -> PreencodedResponse:
+    """429, with a Retry-After header (whole secs, rounded up) when the delay is known"""
+    if retry_after is None:
+        return RATE_LIMIT_EXCEEDED
+    return retry_after_response(max(1, math.ceil(retry_after)))
+
+
+class StreamingResponse:
+    """Response sent as its content, a sync or async iterator, produces it.\n
+    framing="raw": bytes and str items are sent as they are.\n
+    framing="ndjson": one JSON document per line.\n
+    framing="json_array": the items form a single JSON array.\n
+    By default the framing is raw if the first item is bytes or str, ndjson if not.
+    bytes items are taken as already encoded JSON in the JSON framings.\n
+    Every item of an async iterator is sent as soon as it is produced, the items
+    of a sync one are grouped in messages of STREAM_CHUNK_SIZE bytes. Each
+    message waits for send, so a slow client slows the iterator down instead of
+    the response piling up in memory.\n
+    send() pulls the items of a sync iterator with offload(function, *args) when
+    it is given (the app thread pool), so a blocking iterator doesn't stall the
+    event loop."""
+
+    __slots__ = ("content", "status", "framing", "content_type")
+
+    def __init__(self, content, status=None, framing=None, content_type=None) -> None:
+        if framing not in (None, RAW, NDJSON, JSON_ARRAY):
+            raise ValueError(f"Invalid framing {framing}")
+        self.content = content
+        self.status = status
+        self.framing = framing
+        self.content_type = content_type
+
+    async def send(self, send, default_status=200, logger=None, offload=None) -> None:
+        content = self.content
+        is_async = hasattr(content, "__aiter__")
+        items = content.__aiter__() if is_async else iter(content)
+        try:
+            # Errors before the first item can still get a proper error response
+            if is_async:
+                try:
+                    first = await items.__anext__()
+                except StopAsyncIteration:
+                    first = NO_ITEM
+            elif offload is not None:
+                first = await offload(next, items, NO_ITEM)
+            else:
+                first = next(items, NO_ITEM)
+            empty = first is NO_ITEM
+            if empty:
+                first = None
+            framing = self.framing
+            if framing is None:
+                framing = RAW if empty or isinstance(first, (str, *BINARY_TYPES)) else NDJSON
+            content_type = self.content_type
+            if content_type is None:
+                if framing != RAW:
+                    content_type = STREAM_CONTENT_TYPES[framing]
+                elif isinstance(first, str):
+                    content_type = b"text/plain; charset=utf-8"
+                else:
+                    content_type = b"application/octet-stream"
+            elif isinstance(content_type, str):
+                content_type = content_type.encode()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status or default_status,
+                    "headers": [(b"content-type", content_type)],
+                }
+            )
+            encode = STREAM_ENCODERS[framing]
+            if framing == JSON_ARRAY:
+                head, separator, tail = b"[", b",", b"]"
+            else:
+                head, separator, tail = b"", b"", b""
+            if not empty:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": head + encode(first),
+                        "more_body": True,
+                    }
+                )
+                head = b""
+            try:
+                if is_async:
+                    async for item in items:
+                        await send(
+                            {
+                                "type": "http.response.body",
+                                "body": separator + encode(item),
+                                "more_body": True,
+                            }
+                        )
+                else:
+                    while True:
+                        if offload is not None:
+                            body, exhausted = await offload(next_chunk, items, encode, separator)
+                        else:
+                            body, exhausted = next_chunk(items, encode, separator)
+                        if exhausted:
+                            tail = body + tail
+                            break
+                        await send(
+                            {
+                                "type": "http.response.body",
+                                "body": body,
+                                "more_body": True,
+                            }
+                        )
+            except Exception as e:
+                # The status line is gone, ending without the last message lets
+                # the server close the connection so the client sees it truncated
+                if logger is not None:
+                    logger.exception(e)
+                return
+            await send({"type": "http.response.body", "body": head + tail})
+        finally:
+            close = getattr(items, "aclose" if is_async else "close", None)
+            if close is not None:
+                if is_async:
+                    await close()
+                elif offload is not None:
+                    await offload(close)
+                else:
+                    close()
+
+
+def next_chunk(items, encode, separator):
+    """Encode the next items of a sync iterator up to STREAM_CHUNK_SIZE bytes,
+    returns (body, whether the iterator is exhausted)"""
+    parts = []
+    size = 0
+    for item in items:
+        part = encode(item)
+        parts.append(separator)
+        parts.append(part)
+        size += len(part) + len(separator)
+        if size >= STREAM_CHUNK_SIZE:
+            return b"".join(parts), False
+    return b"".join(parts), True
+
+
+def is_stream(content) -> bool:
+    """Whether a handler returned something to stream instead of a JSON document"""
+    return isinstance(content, (StreamingResponse, Iterator, AsyncIterator))
+
+
+def encode_raw(item) -> bytes:
+    if isinstance(item, BINARY_TYPES):
+        return item if type(item) is bytes else bytes(item)
+    if isinstance(item, str):
+        return item.encode()
+    return JSON_ENCODER.encode(item).encode()
+
+
+def encode_json(item) -> bytes:
+    if isinstance(item, BINARY_TYPES):
+        return item if type(item) is bytes else bytes(item)
+    return JSON_ENCODER.encode(item).encode()
+
+
+def encode_ndjson(item) -> bytes:
+    if isinstance(item, BINARY_TYPES):
+        return bytes(item) if item[-1:] == b"\n" else bytes(item) + b"\n"
+    return JSON_ENCODER.encode(item).encode() + b"\n"
+
+
+STREAM_ENCODERS = {RAW: encode_raw, NDJSON: encode_ndjson, JSON_ARRAY: encode_json}
+
+
+def is_large(content) -> bool:
+    """Whether a dict or list (or one of its values) has JSON_CHUNK_ENTRIES entries
+    or more. It doesn't look any deeper so small responses stay cheap to check:
+    a big list two envelopes down is encoded in one json.dumps call"""
+    if len(content) >= JSON_CHUNK_ENTRIES:
+        return True
+    for value in content.values() if isinstance(content, dict) else content:
+        if isinstance(value, (dict, list)) and len(value) >= JSON_CHUNK_ENTRIES:
+            return True
+    return False
+
+
+def json_pieces(content, encoder=JSON_ENCODER):
+    """
+    Yield the JSON text of content (same as encoder.encode) in pieces.\n
+    Lists and dicts with JSON_CHUNK_ENTRIES entries or more are split: their
+    entries are encoded JSON_CHUNK_ENTRIES at a time with encoder.encode (the C
+    encoder), so no piece holds the whole document. Smaller values are encoded
+    in a single call.
+    """
+    encode = encoder.encode
+    if not isinstance(content, (dict, list)) or not is_large(content):
+        yield encode(content)
+        return
+    item_separator = encoder.item_separator
+    # {key: 0} encodes the key like the encoder does (str, int, float...)
+    key_end = -len(encoder.key_separator) - 2
+    is_dict = isinstance(content, dict)
+    yield "{" if is_dict else "["
+    separator = ""
+    run = {} if is_dict else []
+    for entry in content.items() if is_dict else content:
+        value = entry[1] if is_dict else entry
+        if isinstance(value, (dict, list)) and len(value) >= JSON_CHUNK_ENTRIES:
+            if run:
+                yield separator + encode(run)[1:-1]
+                separator = item_separator
+                run.clear()
+            if is_dict:
+                yield separator + encode({entry[0]: 0})[1:key_end] + encoder.key_separator
+            else:
+                yield separator
+            yield from json_pieces(value, encoder)
+            separator = item_separator
+            continue
+        if is_dict:
+            run[entry[0]] = value
+        else:
+            run.append(value)
+        if len(run) >= JSON_CHUNK_ENTRIES:
+            yield separator + encode(run)[1:-1]
+            separator = item_separator
+            run.clear()
+    if run:
+        yield separator + encode(run)[1:-1]
+    yield "}" if is_dict else "]"
+
+
+async def send_pieces(
+    send, status: int, pieces, headers=(JSON_CONTENT_TYPE,), logger=None, send_whole=None
+) -> None:
+    """
+    Send a response body given in pieces (str or bytes), reusing one buffer.\n
+    Up to JSON_STREAM_THRESHOLD bytes are buffered first: a response that fits
+    goes out as a single message with its Content-Length (or is passed to
+    send_whole(body) when given), and encoding errors up to there still get a
+    normal error response. Bigger ones are sent chunked, in STREAM_CHUNK_SIZE
+    messages, and cut short (logged, without the final message) if encoding
+    fails after the headers went out.
+    """
+    buffer = bytearray()
+    started = False
+    try:
+        for piece in pieces:
+            buffer += piece.encode() if isinstance(piece, str) else piece
+            if not started:
+                if len(buffer) <= JSON_STREAM_THRESHOLD:
+                    continue
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": status,
+                        "headers": list(headers),
+                    }
+                )
+                started = True
+            if len(buffer) >= STREAM_CHUNK_SIZE:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": bytes(buffer),
+                        "more_body": True,
+                    }
+                )
+                buffer.clear()
+    except Exception as e:
+        if not started:
+            raise
+        if logger is not None:
+            logger.exception(e)
+        return
+    if not started and send_whole is not None:
+        await send_whole(bytes(buffer))
+        return
+    if not started:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [*headers, (b"content-length", str(len(buffer)).encode())],
+            }
+        )
+    await send({"type": "http.response.body", "body": bytes(buffer)})
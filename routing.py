@@ -0,0 +1,153 @@
+import re
+from typing import Callable, Dict, List, Tuple
+
+PARAM_SEGMENT = re.compile(r"^\{([A-Za-z_][A-Za-z0-9_]*)(?::([A-Za-z_]+|\*))?\}$")
+
+
+def convert_int(value: str) -> int:
+    if not (value.isascii() and value.isdigit()):
+        raise ValueError(f"{value} is not an integer")
+    return int(value)
+
+
+def convert_float(value: str) -> float:
+    return float(value)
+
+
+def convert_str(value: str) -> str:
+    return value
+
+
+CONVERTERS: Dict[str, Callable] = {
+    "int": convert_int,
+    "float": convert_float,
+    "str": convert_str,
+}
+# Typed segments are tried before plain strings so "/users/{id:int}" wins
+# over "/users/{name}" when the segment is numeric.
+CONVERTER_PRIORITY = {"int": 0, "float": 1, "str": 2}
+CATCH_ALL = "*"
+
+
+def split_path(path: str) -> List[str]:
+    """Split a path into segments, keeping the leading and trailing slash as empty segments"""
+    return path.split("/")
+
+
+def parse_segment(segment: str):
+    """Return (name, converter_type) for a parameter segment, None for a static one"""
+    if not segment.startswith("{"):
+        return None
+    match = PARAM_SEGMENT.match(segment)
+    if match is None:
+        raise ValueError(f"Invalid path parameter segment: {segment}")
+    name, kind = match.group(1), match.group(2) or "str"
+    if kind != CATCH_ALL and kind not in CONVERTERS:
+        raise ValueError(
+            f"Unknown path parameter type '{kind}'. Allowed types: {', '.join(CONVERTERS)}, *"
+        )
+    return name, kind
+
+
+def path_param_names(path: str) -> List[str]:
+    """Names of the parameters declared in a path template, in order"""
+    names = []
+    for segment in split_path(path):
+        param = parse_segment(segment)
+        if param is not None:
+            if param[0] in names:
+                raise ValueError(f"Duplicated path parameter: {param[0]}")
+            names.append(param[0])
+    return names
+
+
+class RouteNode:
+    __slots__ = ("static", "params", "catch_all", "endpoint")
+
+    def __init__(self) -> None:
+        self.static: Dict[str, "RouteNode"] = {}
+        self.params: List[Tuple[str, str, Callable, "RouteNode"]] = []
+        self.catch_all = None
+        self.endpoint = None
+
+    def param_child(self, name: str, kind: str) -> "RouteNode":
+        for param_name, param_kind, _, child in self.params:
+            if param_name == name and param_kind == kind:
+                return child
+        child = RouteNode()
+        self.params.append((name, kind, CONVERTERS[kind], child))
+        self.params.sort(key=lambda param: CONVERTER_PRIORITY[param[1]])
+        return child
+
+    def match(self, segments: List[str], index: int, captured: Dict):
+        if index == len(segments):
+            return self.endpoint
+        segment = segments[index]
+        child = self.static.get(segment)
+        if child is not None:
+            endpoint = child.match(segments, index + 1, captured)
+            if endpoint is not None:
+                return endpoint
+        if segment:
+            for name, _, convert, child in self.params:
+                try:
+                    value = convert(segment)
+                except ValueError:
+                    continue
+                endpoint = child.match(segments, index + 1, captured)
+                if endpoint is not None:
+                    captured[name] = value
+                    return endpoint
+        if self.catch_all is not None:
+            remaining = segments[index:]
+            if remaining[-1] == "":
+                remaining = remaining[:-1]
+            if remaining and remaining[0]:
+                name, endpoint = self.catch_all
+                captured[name] = "/".join(remaining)
+                return endpoint
+        return None
+
+
+class RouteTree:
+    """Per-method segment trie.\n
+    Static paths are resolved with a single dict lookup, paths with parameters
+    walk one trie level per path segment, so the cost depends on the depth of
+    the path and not on the number of registered routes.\n
+    Supported segments: {name} (str), {name:int}, {name:float} and the
+    catch-all {name:*}, which must be the last segment of the path."""
+
+    def __init__(self, methods) -> None:
+        self.static = {m: {} for m in methods}
+        self.trees = {m: RouteNode() for m in methods}
+
+    def add(self, method: str, path: str, endpoint) -> None:
+        segments = split_path(path)
+        params = [parse_segment(segment) for segment in segments]
+        if not any(params):
+            self.static[method][path] = endpoint
+            return
+        node = self.trees[method]
+        for index, (segment, param) in enumerate(zip(segments, params)):
+            if param is None:
+                node = node.static.setdefault(segment, RouteNode())
+                continue
+            name, kind = param
+            if kind == CATCH_ALL:
+                if any(segments[index + 1:]):
+                    raise ValueError("Catch-all path parameter must be the last segment")
+                node.catch_all = (name, endpoint)
+                return
+            node = node.param_child(name, kind)
+        node.endpoint = endpoint
+
+    def resolve(self, method: str, path: str):
+        """Return (endpoint, path_params) or None if no route matches"""
+        endpoint = self.static[method].get(path)
+        if endpoint is not None:
+            return endpoint, {}
+        captured = {}
+        endpoint = self.trees[method].match(split_path(path), 0, captured)
+        if endpoint is None:
+            return None
+        return endpoint, captured
@@ -0,0 +1,84 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+# lookup() result for tokens that are not cached
+MISS = object()
+
+
+class AuthCache:
+    """LRU cache of auth_middleware results, so a session that sends the same
+    token again skips the validation (argon2, JWT signature...).\n
+    Entries are keyed by the sha256 of the token, raw tokens are never kept.
+    A valid result is reused for ttl secs, a falsy one (rejected token) for
+    negative_ttl secs. At most max_entries are kept, the least recently used
+    is evicted first.\n
+    Revoked tokens and users are removed with invalidate() and
+    invalidate_principal(). Use one cache per auth_middleware."""
+
+    def __init__(self, max_entries=10_000, ttl=300, negative_ttl=5, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        # token hash -> (expiration time, principal)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def lookup(self, token: str):
+        """Cached principal of the token, MISS if there is none"""
+        key = self.key(token)
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > self.clock():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self.entries[key]
+        self.misses += 1
+        return MISS
+
+    def store(self, token: str, principal, ttl=None) -> None:
+        """Cache what auth_middleware returned for the token.\n
+        ttl replaces the cache one, a verifier can pass the secs left until the
+        token expires so it is never served after that"""
+        if ttl is None:
+            ttl = self.ttl if principal else self.negative_ttl
+        if ttl <= 0:
+            return
+        entries = self.entries
+        key = self.key(token)
+        if key in entries:
+            entries.move_to_end(key)
+        elif len(entries) >= self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+        entries[key] = (self.clock() + ttl, principal)
+
+    def invalidate(self, token: str) -> bool:
+        """Forget a token, returns whether it was cached"""
+        return self.entries.pop(self.key(token), None) is not None
+
+    def invalidate_principal(self, principal) -> int:
+        """Forget every token of a principal, returns how many were cached"""
+        keys = [key for key, entry in self.entries.items() if entry[1] == principal]
+        for key in keys:
+            del self.entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,145 @@
+import asyncio
+import time
+from .rateLimitStores import MemoryStore, RateLimitStore, RateLimitStoreError
+from .rateLimiting import SLIDING_WINDOW, RateLimiterMiddleware, sliding_window_delay
+
+
+class CachedWindow:
+    """Last counters read from the store, plus the requests not sent to it yet"""
+
+    __slots__ = ("window", "current", "previous", "pending", "previous_pending", "synced")
+
+    def __init__(self) -> None:
+        self.window = 0
+        self.current = 0
+        self.previous = 0
+        self.pending = 0
+        self.previous_pending = 0
+        self.synced = False
+
+
+class DistributedRateLimiter(RateLimiterMiddleware):
+    """Sliding window counter rate limiter whose counters live in a RateLimitStore
+    (MemoryStore by default, RedisStore to share one limit between hosts).\n
+    new_request_allowed is a coroutine (is_async = True). Every attempt that
+    reaches the store is counted, rejected ones too, so a client that keeps
+    hammering stays limited.\n
+    Local window cache: while the last counters read from the store put a client
+    under local_ratio * max_requests, its requests are accepted without a round
+    trip and sent to the store with its next one. Other hosts see them late, so
+    the limit can be overshot by up to local_ratio * max_requests per host.
+    local_ratio=0 disables the cache. A client already over the limit by the
+    cached counters is rejected without a round trip too.\n
+    When the store fails or takes longer than timeout secs the request is
+    accepted (fail_open=True, the default) or rejected."""
+
+    is_async = True
+
+    def __init__(
+        self,
+        store: RateLimitStore = None,
+        max_requests=60,
+        time_window=60,
+        clock=time.time,
+        max_clients=100_000,
+        sweep_interval=None,
+        timeout=0.05,
+        fail_open=True,
+        local_ratio=0.5,
+    ):
+        super().__init__(
+            max_requests,
+            time_window,
+            mode=SLIDING_WINDOW,
+            clock=clock,
+            max_clients=max_clients,
+            sweep_interval=sweep_interval,
+        )
+        self.store = store if store is not None else MemoryStore()
+        self.timeout = timeout
+        self.fail_open = fail_open
+        self.local_limit = local_ratio * max_requests
+        self.local_hits = 0
+        self.store_hits = 0
+        self.store_errors = 0
+
+    async def new_request_allowed(self, ip_address) -> bool:
+        current_time = self.clock()
+        self.track(ip_address, current_time)
+        state = self.requests.get(ip_address)
+        if state is None:
+            state = self.requests[ip_address] = CachedWindow()
+        window = int(current_time // self.time_window)
+        if window != state.window:
+            if window == state.window + 1:
+                state.previous = state.current + state.pending
+                state.previous_pending = state.pending
+            else:
+                state.previous = state.previous_pending = 0
+            state.current = state.pending = 0
+            state.window = window
+        elapsed = current_time / self.time_window - window
+        if state.synced:
+            estimate = state.previous * (1 - elapsed) + state.current + state.pending
+            if estimate >= self.max_requests:
+                self.ip_sus.add(ip_address)
+                return False
+            if estimate + 1 <= self.local_limit:
+                state.pending += 1
+                self.local_hits += 1
+                return True
+        # Taken out of the cache before the round trip, so a concurrent request
+        # of the same client doesn't send them again
+        count, previous_count = state.pending + 1, state.previous_pending
+        state.pending = state.previous_pending = 0
+        hit = self.store.hit(ip_address, window, count, 2 * self.time_window, previous_count)
+        try:
+            if self.store.remote:
+                hit = asyncio.wait_for(hit, self.timeout)
+            current, previous = await hit
+        except (OSError, EOFError, asyncio.TimeoutError, RateLimitStoreError):
+            self.store_errors += 1
+            if state.window == window:
+                state.pending += count if self.fail_open else count - 1
+                state.previous_pending += previous_count
+            return self.fail_open
+        self.store_hits += 1
+        if state.window == window:
+            state.current, state.previous = current, previous
+            state.synced = True
+        # current already counts this request
+        if previous * (1 - elapsed) + current > self.max_requests:
+            self.ip_sus.add(ip_address)
+            return False
+        self.ip_sus.discard(ip_address)
+        return True
+
+    def retry_after(self, ip_address):
+        """Secs until the cached counters drop under the limit, None if they are"""
+        state = self.requests.get(ip_address)
+        if state is None:
+            return None
+        current_time = self.clock()
+        window = int(current_time // self.time_window)
+        current, previous = state.current + state.pending, state.previous
+        if window == state.window + 1:
+            current, previous = 0, current
+        elif window != state.window:
+            return None
+        elapsed = current_time / self.time_window - window
+        if previous * (1 - elapsed) + current < self.max_requests:
+            return None
+        delay = sliding_window_delay(
+            current, previous, elapsed, self.max_requests, self.time_window
+        )
+        return delay if delay > 0 else None
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["local_hits"] = self.local_hits
+        stats["store_hits"] = self.store_hits
+        stats["store_errors"] = self.store_errors
+        return stats
+
+    async def close(self) -> None:
+        await self.store.close()
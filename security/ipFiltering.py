@@ -0,0 +1,114 @@
+import ipaddress
+import socket
+from array import array
+
+ALLOW = 1
+DENY = 2
+# ::ffff:a.b.c.d, an IPv4 client seen through an IPv6 socket
+IPV4_MAPPED_PREFIX = bytes(10) + b"\xff\xff"
+BIT_MASKS = (128, 64, 32, 16, 8, 4, 2, 1)
+
+
+class PrefixTrie:
+    """Binary trie of network prefixes stored in flat arrays.\n
+    Node i has its children at zero[i] / one[i] (0 = no child, the root is node 0)
+    and verdict[i] is ALLOW, DENY or 0 when no prefix ends there. About 9 bytes per
+    node, and a lookup visits at most one node per address bit."""
+
+    def __init__(self, bits: int) -> None:
+        self.bits = bits
+        self.zero = array("I", [0])
+        self.one = array("I", [0])
+        self.verdict = array("B", [0])
+        self.prefixes = 0
+
+    def add(self, network: int, prefix_length: int, verdict: int) -> None:
+        node = 0
+        for shift in range(self.bits - 1, self.bits - 1 - prefix_length, -1):
+            children = self.one if network >> shift & 1 else self.zero
+            child = children[node]
+            if not child:
+                child = len(self.verdict)
+                self.zero.append(0)
+                self.one.append(0)
+                self.verdict.append(0)
+                children[node] = child
+            node = child
+        if not self.verdict[node]:
+            self.prefixes += 1
+        # On the same prefix a deny always wins over an allow
+        if self.verdict[node] != DENY:
+            self.verdict[node] = verdict
+
+    def match(self, packed: bytes) -> int:
+        """Verdict of the longest prefix that contains the packed address, 0 if none does.\n
+        Walks the address a byte at a time so the bit tests stay on small ints"""
+        zero, one, verdict = self.zero, self.one, self.verdict
+        node = 0
+        found = verdict[0]
+        for byte in packed:
+            for mask in BIT_MASKS:
+                node = one[node] if byte & mask else zero[node]
+                if not node:
+                    return found
+                if verdict[node]:
+                    found = verdict[node]
+        return found
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self.zero, self.one, self.verdict))
+
+
+class IPFilter:
+    """IPv4/IPv6 CIDR allowlist and denylist.\n
+    check(ip) returns the verdict of the most specific matching prefix, so
+    deny=["10.0.0.0/8"] with allow=["10.1.2.0/24"] only lets 10.1.2.x through.
+    Addresses that are not valid IPs match nothing."""
+
+    def __init__(self, allow=(), deny=()) -> None:
+        self.ipv4 = PrefixTrie(32)
+        self.ipv6 = PrefixTrie(128)
+        for cidr in allow:
+            self.allow(cidr)
+        for cidr in deny:
+            self.deny(cidr)
+
+    def allow(self, cidr: str) -> None:
+        self.add(cidr, ALLOW)
+
+    def deny(self, cidr: str) -> None:
+        self.add(cidr, DENY)
+
+    def add(self, cidr: str, verdict: int) -> None:
+        network = ipaddress.ip_network(cidr, strict=False)
+        trie = self.ipv4 if network.version == 4 else self.ipv6
+        trie.add(int(network.network_address), network.prefixlen, verdict)
+
+    def check(self, ip_address: str) -> int:
+        """ALLOW, DENY or 0 if no prefix matches"""
+        try:
+            if ":" not in ip_address:
+                return self.ipv4.match(socket.inet_pton(socket.AF_INET, ip_address))
+            packed = socket.inet_pton(socket.AF_INET6, ip_address.partition("%")[0])
+        except (OSError, TypeError):
+            return 0
+        if packed[:12] == IPV4_MAPPED_PREFIX:
+            return self.ipv4.match(packed[12:])
+        return self.ipv6.match(packed)
+
+    def is_allowed(self, ip_address: str) -> bool:
+        return self.check(ip_address) == ALLOW
+
+    def is_denied(self, ip_address: str) -> bool:
+        return self.check(ip_address) == DENY
+
+    def __len__(self) -> int:
+        return self.ipv4.prefixes + self.ipv6.prefixes
+
+    def stats(self) -> dict:
+        return {
+            "prefixes": len(self),
+            "nodes": len(self.ipv4.verdict) + len(self.ipv6.verdict),
+            "memory_bytes": self.ipv4.memory_bytes + self.ipv6.memory_bytes,
+        }
@@ -0,0 +1,117 @@
+import json
+import os
+import time
+import jwt
+from .authCache import MISS, AuthCache
+
+
+class JWTVerifier:
+    """Bearer JWT auth_middleware: returns the token claims, None if it is not valid.\n
+    key (a secret or a PEM public key) is parsed once, for algorithms[0]. With
+    jwks_path the key is picked by the token kid from a local JWKS file, reloaded
+    when it changes (checked at most every jwks_reload_interval secs, or when a
+    token comes with an unknown kid) so keys can be rotated without a restart.\n
+    exp is required (required_claims), nbf is checked when present, aud and iss
+    when audience / issuer are given. As in jwt.decode, a token with an aud is
+    rejected when no audience is given. The decode options are built once.\n
+    Verified tokens are cached (up to cache_size, 0 disables the cache) until
+    their exp or for cache_ttl secs, whatever comes first, rejected ones for
+    negative_ttl secs. Revoked tokens can be removed with verifier.cache.invalidate()."""
+
+    def __init__(
+        self,
+        key=None,
+        algorithms=("RS256",),
+        audience=None,
+        issuer=None,
+        leeway=0,
+        jwks_path=None,
+        jwks_reload_interval=300,
+        required_claims=("exp",),
+        cache_size=10_000,
+        cache_ttl=300,
+        negative_ttl=5,
+        clock=time.time,
+    ):
+        if key is None and jwks_path is None:
+            raise ValueError("A key or a jwks_path is needed")
+        self.algorithms = list(algorithms)
+        self.key = None
+        if key is not None:
+            self.key = jwt.get_algorithm_by_name(self.algorithms[0]).prepare_key(key)
+        self.jwks_path = jwks_path
+        self.jwks_reload_interval = jwks_reload_interval
+        self.jwks = {}
+        self.jwks_mtime = None
+        self.jwks_checked = float("-inf")
+        self.clock = clock
+        self.decoder = jwt.PyJWT(options={"require": list(required_claims)})
+        self.decode_kwargs = {
+            "algorithms": self.algorithms,
+            "audience": audience,
+            "issuer": issuer,
+            "leeway": leeway,
+        }
+        self.cache = None
+        if cache_size:
+            self.cache = AuthCache(
+                max_entries=cache_size, ttl=cache_ttl, negative_ttl=negative_ttl, clock=clock
+            )
+        if jwks_path is not None:
+            self.load_jwks()
+
+    def __call__(self, token: str):
+        cache = self.cache
+        if cache is not None:
+            claims = cache.lookup(token)
+            if claims is not MISS:
+                return claims
+        claims = self.verify(token)
+        if cache is not None:
+            ttl = None
+            if claims is not None and "exp" in claims:
+                ttl = min(cache.ttl, claims["exp"] - self.clock())
+            cache.store(token, claims, ttl)
+        return claims
+
+    def verify(self, token: str):
+        """Claims of the token, without the cache. None if it is not valid"""
+        try:
+            key = self.key if self.jwks_path is None else self.jwks_key(token)
+            if key is None:
+                return None
+            return self.decoder.decode(token, key, **self.decode_kwargs)
+        except jwt.InvalidTokenError:
+            return None
+
+    def jwks_key(self, token: str):
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.jwks.get(kid)
+        # An unknown kid only costs a stat() of the file, it is parsed again
+        # only when it changed
+        if key is None or self.clock() - self.jwks_checked >= self.jwks_reload_interval:
+            try:
+                self.load_jwks()
+            except (OSError, ValueError, jwt.PyJWTError):
+                # Keep the last good keys while the file is being replaced
+                return key
+            key = self.jwks.get(kid)
+        return key
+
+    def load_jwks(self) -> None:
+        """Parse the JWKS file again if it changed since the last load"""
+        self.jwks_checked = self.clock()
+        mtime = os.stat(self.jwks_path).st_mtime_ns
+        if mtime == self.jwks_mtime:
+            return
+        with open(self.jwks_path) as jwks_file:
+            jwk_set = jwt.PyJWKSet.from_dict(json.load(jwks_file))
+        self.jwks = {
+            jwk.key_id: jwk.key
+            for jwk in jwk_set.keys
+            if jwk.algorithm_name in self.algorithms
+        }
+        self.jwks_mtime = mtime
+        # Tokens signed with a key that was removed must not be served from the cache
+        if self.cache is not None:
+            self.cache.clear()
@@ -0,0 +1,172 @@
+import asyncio
+from collections import OrderedDict
+from .rateLimiting import WindowCounter
+
+# Stale keys dropped by MemoryStore on each hit
+EXPIRE_PER_HIT = 2
+
+
+class RateLimitStoreError(Exception):
+    pass
+
+
+class RateLimitStore:
+    """Where DistributedRateLimiter keeps its sliding window counters.\n
+    hit() adds count requests to the key counter of window (and previous_count
+    to the one of window - 1) and returns the counters of both windows after the
+    update, atomically. Counters can be dropped ttl secs after their last update.\n
+    remote is False for stores that answer without leaving the process, their
+    hits are never timed out."""
+
+    remote = True
+
+    async def hit(self, key: str, window: int, count: int, ttl: float, previous_count=0):
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryStore(RateLimitStore):
+    """In process store, the default. Only one process sees the counters"""
+
+    remote = False
+
+    def __init__(self) -> None:
+        self.counters = OrderedDict()
+
+    async def hit(self, key: str, window: int, count: int, ttl: float, previous_count=0):
+        counters = self.counters
+        state = counters.get(key)
+        if state is None:
+            # Keys with no hits in the last two windows don't matter anymore
+            for _ in range(EXPIRE_PER_HIT):
+                if not counters or next(iter(counters.values())).window >= window - 1:
+                    break
+                counters.popitem(last=False)
+            state = counters[key] = WindowCounter()
+        else:
+            counters.move_to_end(key)
+        if window != state.window:
+            state.previous = state.current if window == state.window + 1 else 0
+            state.current = 0
+            state.window = window
+        state.current += count
+        state.previous += previous_count
+        return state.current, state.previous
+
+
+def encode_command(*args) -> bytes:
+    """RESP array of bulk strings"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by the rate limit store")
+    kind, value = line[:1], line[1:-2]
+    if kind == b"+":
+        return value
+    if kind == b":":
+        return int(value)
+    if kind == b"-":
+        raise RateLimitStoreError(value.decode(errors="replace"))
+    if kind == b"$":
+        length = int(value)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(value)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RateLimitStoreError(f"Unexpected reply {line!r}")
+
+
+class RedisStore(RateLimitStore):
+    """Store in a Redis (or any server that speaks its protocol) shared by every host.\n
+    A hit is one MULTI/INCRBY/PEXPIRE/GET/EXEC transaction written in a single
+    pipelined round trip. Up to pool_size connections are opened, lazily, and
+    reused. A connection that fails or is interrupted (a timeout) is closed,
+    since its replies can't be trusted anymore."""
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=6379,
+        pool_size=8,
+        prefix="securapi:rate-limit:",
+        password=None,
+        db=0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.password = password
+        self.db = db
+        self.pool = asyncio.Semaphore(pool_size)
+        self.idle = []
+
+    async def connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password is not None:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            try:
+                writer.write(b"".join(encode_command(*command) for command in setup))
+                for _ in setup:
+                    await read_reply(reader)
+            except BaseException:
+                writer.close()
+                raise
+        return reader, writer
+
+    async def execute(self, *commands) -> list:
+        """Send every command at once and return their replies"""
+        async with self.pool:
+            connection = self.idle.pop() if self.idle else await self.connect()
+            reader, writer = connection
+            try:
+                writer.write(b"".join(encode_command(*command) for command in commands))
+                replies = [await read_reply(reader) for _ in commands]
+            except BaseException:
+                writer.close()
+                raise
+            self.idle.append(connection)
+            return replies
+
+    async def hit(self, key: str, window: int, count: int, ttl: float, previous_count=0):
+        current_key = f"{self.prefix}{key}:{window}"
+        previous_key = f"{self.prefix}{key}:{window - 1}"
+        ttl = int(ttl * 1000)
+        commands = [
+            ("MULTI",),
+            ("INCRBY", current_key, count),
+            ("PEXPIRE", current_key, ttl),
+        ]
+        if previous_count:
+            # Requests counted locally before the window changed
+            commands.append(("INCRBY", previous_key, previous_count))
+            commands.append(("PEXPIRE", previous_key, ttl))
+        else:
+            commands.append(("GET", previous_key))
+        commands.append(("EXEC",))
+        results = (await self.execute(*commands))[-1]
+        if results is None:
+            raise RateLimitStoreError("Rate limit transaction aborted")
+        return int(results[0]), int(results[2] or 0)
+
+    async def close(self) -> None:
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.close()
@@ -1,42 +1,370 @@
+import asyncio
 import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from .sketches import WindowedCountMin
+
+EXACT = "exact"
+SLIDING_WINDOW = "sliding_window"
+RING_BUFFER = "ring_buffer"
+GCRA = "gcra"
+COUNT_MIN = "count_min"
+MODES = (EXACT, SLIDING_WINDOW, RING_BUFFER, GCRA, COUNT_MIN)
+IP_KEY = "ip"
+PRINCIPAL_KEY = "principal"
+# Idle clients expired each time a new client is tracked
+SWEEP_PER_NEW_CLIENT = 2
+
+
+class WindowCounter:
+    """Sliding window counter state: requests in the current and previous fixed window"""
+
+    __slots__ = ("window", "current", "previous")
+
+    def __init__(self) -> None:
+        self.window = 0
+        self.current = 0
+        self.previous = 0
+
+
+class RingBuffer:
+    """Timestamps of the last max_requests allowed requests"""
+
+    __slots__ = ("timestamps", "position")
+
+    def __init__(self, size: int) -> None:
+        self.timestamps = array("d", [float("-inf")]) * size
+        self.position = 0
+
 
 class RateLimiterMiddleware:
-    def __init__(self, max_requests=60, time_window=60):
+    """Per client rate limiter.\n
+    mode="exact" (default): keeps every timestamp inside the window, a client that
+    goes over the limit is blocked until it stops making requests for time_window secs.\n
+    mode="sliding_window": two fixed window counters, the previous one weighted by how
+    much of it still overlaps the sliding window. Constant time and memory, approximate.\n
+    mode="ring_buffer": exact sliding log of the last max_requests allowed requests
+    in a fixed size array. Constant time and memory per client.\n
+    mode="gcra": generic cell rate algorithm (a token bucket that stores one float per
+    client, its theoretical arrival time). Tokens refill at refill_rate per sec
+    (default max_requests / time_window) and up to burst (default max_requests)
+    requests can be made at once. There is no lockout, a client is accepted again as
+    soon as one token is available.\n
+    mode="count_min": sliding window counter over two rotating Count-Min sketches of
+    sketch_width * sketch_depth integers. No per client state at all, memory stays
+    the same (4 MB with the defaults) for 1k or 10M clients, at the cost of over
+    counting clients that share counters with heavy ones. heavy_hitters() reports
+    the top_k clients with more requests in the current window.\n
+    retry_after(ip) returns how many secs a rejected client has to wait.\n
+    At most max_clients clients are tracked, when a new one arrives the least
+    recently active is evicted. Clients idle for longer than their state can
+    matter are expired in small batches when new clients arrive, and in bulk
+    by sweep()/run_sweeper()."""
+
+    # True when new_request_allowed is a coroutine
+    is_async = False
+
+    def __init__(
+        self,
+        max_requests=60,
+        time_window=60,
+        mode=EXACT,
+        clock=time.time,
+        max_clients=100_000,
+        sweep_interval=None,
+        burst=None,
+        refill_rate=None,
+        sketch_width=131_072,
+        sketch_depth=4,
+        top_k=100,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Invalid rate limit mode {mode}. Allowed modes: {', '.join(MODES)}")
         self.max_requests = max_requests
         self.time_window = time_window # secs
+        self.mode = mode
+        self.clock = clock
+        self.max_clients = max_clients
+        self.sweep_interval = sweep_interval or time_window
+        self.burst = burst or max_requests
+        # Secs between two tokens
+        self.emission_interval = 1 / refill_rate if refill_rate else time_window / max_requests
+        self.burst_tolerance = self.burst * self.emission_interval
+        # State stops mattering after this many secs without requests
+        self.idle_timeout = {
+            SLIDING_WINDOW: 2 * time_window,
+            GCRA: self.burst_tolerance,
+        }.get(mode, time_window)
         self.requests = {}
         self.ip_sus = set()
+        # ip -> last request time, least recently active first
+        self.activity = OrderedDict()
+        self.evictions = 0
+        self.expired = 0
+        self.sketch = None
+        if mode == COUNT_MIN:
+            self.sketch = WindowedCountMin(time_window, sketch_width, sketch_depth, top_k)
+        self.request_allowed = {
+            EXACT: self.exact_request_allowed,
+            SLIDING_WINDOW: self.sliding_window_request_allowed,
+            RING_BUFFER: self.ring_buffer_request_allowed,
+            GCRA: self.gcra_request_allowed,
+            COUNT_MIN: self.count_min_request_allowed,
+        }[mode]
 
 
     def new_request_allowed(self, ip_address) -> bool:
-        current_time = time.time()
+        current_time = self.clock()
+        if self.sketch is None:
+            self.track(ip_address, current_time)
+        return self.request_allowed(ip_address, current_time)
+
+    def track(self, ip_address, current_time):
+        activity = self.activity
+        if ip_address in activity:
+            activity.move_to_end(ip_address)
+        else:
+            self.sweep(SWEEP_PER_NEW_CLIENT, current_time)
+            if len(activity) >= self.max_clients:
+                self.forget(activity.popitem(last=False)[0])
+                self.evictions += 1
+        activity[ip_address] = current_time
+
+    def forget(self, ip_address):
+        self.requests.pop(ip_address, None)
+        self.ip_sus.discard(ip_address)
+
+    def sweep(self, batch_size=1000, current_time=None) -> int:
+        """Expire up to batch_size idle clients, returns how many were expired"""
+        if current_time is None:
+            current_time = self.clock()
+        activity = self.activity
+        oldest_allowed = current_time - self.idle_timeout
+        expired = 0
+        while expired < batch_size and activity:
+            ip_address, last_seen = next(iter(activity.items()))
+            if last_seen > oldest_allowed:
+                break
+            del activity[ip_address]
+            self.forget(ip_address)
+            expired += 1
+        self.expired += expired
+        return expired
+
+    async def run_sweeper(self, batch_size=1000):
+        """Expire idle clients every sweep_interval secs, yielding to the event loop between batches"""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            while self.sweep(batch_size) >= batch_size:
+                await asyncio.sleep(0)
+
+    @property
+    def tracked_clients(self) -> int:
+        return len(self.activity)
+
+    def stats(self) -> dict:
+        stats = {
+            "tracked_clients": self.tracked_clients,
+            "suspected_clients": len(self.ip_sus),
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+        if self.sketch is not None:
+            stats["sketch_bytes"] = self.sketch.memory_bytes
+        return stats
+
+    def exact_request_allowed(self, ip_address, current_time) -> bool:
         if ip_address in self.ip_sus:
             self.update_requests(ip_address, current_time)
-            return not self.is_ip_suspected(ip_address) 
-        
+            return not self.is_ip_suspected(ip_address)
+
 
         if ip_address not in self.requests:
             self.requests[ip_address] = []
-        
+
         # Remove timestamps outside the time window
         self.update_requests(ip_address, current_time)
 
         # Add the current request timestamp
         self.requests[ip_address].append(current_time)
-        
+
         if len(self.requests[ip_address]) > self.max_requests:
             self.ip_sus.add(ip_address)
             return False  # Rate limit exceeded
         return True  # Request allowed
-    
+
+    def sliding_window_request_allowed(self, ip_address, current_time) -> bool:
+        state = self.requests.get(ip_address)
+        if state is None:
+            state = self.requests[ip_address] = WindowCounter()
+        window = int(current_time // self.time_window)
+        if window != state.window:
+            state.previous = state.current if window == state.window + 1 else 0
+            state.current = 0
+            state.window = window
+        elapsed = current_time / self.time_window - window
+        if state.previous * (1 - elapsed) + state.current >= self.max_requests:
+            self.ip_sus.add(ip_address)
+            return False
+        state.current += 1
+        self.ip_sus.discard(ip_address)
+        return True
+
+    def ring_buffer_request_allowed(self, ip_address, current_time) -> bool:
+        state = self.requests.get(ip_address)
+        if state is None:
+            state = self.requests[ip_address] = RingBuffer(self.max_requests)
+        position = state.position
+        # The slot about to be overwritten holds the oldest of the last max_requests
+        if current_time - state.timestamps[position] < self.time_window:
+            self.ip_sus.add(ip_address)
+            return False
+        state.timestamps[position] = current_time
+        state.position = (position + 1) % self.max_requests
+        self.ip_sus.discard(ip_address)
+        return True
+
+    def gcra_request_allowed(self, ip_address, current_time) -> bool:
+        tat = self.requests.get(ip_address, current_time)
+        if tat < current_time:
+            tat = current_time
+        tat += self.emission_interval
+        if tat - current_time > self.burst_tolerance:
+            return False
+        self.requests[ip_address] = tat
+        return True
+
+    def count_min_request_allowed(self, ip_address, current_time) -> bool:
+        return self.sketch.hit(ip_address, current_time, self.max_requests)
+
+    def heavy_hitters(self, n=None) -> list:
+        """[(ip, requests, max over count)] of the heaviest clients in the current window"""
+        if self.sketch is None:
+            raise ValueError("Heavy hitters are only tracked in count_min mode")
+        return self.sketch.heavy_hitters.top(n)
+
+    def retry_after(self, ip_address):
+        """Secs until the client can make a new request, None if it can now"""
+        current_time = self.clock()
+        if self.sketch is not None:
+            current, previous, elapsed, _ = self.sketch.counts(ip_address, current_time)
+            if previous * (1 - elapsed) + current < self.max_requests:
+                return None
+            return sliding_window_delay(
+                current, previous, elapsed, self.max_requests, self.time_window
+            )
+        state = self.requests.get(ip_address)
+        if state is None:
+            return None
+        if self.mode == GCRA:
+            delay = state + self.emission_interval - self.burst_tolerance - current_time
+        elif self.mode == RING_BUFFER:
+            delay = state.timestamps[state.position] + self.time_window - current_time
+        elif self.mode == SLIDING_WINDOW:
+            window = int(current_time // self.time_window)
+            current, previous = state.current, state.previous
+            if window == state.window + 1:
+                current, previous = 0, current
+            elif window != state.window:
+                return None
+            elapsed = current_time / self.time_window - window
+            delay = sliding_window_delay(
+                current, previous, elapsed, self.max_requests, self.time_window
+            )
+        else:
+            if ip_address not in self.ip_sus or not state:
+                return None
+            delay = state[-1] + self.time_window - current_time
+        return delay if delay > 0 else None
+
     def is_ip_suspected(self, ip_address) -> bool:
+        if self.mode in (GCRA, COUNT_MIN):
+            return self.retry_after(ip_address) is not None
         return ip_address in self.ip_sus
-    
+
     def update_requests(self, ip_address, current_time):
         self.requests[ip_address] = [timestamp for timestamp in self.requests[ip_address] if current_time - timestamp < self.time_window]
         if len(self.requests[ip_address]) == 0:
             self.ip_sus.discard(ip_address)
 
+def sliding_window_delay(current, previous, elapsed, max_requests, time_window) -> float:
+    """Secs until previous * (1 - elapsed) + current drops below max_requests"""
+    if current < max_requests:
+        if previous == 0:
+            return 0.0
+        return (1 - (max_requests - current) / previous - elapsed) * time_window
+    # The current window has to become the previous one and be partly left behind
+    return (2 - max_requests / current - elapsed) * time_window
+
+
+class RateLimitPolicy:
+    """Which limiter applies to an endpoint and what identifies a client.\n
+    key="ip": the client address (the default).\n
+    key="principal": the user returned by the endpoint auth_middleware, so every
+    authenticated user has its own budget whatever address it comes from. The
+    principal has to be a str or an int, or a mapping with a "sub" or "user_id"
+    (JWT claims): the rest of the claims (exp, iat, jti) change with every token.\n
+    key can also be a callable (scope, principal) -> str, principal is None on
+    endpoints without auth_middleware.\n
+    Keys other than "ip" are only known after auth, the client address is still
+    limited in front of it (see SecurAPI.compile_dispatch)."""
+
+    def __init__(self, rate_limiter: "RateLimiterMiddleware", key="ip"):
+        if not isinstance(rate_limiter, RateLimiterMiddleware):
+            raise ValueError("rate_limiter must be a RateLimiterMiddleware")
+        if key not in (IP_KEY, PRINCIPAL_KEY) and not callable(key):
+            raise ValueError("key must be 'ip', 'principal' or a callable")
+        self.rate_limiter = rate_limiter
+        self.key = key
+        self.uses_principal = key != IP_KEY
+        self.is_async = rate_limiter.is_async
+
+    def client_key(self, scope, principal=None) -> str:
+        if self.key == IP_KEY:
+            return scope["client"][0]
+        if self.key == PRINCIPAL_KEY:
+            return principal_identity(principal)
+        return self.key(scope, principal)
+
+    def check_blocked(self, scope, principal=None) -> None:
+        """Raise RateLimitException if the client is over the limit, without
+        counting a request"""
+        retry_after = self.rate_limiter.retry_after(self.client_key(scope, principal))
+        if retry_after is not None:
+            raise RateLimitException(retry_after=retry_after)
+
+    def check(self, scope, principal=None) -> None:
+        """Raise RateLimitException if the client is over the limit"""
+        client_key = self.client_key(scope, principal)
+        if not self.rate_limiter.new_request_allowed(client_key):
+            raise RateLimitException(retry_after=self.rate_limiter.retry_after(client_key))
+
+    async def check_async(self, scope, principal=None) -> None:
+        """check() for any limiter, awaiting the ones whose is_async is True"""
+        client_key = self.client_key(scope, principal)
+        allowed = self.rate_limiter.new_request_allowed(client_key)
+        if self.is_async:
+            allowed = await allowed
+        if not allowed:
+            raise RateLimitException(retry_after=self.rate_limiter.retry_after(client_key))
+
+
+def principal_identity(principal) -> str:
+    """Rate limit key of the principal returned by an auth_middleware"""
+    if isinstance(principal, Mapping):
+        for field in ("sub", "user_id"):
+            if field in principal:
+                return str(principal[field])
+    elif isinstance(principal, (str, int)):
+        return str(principal)
+    raise TypeError(
+        'key="principal" needs a str, int or a mapping with a "sub" or "user_id", '
+        "use a key callable for other principals"
+    )
+
+
 class RateLimitException(Exception):
-    pass
-        
\ No newline at end of file
+    def __init__(self, message="Rate limit exceeded", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,116 @@
+import threading
+import time
+from .rateLimiting import COUNT_MIN, EXACT, RateLimiterMiddleware
+
+
+class ShardedRateLimiter(RateLimiterMiddleware):
+    """Thread safe RateLimiterMiddleware.\n
+    Clients are hashed to one of `shards` independent limiters, each behind its own
+    lock, so threads only contend when their clients land on the same shard.
+    Accepts the same options as RateLimiterMiddleware, max_clients is split
+    evenly between the shards.\n
+    mode="count_min" keeps no per client state to shard: there is a single sketch
+    behind a single lock, so memory stays that of one sketch."""
+
+    def __init__(
+        self,
+        max_requests=60,
+        time_window=60,
+        mode=EXACT,
+        clock=time.time,
+        max_clients=100_000,
+        sweep_interval=None,
+        burst=None,
+        refill_rate=None,
+        sketch_width=131_072,
+        sketch_depth=4,
+        top_k=100,
+        shards=16,
+    ):
+        super().__init__(
+            max_requests,
+            time_window,
+            mode=mode,
+            clock=clock,
+            max_clients=max_clients,
+            sweep_interval=sweep_interval,
+            burst=burst,
+            refill_rate=refill_rate,
+            sketch_width=sketch_width,
+            sketch_depth=sketch_depth,
+            top_k=top_k,
+        )
+        # In count_min mode the sketch of this limiter is all the state, no shards
+        self.sketch_lock = threading.Lock()
+        if mode == COUNT_MIN:
+            shards = 0
+        self.shards = [
+            RateLimiterMiddleware(
+                max_requests,
+                time_window,
+                mode=mode,
+                clock=clock,
+                max_clients=-(-max_clients // shards),
+                burst=burst,
+                refill_rate=refill_rate,
+            )
+            for _ in range(shards)
+        ]
+        self.locks = [threading.Lock() for _ in range(shards)]
+
+    def shard_index(self, ip_address) -> int:
+        return hash(ip_address) % len(self.shards)
+
+    def new_request_allowed(self, ip_address) -> bool:
+        if self.sketch is not None:
+            with self.sketch_lock:
+                return super().new_request_allowed(ip_address)
+        index = self.shard_index(ip_address)
+        with self.locks[index]:
+            return self.shards[index].new_request_allowed(ip_address)
+
+    def retry_after(self, ip_address):
+        if self.sketch is not None:
+            with self.sketch_lock:
+                return super().retry_after(ip_address)
+        index = self.shard_index(ip_address)
+        with self.locks[index]:
+            return self.shards[index].retry_after(ip_address)
+
+    def is_ip_suspected(self, ip_address) -> bool:
+        if self.sketch is not None:
+            # Through retry_after, which takes the lock
+            return super().is_ip_suspected(ip_address)
+        index = self.shard_index(ip_address)
+        with self.locks[index]:
+            return self.shards[index].is_ip_suspected(ip_address)
+
+    def sweep(self, batch_size=1000, current_time=None) -> int:
+        """Expire up to batch_size idle clients, locking one shard at a time"""
+        if not self.shards:
+            return 0
+        shard_batch = -(-batch_size // len(self.shards))
+        expired = 0
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                expired += shard.sweep(shard_batch, current_time)
+        return expired
+
+    @property
+    def tracked_clients(self) -> int:
+        return sum(shard.tracked_clients for shard in self.shards)
+
+    def heavy_hitters(self, n=None) -> list:
+        with self.sketch_lock:
+            return super().heavy_hitters(n)
+
+    def stats(self) -> dict:
+        if self.sketch is not None:
+            with self.sketch_lock:
+                return super().stats()
+        stats = {"tracked_clients": 0, "suspected_clients": 0, "evictions": 0, "expired": 0}
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                for name, value in shard.stats().items():
+                    stats[name] += value
+        return stats
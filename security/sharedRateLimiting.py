@@ -0,0 +1,201 @@
+import asyncio
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from .rateLimiting import RateLimiterMiddleware, sliding_window_delay
+
+MAGIC = b"SECRL001"
+# magic, groups, slots per group, max requests, time window
+HEADER = struct.Struct("<8sIIId")
+HEADER_SIZE = 64
+# client key hash, window number, requests in the current window, requests in the previous one
+SLOT = struct.Struct("<QqII")
+SLOTS_PER_GROUP = 16
+GROUP = struct.Struct("<" + "QqII" * SLOTS_PER_GROUP)
+FIELDS_PER_SLOT = 4
+LOCAL_LOCKS = 64
+
+
+def client_key(ip_address: str) -> int:
+    """Hash that is stable across processes (hash() is randomized per process)"""
+    key = int.from_bytes(
+        hashlib.blake2b(ip_address.encode(), digest_size=8).digest(), "little"
+    )
+    return key or 1
+
+
+class SharedMemoryRateLimiter(RateLimiterMiddleware):
+    """Sliding window counter rate limiter whose state lives in a memory mapped file,
+    so every uvicorn worker on the host that opens the same path enforces one limit.\n
+    The file is a fixed size open addressing hash table split in groups of 16 slots.
+    A client only ever lives in the group its key hashes to, so each update locks a
+    single group: a thread lock inside the process plus an fcntl byte range lock on
+    the group between processes. When a group is full the slot with the oldest
+    window is reused.\n
+    Every process must use the same path, max_requests, time_window and capacity."""
+
+    def __init__(
+        self,
+        path="/dev/shm/securapi-rate-limit",
+        max_requests=60,
+        time_window=60,
+        capacity=65_536,
+        clock=time.time,
+    ):
+        super().__init__(
+            max_requests,
+            time_window,
+            mode="sliding_window",
+            clock=clock,
+            max_clients=capacity,
+        )
+        self.path = path
+        self.groups = max(1, -(-capacity // SLOTS_PER_GROUP))
+        self.group_size = GROUP.size
+        size = HEADER_SIZE + self.groups * self.group_size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # The first process creates the table, the others check it matches their config
+        fcntl.lockf(self.fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self.fd).st_size == 0:
+                os.ftruncate(self.fd, size)
+                os.pwrite(
+                    self.fd,
+                    HEADER.pack(MAGIC, self.groups, SLOTS_PER_GROUP, max_requests, time_window),
+                    0,
+                )
+            header = HEADER.unpack(os.pread(self.fd, HEADER.size, 0))
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN)
+        if header != (MAGIC, self.groups, SLOTS_PER_GROUP, max_requests, float(time_window)):
+            os.close(self.fd)
+            raise ValueError(f"{path} was created with a different rate limit configuration")
+        self.memory = mmap.mmap(self.fd, size)
+        self.local_locks = [threading.Lock() for _ in range(LOCAL_LOCKS)]
+        self.sweep_cursor = 0
+
+    def group_offset(self, group: int) -> int:
+        return HEADER_SIZE + group * self.group_size
+
+    def new_request_allowed(self, ip_address) -> bool:
+        current_time = self.clock()
+        key = client_key(ip_address)
+        group = key % self.groups
+        offset = self.group_offset(group)
+        window = int(current_time // self.time_window)
+        elapsed = current_time / self.time_window - window
+        with self.local_locks[group % LOCAL_LOCKS]:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, self.group_size, offset)
+            try:
+                slot = self.find_slot(offset, key)
+                slot_key, slot_window, current, previous = SLOT.unpack_from(self.memory, slot)
+                if slot_key != key:
+                    if slot_key and slot_window >= window - 1:
+                        self.evictions += 1
+                    slot_window, current, previous = window, 0, 0
+                if window != slot_window:
+                    previous = current if window == slot_window + 1 else 0
+                    current = 0
+                allowed = previous * (1 - elapsed) + current < self.max_requests
+                if allowed:
+                    current += 1
+                SLOT.pack_into(self.memory, slot, key, window, current, previous)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, self.group_size, offset)
+        return allowed
+
+    def find_slot(self, offset: int, key: int) -> int:
+        """Offset of the client slot, or of the slot to reuse for it"""
+        values = GROUP.unpack_from(self.memory, offset)
+        free = None
+        oldest = None
+        oldest_window = None
+        for index in range(0, len(values), FIELDS_PER_SLOT):
+            slot_key = values[index]
+            if slot_key == key:
+                return offset + index // FIELDS_PER_SLOT * SLOT.size
+            if slot_key == 0:
+                if free is None:
+                    free = index
+            elif oldest_window is None or values[index + 1] < oldest_window:
+                oldest, oldest_window = index, values[index + 1]
+        index = free if free is not None else oldest
+        return offset + index // FIELDS_PER_SLOT * SLOT.size
+
+    def retry_after(self, ip_address):
+        current_time = self.clock()
+        key = client_key(ip_address)
+        values = GROUP.unpack_from(self.memory, self.group_offset(key % self.groups))
+        window = int(current_time // self.time_window)
+        elapsed = current_time / self.time_window - window
+        for index in range(0, len(values), FIELDS_PER_SLOT):
+            if values[index] == key:
+                slot_window, current, previous = values[index + 1 : index + 4]
+                if window == slot_window + 1:
+                    current, previous = 0, current
+                elif window != slot_window:
+                    return None
+                if previous * (1 - elapsed) + current < self.max_requests:
+                    return None
+                return sliding_window_delay(
+                    current, previous, elapsed, self.max_requests, self.time_window
+                )
+        return None
+
+    def is_ip_suspected(self, ip_address) -> bool:
+        return self.retry_after(ip_address) is not None
+
+    def sweep(self, batch_size=1000, current_time=None) -> int:
+        """Free the slots of idle clients in the next batch_size groups"""
+        if current_time is None:
+            current_time = self.clock()
+        window = int(current_time // self.time_window)
+        expired = 0
+        for _ in range(min(batch_size, self.groups)):
+            group = self.sweep_cursor
+            self.sweep_cursor = (group + 1) % self.groups
+            offset = self.group_offset(group)
+            with self.local_locks[group % LOCAL_LOCKS]:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX, self.group_size, offset)
+                try:
+                    for slot in range(offset, offset + self.group_size, SLOT.size):
+                        slot_key, slot_window, _, _ = SLOT.unpack_from(self.memory, slot)
+                        if slot_key and slot_window < window - 1:
+                            SLOT.pack_into(self.memory, slot, 0, 0, 0, 0)
+                            expired += 1
+                finally:
+                    fcntl.lockf(self.fd, fcntl.LOCK_UN, self.group_size, offset)
+        self.expired += expired
+        return expired
+
+    async def run_sweeper(self, batch_size=1000):
+        """Sweep the whole table every sweep_interval secs, batch_size groups at a time"""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            for _ in range(0, self.groups, batch_size):
+                self.sweep(batch_size)
+                await asyncio.sleep(0)
+
+    @property
+    def tracked_clients(self) -> int:
+        return sum(
+            1
+            for slot in range(HEADER_SIZE, len(self.memory), SLOT.size)
+            if SLOT.unpack_from(self.memory, slot)[0]
+        )
+
+    def stats(self) -> dict:
+        return {
+            "tracked_clients": self.tracked_clients,
+            "capacity": self.groups * SLOTS_PER_GROUP,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+    def close(self):
+        self.memory.close()
+        os.close(self.fd)
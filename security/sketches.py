@@ -0,0 +1,176 @@
+import hashlib
+import math
+import os
+from array import array
+
+
+class CountMinSketch:
+    """Approximate counter for any number of keys in width * depth integers.\n
+    Estimates never under count. With N the total of all counts, an estimate is at
+    most e / width * N over the true count with probability 1 - exp(-depth)."""
+
+    def __init__(self, width=131_072, depth=4, seed: bytes = None) -> None:
+        self.width = width
+        self.depth = depth
+        # Keyed hash, so a client can't pick addresses that collide on purpose
+        self.seed = seed if seed is not None else os.urandom(16)
+        self.rows = range(0, width * depth, width)
+        self.counters = array("I", bytes(4 * width * depth))
+        self.total = 0
+
+    def cells(self, key: str):
+        """Counter index of the key in each row.\n
+        The rows use h1 + row * h2 (Kirsch-Mitzenmacher double hashing) so a
+        single 8 byte digest is enough for any depth"""
+        digest = int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8, key=self.seed).digest(), "little"
+        )
+        h1, h2 = digest & 0xFFFFFFFF, digest >> 32 | 1
+        width = self.width
+        return [start + (h1 + row * h2) % width for row, start in enumerate(self.rows)]
+
+    def add(self, key: str, count=1, cells=None) -> None:
+        counters = self.counters
+        for cell in cells or self.cells(key):
+            counters[cell] += count
+        self.total += count
+
+    def estimate(self, key: str, cells=None) -> int:
+        return min(map(self.counters.__getitem__, cells or self.cells(key)))
+
+    def error_bound(self) -> float:
+        """Maximum over count of an estimate, with probability 1 - exp(-depth)"""
+        return math.e / self.width * self.total
+
+    def clear(self) -> None:
+        self.counters = array("I", bytes(4 * self.width * self.depth))
+        self.total = 0
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.counters.itemsize * len(self.counters)
+
+
+class SpaceSaving:
+    """Top k heaviest keys of a stream in k entries (space saving algorithm).\n
+    When a new key arrives and the table is full it replaces the lightest one and
+    inherits its count, so counts are over estimated by at most the inherited
+    error. Entries are kept in an indexed min heap, updates are O(log k)."""
+
+    def __init__(self, k=100) -> None:
+        self.k = k
+        self.keys = []
+        self.counts = []
+        self.errors = []
+        self.position = {}
+
+    def add(self, key: str, count=1) -> None:
+        index = self.position.get(key)
+        if index is not None:
+            self.counts[index] += count
+            self.sift_down(index)
+        elif len(self.keys) < self.k:
+            self.position[key] = len(self.keys)
+            self.keys.append(key)
+            self.counts.append(count)
+            self.errors.append(0)
+            self.sift_up(len(self.keys) - 1)
+        else:
+            del self.position[self.keys[0]]
+            error = self.counts[0]
+            self.keys[0] = key
+            self.counts[0] = error + count
+            self.errors[0] = error
+            self.position[key] = 0
+            self.sift_down(0)
+
+    def top(self, n=None) -> list:
+        """[(key, count, max over count)] heaviest first"""
+        entries = sorted(
+            zip(self.keys, self.counts, self.errors), key=lambda entry: -entry[1]
+        )
+        return entries[:n] if n is not None else entries
+
+    def clear(self) -> None:
+        self.keys, self.counts, self.errors, self.position = [], [], [], {}
+
+    def swap(self, i: int, j: int) -> None:
+        keys, counts, errors = self.keys, self.counts, self.errors
+        keys[i], keys[j] = keys[j], keys[i]
+        counts[i], counts[j] = counts[j], counts[i]
+        errors[i], errors[j] = errors[j], errors[i]
+        self.position[keys[i]] = i
+        self.position[keys[j]] = j
+
+    def sift_up(self, index: int) -> None:
+        counts = self.counts
+        while index > 0:
+            parent = (index - 1) // 2
+            if counts[parent] <= counts[index]:
+                return
+            self.swap(index, parent)
+            index = parent
+
+    def sift_down(self, index: int) -> None:
+        counts = self.counts
+        size = len(counts)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and counts[child] < counts[smallest]:
+                    smallest = child
+            if smallest == index:
+                return
+            self.swap(index, smallest)
+            index = smallest
+
+
+class WindowedCountMin:
+    """Sliding window counter over two rotating Count-Min sketches.\n
+    The previous window sketch is weighted by how much of it still overlaps the
+    sliding window, like the sliding_window rate limit mode. Every request, also
+    the rejected ones, feeds a SpaceSaving table of the heaviest clients."""
+
+    def __init__(self, time_window, width=131_072, depth=4, top_k=100, seed=None) -> None:
+        self.time_window = time_window
+        seed = seed if seed is not None else os.urandom(16)
+        self.current = CountMinSketch(width, depth, seed)
+        self.previous = CountMinSketch(width, depth, seed)
+        self.window = 0
+        self.heavy_hitters = SpaceSaving(top_k)
+
+    def rotate(self, current_time: float) -> float:
+        """Move to the window of current_time, returns how much of it has elapsed (0-1)"""
+        window = int(current_time // self.time_window)
+        if window != self.window:
+            if window == self.window + 1:
+                self.previous, self.current = self.current, self.previous
+            else:
+                self.previous.clear()
+            self.current.clear()
+            self.heavy_hitters.clear()
+            self.window = window
+        return current_time / self.time_window - window
+
+    def counts(self, key: str, current_time: float):
+        """(requests in the current window, in the previous one, elapsed, cells) for a key"""
+        elapsed = self.rotate(current_time)
+        cells = self.current.cells(key)
+        return (
+            self.current.estimate(key, cells),
+            self.previous.estimate(key, cells),
+            elapsed,
+            cells,
+        )
+
+    def hit(self, key: str, current_time: float, max_requests: int) -> bool:
+        current, previous, elapsed, cells = self.counts(key, current_time)
+        self.heavy_hitters.add(key)
+        if previous * (1 - elapsed) + current >= max_requests:
+            return False
+        self.current.add(key, cells=cells)
+        return True
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.current.memory_bytes + self.previous.memory_bytes
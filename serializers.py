@@ -0,0 +1,123 @@
+import json
+from functools import cached_property
+from .negotiation import HeaderCache, quality_values
+from .responses import is_large, json_pieces
+
+
+class Serializer:
+    """Encodes what handlers return for one media type.\n
+    Subclasses set media_type and implement encode(content) -> bytes. Those that
+    can encode a big response in parts override is_large and pieces, so it is
+    sent chunked instead of being built whole in memory."""
+
+    media_type = None
+
+    @cached_property
+    def content_type(self) -> tuple:
+        """The Content-Type header"""
+        return (b"content-type", self.media_type.encode())
+
+    def encode(self, content) -> bytes:
+        raise NotImplementedError
+
+    def is_large(self, content) -> bool:
+        return False
+
+    def pieces(self, content):
+        yield self.encode(content)
+
+
+class JSONSerializer(Serializer):
+    """JSON with a JSONEncoder built once, compact by default (no spaces after
+    separators) and with non ASCII text as UTF-8 instead of \\u escapes.
+    Big dicts and lists are encoded in pieces (see responses.json_pieces)"""
+
+    media_type = "application/json"
+
+    def __init__(self, separators=(",", ":"), ensure_ascii=False, default=None) -> None:
+        self.encoder = json.JSONEncoder(
+            separators=separators, ensure_ascii=ensure_ascii, default=default
+        )
+        self.encode_text = self.encoder.encode
+
+    def encode(self, content) -> bytes:
+        return self.encode_text(content).encode()
+
+    def is_large(self, content) -> bool:
+        return isinstance(content, (dict, list)) and is_large(content)
+
+    def pieces(self, content):
+        return json_pieces(content, self.encoder)
+
+
+def parse_accept(accept: str) -> list:
+    """Media ranges of an Accept header, best first. Ranges with q=0 are dropped"""
+    ranges = []
+    for position, (media_type, quality) in enumerate(quality_values(accept)):
+        if media_type and quality > 0:
+            # Same quality: the more specific range wins, then the first one
+            specificity = 0 if media_type == "*/*" else 1 if media_type.endswith("/*") else 2
+            ranges.append((-quality, -specificity, position, media_type))
+    ranges.sort()
+    return [media_type for *_, media_type in ranges]
+
+
+class SerializerRegistry:
+    """Serializers of an app, the first one is the default.\n
+    select() picks one for an Accept header: requests without one get the
+    default, requests that accept none of them get None (a 406). Results are
+    cached per header value."""
+
+    def __init__(self, serializers=()) -> None:
+        self.serializers = []
+        self.by_media_type = {}
+        self.accept_cache = HeaderCache()
+        for serializer in serializers:
+            self.register(serializer)
+
+    @property
+    def default(self) -> Serializer:
+        return self.serializers[0]
+
+    @property
+    def negotiated(self) -> bool:
+        """Whether there is more than one serializer to choose from"""
+        return len(self.serializers) > 1
+
+    def register(self, serializer: Serializer) -> None:
+        if not isinstance(serializer, Serializer) or not serializer.media_type:
+            raise ValueError("serializer must be a Serializer with a media_type")
+        media_type = serializer.media_type.lower()
+        if media_type in self.by_media_type:
+            # Replaced in place, so replacing the default keeps it the default
+            index = self.serializers.index(self.by_media_type[media_type])
+            self.serializers[index] = serializer
+        else:
+            self.serializers.append(serializer)
+        self.by_media_type[media_type] = serializer
+        self.accept_cache.clear()
+
+    def select(self, accept):
+        """Serializer for the Accept header value (str or bytes), None if none fits"""
+        if not accept:
+            return self.default
+        serializer = self.accept_cache.get(accept)
+        if serializer is None and accept not in self.accept_cache:
+            serializer = self.match(
+                accept.decode("latin-1") if isinstance(accept, bytes) else accept
+            )
+            self.accept_cache.store(accept, serializer)
+        return serializer
+
+    def match(self, accept: str):
+        for media_range in parse_accept(accept):
+            if media_range == "*/*":
+                return self.default
+            if media_range.endswith("/*"):
+                prefix = media_range[:-1]
+                for serializer in self.serializers:
+                    if serializer.media_type.lower().startswith(prefix):
+                        return serializer
+            elif media_range in self.by_media_type:
+                return self.by_media_type[media_range]
+        return None
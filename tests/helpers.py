@@ -0,0 +1,99 @@
+import asyncio
+from ..serializers import Serializer
+
+
+class FakeClock:
+    """Clock for limiters and caches that tests move forward by hand"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class ReprSerializer(Serializer):
+    """Stand in for a binary encoding like MessagePack"""
+
+    media_type = "application/x-repr"
+
+    def encode(self, content) -> bytes:
+        return repr(content).encode()
+
+
+def make_scope(path, method="GET", query_string=b"", ip_address="127.0.0.1", token=None, **headers):
+    """HTTP scope of a request. Headers are keyword arguments, if_none_match="..."
+    is sent as If-None-Match, and token as a Bearer Authorization header"""
+    header_list = [
+        (name.replace("_", "-").encode(), value.encode())
+        for name, value in headers.items()
+        if value is not None
+    ]
+    if token is not None:
+        header_list.append((b"authorization", f"Bearer {token}".encode()))
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query_string,
+        "headers": header_list,
+        "client": (ip_address, 5000),
+    }
+
+
+def body_receiver(*chunks):
+    """ASGI receive that returns the request body in these chunks"""
+    chunks = chunks or (b"",)
+    messages = iter(
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    )
+
+    async def receive():
+        return next(messages, {"type": "http.request", "body": b"", "more_body": False})
+
+    return receive
+
+
+async def run_request(app, scope, receive=None, on_message=None) -> list:
+    """Run a request through the app in process, returns the messages it sent.\n
+    on_message is awaited with each message as it is sent"""
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+        if on_message is not None:
+            await on_message(message)
+
+    await app.request_manager(scope, receive or body_receiver(), send)
+    return sent
+
+
+def response(sent) -> tuple:
+    """(status, headers, body) of the messages of a response"""
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    return sent[0]["status"], dict(sent[0]["headers"]), body
+
+
+def request_messages(app, path, method="GET", query_string=b"", body=b"", **scope_options) -> list:
+    """Run a request through the app in process, returns the messages it sent.
+    Takes the options of make_scope"""
+    scope = make_scope(path, method, query_string, **scope_options)
+    return asyncio.run(run_request(app, scope, body_receiver(body)))
+
+
+def request(app, path, method="GET", query_string=b"", body=b"", **scope_options) -> tuple:
+    """Run a request through the app in process, returns (status, headers, body).
+    Takes the options of make_scope"""
+    return response(request_messages(app, path, method, query_string, body, **scope_options))
+
+
+def concurrent_requests(app, path, count, method="GET", query_string=b"", **scope_options) -> list:
+    """Run count identical requests at once on one event loop, returns a
+    (status, headers, body) per request"""
+    scope = make_scope(path, method, query_string, **scope_options)
+
+    async def run():
+        return await asyncio.gather(*(run_request(app, scope) for _ in range(count)))
+
+    return [response(sent) for sent in asyncio.run(run())]
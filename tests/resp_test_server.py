@@ -0,0 +1,85 @@
+import asyncio
+
+
+class RespTestServer:
+    """Minimal in process server speaking the Redis protocol, for the RedisStore tests.\n
+    Supports the commands RedisStore uses. delay makes every reply that many secs
+    late, transactions counts the MULTI/EXEC blocks received."""
+
+    def __init__(self, delay=0.0) -> None:
+        self.data = {}
+        self.ttls = {}
+        self.delay = delay
+        self.transactions = 0
+        self.connections = 0
+        self.commands = []
+        self.server = None
+        self.port = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def read_command(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2].decode())
+        return args
+
+    def run(self, args):
+        name = args[0].upper()
+        self.commands.append(name)
+        if name in ("PING", "AUTH", "SELECT"):
+            return b"+OK\r\n"
+        if name == "INCRBY":
+            self.data[args[1]] = self.data.get(args[1], 0) + int(args[2])
+            return b":%d\r\n" % self.data[args[1]]
+        if name == "PEXPIRE":
+            self.ttls[args[1]] = int(args[2])
+            return b":1\r\n"
+        if name == "GET":
+            if args[1] not in self.data:
+                return b"$-1\r\n"
+            value = str(self.data[args[1]]).encode()
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        return b"-ERR unknown command '%s'\r\n" % name.encode()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        queued = None
+        try:
+            while True:
+                args = await self.read_command(reader)
+                if args is None:
+                    return
+                name = args[0].upper()
+                if name == "MULTI":
+                    self.transactions += 1
+                    queued = []
+                    reply = b"+OK\r\n"
+                elif name == "EXEC":
+                    results = [self.run(command) for command in queued]
+                    queued = None
+                    reply = b"*%d\r\n" % len(results) + b"".join(results)
+                elif queued is not None:
+                    queued.append(args)
+                    reply = b"+QUEUED\r\n"
+                else:
+                    reply = self.run(args)
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
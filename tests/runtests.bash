@@ -9,4 +9,23 @@ pytest test_rate_limit_integration.py
 pytest test_rate_limit_unit.py
 pytest test_auth_unit.py
 pytest test_auth_integration.py
+pytest test_routing_unit.py
+pytest test_shared_rate_limit_unit.py
+pytest test_rate_limit_policy_unit.py
+pytest test_sharded_rate_limit_unit.py
+pytest test_sketches_unit.py
+pytest test_ip_filter_unit.py
+pytest test_distributed_rate_limit_unit.py
+pytest test_auth_cache_unit.py
+pytest test_jwt_auth_unit.py
+pytest test_request_unit.py
+pytest test_request_body_unit.py
+pytest test_streaming_unit.py
+pytest test_serializers_unit.py
+pytest test_compression_unit.py
+pytest test_etag_unit.py
+pytest test_response_cache_unit.py
+pytest test_coalescing_unit.py
+pytest test_offloading_unit.py
+pytest test_negotiation_unit.py
 fi
\ No newline at end of file
@@ -0,0 +1,96 @@
+from ..main import SecurAPI
+from ..security.authCache import MISS, AuthCache
+from .helpers import FakeClock, request
+
+
+class CountingMiddleware:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, token):
+        self.calls += 1
+        return {"alice-token": "alice", "bob-token": "bob"}.get(token)
+
+
+class TestAuthCacheUnit:
+    def test_lookup_and_store(self):
+        cache = AuthCache()
+        assert cache.lookup("alice-token") is MISS
+        cache.store("alice-token", "alice")
+        assert cache.lookup("alice-token") == "alice"
+        assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "evictions": 0}
+
+    def test_raw_tokens_are_not_kept(self):
+        cache = AuthCache()
+        cache.store("alice-token", "alice")
+        assert all(b"alice-token" not in key for key in cache.entries)
+
+    def test_ttl_and_negative_ttl(self):
+        clock = FakeClock()
+        cache = AuthCache(ttl=60, negative_ttl=5, clock=clock)
+        cache.store("alice-token", "alice")
+        cache.store("wrong-token", None)
+        clock.now += 10
+        assert cache.lookup("alice-token") == "alice"
+        assert cache.lookup("wrong-token") is MISS
+        clock.now += 60
+        assert cache.lookup("alice-token") is MISS
+        assert len(cache.entries) == 0
+        # A verifier can cap the ttl to the token expiration
+        cache.store("alice-token", "alice", ttl=1)
+        clock.now += 2
+        assert cache.lookup("alice-token") is MISS
+
+    def test_lru_eviction(self):
+        cache = AuthCache(max_entries=2)
+        cache.store("a", 1)
+        cache.store("b", 2)
+        cache.lookup("a")
+        cache.store("c", 3)
+        assert cache.lookup("b") is MISS
+        assert cache.lookup("a") == 1
+        assert cache.lookup("c") == 3
+        assert cache.evictions == 1
+
+    def test_invalidation(self):
+        cache = AuthCache()
+        cache.store("alice-token", "alice")
+        cache.store("alice-phone-token", "alice")
+        cache.store("bob-token", "bob")
+        assert cache.invalidate("bob-token") is True
+        assert cache.invalidate("bob-token") is False
+        assert cache.invalidate_principal("alice") == 2
+        assert len(cache.entries) == 0
+
+    def test_endpoint_validates_each_token_once(self):
+        app = SecurAPI()
+        middleware = CountingMiddleware()
+        cache = AuthCache()
+
+        @app.add_endpoint("/me", auth_middleware=middleware, auth_cache=cache)
+        def me():
+            return {"response": "me"}
+
+        assert [request(app, "/me", token="alice-token")[0] for _ in range(5)] == [200] * 5
+        assert [request(app, "/me", token="wrong-token")[0] for _ in range(5)] == [401] * 5
+        assert request(app, "/me")[0] == 401
+        assert middleware.calls == 2
+        assert cache.stats()["hits"] == 8
+        # Revoked tokens are validated again
+        cache.invalidate("alice-token")
+        request(app, "/me", token="alice-token")
+        assert middleware.calls == 3
+
+    def test_invalid_auth_cache(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/no-auth", auth_cache=AuthCache())
+        def no_auth():
+            return {}
+
+        @app.add_endpoint("/not-a-cache", auth_middleware=CountingMiddleware(), auth_cache={})
+        def not_a_cache():
+            return {}
+
+        assert app.is_valid_route("/no-auth/", "GET") is False
+        assert app.is_valid_route("/not-a-cache/", "GET") is False
@@ -1,4 +1,16 @@
+import asyncio
+import os
+import threading
+import time
 from ..main import SecurAPI
+from ..offloading import cpu_bound
+from .helpers import concurrent_requests, request
+
+
+@cpu_bound(pool="process")
+def process_auth_middleware(token):
+    return {"user_id": 1, "pid": os.getpid()} if token == "valid-token" else None
+
 
 class TestAuthUnit:
     def test_add_endpoint_auth(self):
@@ -17,4 +29,124 @@ class TestAuthUnit:
         assert "param2" not in endpoint.required_params
         assert endpoint.request_body is True
         assert endpoint.body_required is True
-        assert endpoint.auth_middleware is not None
\ No newline at end of file
+        assert endpoint.auth_middleware is not None
+
+    def test_auth_result_passed_to_handler(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/me", auth_middleware=lambda token: {"user_id": 1} if token == "valid-token" else None)
+        def me(auth, verbose="no"):
+            return {"user_id": auth["user_id"], "verbose": verbose}
+
+        endpoint = app.routes["GET"]["/me/"]
+        assert endpoint.wants_auth is True
+        assert "auth" not in endpoint.params
+        assert request(app, "/me", token="valid-token")[0] == 200
+        assert request(app, "/me", token="wrong-token")[0] == 401
+
+    def test_auth_argument_needs_auth_middleware(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/me")
+        def me(auth):
+            return {}
+
+        assert app.is_valid_route("/me/", "GET") is False
+
+    def test_async_auth_middleware(self):
+        app = SecurAPI()
+        calls = []
+
+        async def auth_middleware(token):
+            await asyncio.sleep(0)
+            calls.append(token)
+            return {"user_id": 1} if token == "valid-token" else None
+
+        @app.add_endpoint("/me", auth_middleware=auth_middleware)
+        async def me(auth):
+            return auth
+
+        assert request(app, "/me", token="valid-token")[0] == 200
+        assert request(app, "/me", token="wrong-token")[0] == 401
+        assert calls == ["valid-token", "wrong-token"]
+
+    def test_async_callable_auth_middleware(self):
+        class AsyncVerifier:
+            async def __call__(self, token):
+                await asyncio.sleep(0)
+                return {"user_id": 1} if token == "valid-token" else None
+
+        app = SecurAPI()
+        app_offloaded = SecurAPI(offload_auth=True)
+        for app_ in (app, app_offloaded):
+
+            @app_.add_endpoint("/me", auth_middleware=AsyncVerifier(), inline=True)
+            def me(auth):
+                return {"ok": True}
+
+            assert request(app_, "/me", token="valid-token")[0] == 200
+            assert request(app_, "/me", token="wrong-token")[0] == 401
+
+    def test_awaitable_principals_are_never_accepted(self):
+        class AsyncVerifier:
+            async def __call__(self, token):
+                return None
+
+        app = SecurAPI()
+        app_offloaded = SecurAPI(max_workers=1)
+
+        @app.add_endpoint("/me", auth_middleware=lambda token: AsyncVerifier()(token))
+        def me(auth):
+            return {"ok": True}
+
+        # A cpu_bound async callable comes back from the pool as a coroutine
+        @app_offloaded.add_endpoint("/me", auth_middleware=cpu_bound(AsyncVerifier()))
+        def me_offloaded(auth):
+            return {"ok": True}
+
+        assert request(app, "/me", token="wrong-token")[0] == 500
+        assert request(app_offloaded, "/me", token="wrong-token")[0] == 401
+        app_offloaded.worker_pools.shutdown()
+
+    def test_cpu_bound_auth_middleware_runs_off_the_event_loop(self):
+        app = SecurAPI(max_workers=4)
+        threads = set()
+
+        @cpu_bound
+        def auth_middleware(token):
+            threads.add(threading.get_ident())
+            time.sleep(0.1)
+            return {"user_id": 1}
+
+        @app.add_endpoint("/me", auth_middleware=auth_middleware)
+        def me(auth):
+            return auth
+
+        start = time.perf_counter()
+        statuses = [status for status, _, _ in concurrent_requests(app, "/me", 4, token="valid-token")]
+        assert statuses == [200] * 4
+        # The four 100 ms validations overlap instead of blocking the loop in turn
+        assert time.perf_counter() - start < 0.3
+        assert threading.get_ident() not in threads
+        app.worker_pools.shutdown()
+
+    def test_cpu_bound_auth_middleware_in_process_pool(self):
+        app = SecurAPI(max_workers=1)
+        principals = []
+
+        @app.add_endpoint("/me", auth_middleware=process_auth_middleware)
+        def me(auth):
+            principals.append(auth)
+            return auth
+
+        assert request(app, "/me", token="valid-token")[0] == 200
+        assert request(app, "/me", token="wrong-token")[0] == 401
+        assert principals[0]["pid"] != os.getpid()
+        app.worker_pools.shutdown()
+
+    def test_invalid_pool(self):
+        try:
+            cpu_bound(pool="gpu")
+            assert False
+        except ValueError:
+            pass
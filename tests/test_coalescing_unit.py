@@ -0,0 +1,110 @@
+import asyncio
+from ..coalescing import SingleFlight
+from ..compression import Compression
+from ..main import SecurAPI
+from .helpers import concurrent_requests
+
+
+class TestCoalescingUnit:
+    def test_identical_requests_share_one_handler_call(self):
+        app = SecurAPI()
+        calls = []
+
+        @app.add_endpoint("/search", coalesce=True)
+        async def search(q, page="1"):
+            calls.append((q, page))
+            await asyncio.sleep(0.01)
+            return {"q": q, "page": page}
+
+        responses = concurrent_requests(app, "/search", 50, query_string=b"q=shoes")
+        assert calls == [("shoes", "1")]
+        assert all(response == responses[0] for response in responses)
+        assert responses[0][2] == b'{"q":"shoes","page":"1"}'
+        assert app.single_flight.stats() == {
+            "in_flight": 0,
+            "leaders": 1,
+            "coalesced": 49,
+            "rejected": 0,
+        }
+        # Once it is done, the next request runs the handler again
+        concurrent_requests(app, "/search", 1, query_string=b"page=1&q=shoes")
+        assert len(calls) == 2
+
+    def test_errors_reach_every_waiter(self):
+        app = SecurAPI()
+        calls = []
+
+        @app.add_endpoint("/items/{id:int}", coalesce=True)
+        async def get_item(id):
+            calls.append(id)
+            await asyncio.sleep(0.01)
+            raise KeyError(id)
+
+        responses = concurrent_requests(app, "/items/1", 10)
+        assert len(calls) == 1
+        assert {status for status, _, _ in responses} == {400}
+        assert app.single_flight.flights == {}
+
+    def test_waiters_are_capped(self):
+        app = SecurAPI(single_flight=SingleFlight(max_waiters=3))
+        calls = []
+
+        @app.add_endpoint("/slow", coalesce=True)
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"ok": True}
+
+        statuses = sorted(status for status, _, _ in concurrent_requests(app, "/slow", 10))
+        assert statuses == [200] * 4 + [503] * 6
+        assert app.single_flight.stats()["rejected"] == 6
+        assert calls == [1]
+
+    def test_each_request_gets_its_own_encoding_and_etag_check(self):
+        app = SecurAPI(compression=Compression(min_size=10))
+
+        @app.add_endpoint("/items", coalesce=True, etag=True)
+        async def items():
+            await asyncio.sleep(0.01)
+            return [{"id": i} for i in range(10)]
+
+        plain = concurrent_requests(app, "/items", 2)
+        etag = plain[0][1][b"etag"].decode()
+        compressed = concurrent_requests(app, "/items", 2, accept_encoding="gzip")
+        assert all(headers[b"content-encoding"] == b"gzip" for _, headers, _ in compressed)
+        not_modified = concurrent_requests(app, "/items", 2, if_none_match=etag)
+        assert [status for status, _, _ in not_modified] == [304, 304]
+
+    def test_streams_are_not_shared(self):
+        app = SecurAPI()
+        calls = []
+
+        @app.add_endpoint("/events", coalesce=True)
+        async def events():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            for i in range(3):
+                yield {"event": i}
+
+        responses = concurrent_requests(app, "/events", 3)
+        assert len(calls) == 3
+        assert all(response == responses[0] for response in responses)
+
+    def test_invalid_configuration(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/items", "POST", coalesce=True)
+        def create():
+            return {}
+
+        @app.add_endpoint("/echo", coalesce=True)
+        def echo(request):
+            return {}
+
+        assert "/items/" not in app.routes["POST"]
+        assert "/echo/" not in app.routes["GET"]
+        try:
+            SecurAPI(single_flight=object())
+            assert False
+        except ValueError:
+            pass
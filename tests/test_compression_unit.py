@@ -0,0 +1,125 @@
+import asyncio
+import gzip
+import json
+import zlib
+from ..compression import Compression
+from ..main import SecurAPI
+from ..responses import PreencodedResponse, StreamingResponse
+from .helpers import make_scope, request, run_request
+
+
+ROWS = [{"id": i, "name": f"user {i}", "active": True} for i in range(200)]
+
+
+def compressed_app(**kwargs):
+    app = SecurAPI(compression=Compression(**kwargs))
+
+    @app.add_endpoint("/rows")
+    def rows():
+        return ROWS
+
+    @app.add_endpoint("/small")
+    def small():
+        return {"ok": True}
+
+    return app
+
+
+class TestCompressionUnit:
+    def test_gzip(self):
+        app = compressed_app()
+        status, headers, body = request(app, "/rows", accept_encoding="gzip, deflate, br")
+        assert status == 200
+        assert headers[b"content-encoding"] == b"gzip"
+        assert headers[b"vary"] == b"accept-encoding"
+        assert headers[b"content-length"] == str(len(body)).encode()
+        assert json.loads(gzip.decompress(body)) == ROWS
+        assert app.compression.stats()["bytes_out"] == len(body)
+
+    def test_deflate_and_negotiation(self):
+        app = compressed_app()
+        status, headers, body = request(app, "/rows", accept_encoding="gzip;q=0, deflate")
+        assert headers[b"content-encoding"] == b"deflate"
+        assert json.loads(zlib.decompress(body)) == ROWS
+        assert request(app, "/rows", accept_encoding="*")[1][b"content-encoding"] == b"gzip"
+        headers = request(app, "/rows", accept_encoding="deflate;q=0.5, gzip;q=0.8")[1]
+        assert headers[b"content-encoding"] == b"gzip"
+        for accept_encoding in (None, "identity", "br", "*;q=0"):
+            status, headers, body = request(app, "/rows", accept_encoding=accept_encoding)
+            assert b"content-encoding" not in headers
+            assert json.loads(body) == ROWS
+
+    def test_small_and_compressed_bodies_are_sent_as_they_are(self):
+        app = compressed_app()
+
+        @app.add_endpoint("/logo")
+        def logo():
+            return PreencodedResponse(200, b"\x89PNG" * 1000, ((b"content-type", b"image/png"),))
+
+        status, headers, body = request(app, "/small", accept_encoding="gzip")
+        assert b"content-encoding" not in headers
+        assert body == b'{"ok":true}'
+        status, headers, body = request(app, "/logo", accept_encoding="gzip")
+        assert b"content-encoding" not in headers
+        assert body == b"\x89PNG" * 1000
+
+    def test_streams_are_compressed_as_they_are_sent(self):
+        app = compressed_app()
+        decompressor = zlib.decompressobj(31)
+        received = []
+
+        @app.add_endpoint("/events")
+        async def events():
+            for i in range(3):
+                # Each event can be decompressed before the next one is produced
+                assert len(received) == i
+                yield {"event": i}
+
+        async def on_message(message):
+            if message.get("body"):
+                received.append(decompressor.decompress(message["body"]))
+
+        scope = make_scope("/events", accept_encoding="gzip")
+        headers = dict(asyncio.run(run_request(app, scope, on_message=on_message))[0]["headers"])
+        assert headers[b"content-encoding"] == b"gzip"
+        assert b"content-length" not in headers
+        assert [json.loads(line) for line in b"".join(received).splitlines()] == [
+            {"event": 0},
+            {"event": 1},
+            {"event": 2},
+        ]
+        assert decompressor.eof
+
+    def test_large_bodies_are_compressed_off_the_event_loop(self):
+        app = compressed_app(offload_size=4096)
+        rows = [{"id": i, "payload": "x" * 100} for i in range(20_000)]
+
+        @app.add_endpoint("/export")
+        def export():
+            return StreamingResponse(iter(rows), framing="json_array")
+
+        @app.add_endpoint("/large")
+        def large():
+            return rows
+
+        status, headers, body = request(app, "/export", accept_encoding="gzip")
+        assert json.loads(gzip.decompress(body)) == rows
+        assert app.compression.stats()["offloaded"] > 1
+        status, headers, body = request(app, "/large", accept_encoding="deflate")
+        assert b"content-length" not in headers
+        assert json.loads(zlib.decompress(body)) == rows
+        stats = app.compression.stats()
+        assert stats["responses"] == 2
+        assert stats["bytes_out"] < stats["bytes_in"] / 10
+
+    def test_invalid_configuration(self):
+        try:
+            Compression(encodings=("br",))
+            assert False, "br is not supported"
+        except ValueError:
+            pass
+        try:
+            SecurAPI(compression="gzip")
+            assert False, "compression must be a Compression"
+        except ValueError:
+            pass
@@ -0,0 +1,170 @@
+import asyncio
+from ..main import SecurAPI
+from ..security.distributedRateLimiting import DistributedRateLimiter
+from ..security.rateLimitStores import MemoryStore, RedisStore, encode_command
+from .resp_test_server import RespTestServer
+from .helpers import FakeClock, request
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def hits(rate_limiter, ip_address, count):
+    return [await rate_limiter.new_request_allowed(ip_address) for _ in range(count)]
+
+
+class TestDistributedRateLimitUnit:
+    def test_encode_command(self):
+        assert encode_command("INCRBY", "k", 2) == b"*3\r\n$6\r\nINCRBY\r\n$1\r\nk\r\n$1\r\n2\r\n"
+
+    def test_memory_store_limit(self):
+        clock = FakeClock()
+        rate_limiter = DistributedRateLimiter(
+            max_requests=3, time_window=60, clock=clock, local_ratio=0
+        )
+        assert run(hits(rate_limiter, "1.1.1.1", 4)) == [True, True, True, False]
+        assert run(hits(rate_limiter, "2.2.2.2", 1)) == [True]
+        assert rate_limiter.is_ip_suspected("1.1.1.1")
+        assert rate_limiter.retry_after("1.1.1.1") > 0
+        # Two windows later the counters are gone
+        clock.now += 120
+        assert run(hits(rate_limiter, "1.1.1.1", 1)) == [True]
+
+    def test_redis_store_shares_the_limit_between_limiters(self):
+        async def scenario():
+            server = await RespTestServer().start()
+            clock = FakeClock()
+            hosts = [
+                DistributedRateLimiter(
+                    RedisStore(port=server.port, pool_size=2),
+                    max_requests=4,
+                    time_window=60,
+                    clock=clock,
+                    local_ratio=0,
+                )
+                for _ in range(2)
+            ]
+            results = []
+            for i in range(6):
+                results.append(await hosts[i % 2].new_request_allowed("1.1.1.1"))
+            for host in hosts:
+                await host.close()
+            await server.stop()
+            return server, results
+
+        server, results = run(scenario())
+        assert results == [True, True, True, True, False, False]
+        # The last request is rejected from the cached counters, without a round trip
+        assert server.transactions == 5
+        assert all(ttl == 120_000 for ttl in server.ttls.values())
+
+    def test_local_cache_skips_round_trips(self):
+        async def scenario():
+            server = await RespTestServer().start()
+            clock = FakeClock()
+            rate_limiter = DistributedRateLimiter(
+                RedisStore(port=server.port),
+                max_requests=10,
+                time_window=60,
+                clock=clock,
+                local_ratio=0.5,
+            )
+            results = await hits(rate_limiter, "1.1.1.1", 12)
+            await rate_limiter.close()
+            await server.stop()
+            return server, rate_limiter, results
+
+        server, rate_limiter, results = run(scenario())
+        assert results == [True] * 10 + [False] * 2
+        # Requests 2-5 are accepted locally and sent with the 6th
+        assert rate_limiter.local_hits == 4
+        assert server.transactions == 6
+        # The last two are rejected from the cached counters
+        assert server.data["securapi:rate-limit:1.1.1.1:16"] == 10
+        assert rate_limiter.stats()["store_hits"] == 6
+
+    def test_pending_requests_flushed_to_the_previous_window(self):
+        async def scenario():
+            server = await RespTestServer().start()
+            clock = FakeClock(1000.0)
+            rate_limiter = DistributedRateLimiter(
+                RedisStore(port=server.port),
+                max_requests=10,
+                time_window=60,
+                clock=clock,
+                local_ratio=0.3,
+            )
+            await hits(rate_limiter, "1.1.1.1", 3)
+            clock.now = 1021.0
+            await hits(rate_limiter, "1.1.1.1", 1)
+            await rate_limiter.close()
+            await server.stop()
+            return server
+
+        server = run(scenario())
+        # Requests 2 and 3 were accepted locally, the first round trip of the
+        # next window adds them to their own window counter
+        assert server.data["securapi:rate-limit:1.1.1.1:16"] == 3
+        assert server.data["securapi:rate-limit:1.1.1.1:17"] == 1
+
+    def test_fail_open_and_fail_closed(self):
+        async def scenario(fail_open):
+            server = await RespTestServer(delay=0.2).start()
+            rate_limiter = DistributedRateLimiter(
+                RedisStore(port=server.port),
+                max_requests=10,
+                timeout=0.01,
+                fail_open=fail_open,
+            )
+            result = await rate_limiter.new_request_allowed("1.1.1.1")
+            await rate_limiter.close()
+            await server.stop()
+            return rate_limiter, result
+
+        rate_limiter, allowed = run(scenario(True))
+        assert allowed is True
+        assert rate_limiter.stats()["store_errors"] == 1
+        # The request is sent with the next round trip
+        assert rate_limiter.requests["1.1.1.1"].pending == 1
+        rate_limiter, allowed = run(scenario(False))
+        assert allowed is False
+        assert rate_limiter.requests["1.1.1.1"].pending == 0
+
+    def test_unreachable_store(self):
+        async def scenario():
+            rate_limiter = DistributedRateLimiter(RedisStore(port=1), fail_open=False)
+            return await rate_limiter.new_request_allowed("1.1.1.1")
+
+        assert run(scenario()) is False
+
+    def test_connection_pool_is_reused_and_bounded(self):
+        async def scenario():
+            server = await RespTestServer(delay=0.001).start()
+            store = RedisStore(port=server.port, pool_size=3)
+            await asyncio.gather(*(store.hit(f"10.0.0.{i}", 1, 1, 60) for i in range(30)))
+            await asyncio.gather(*(store.hit(f"10.0.0.{i}", 1, 1, 60) for i in range(30)))
+            await store.close()
+            await server.stop()
+            return server
+
+        server = run(scenario())
+        assert server.connections == 3
+        assert server.data["securapi:rate-limit:10.0.0.7:1"] == 2
+
+    def test_app_awaits_async_limiters(self):
+        store = MemoryStore()
+        app = SecurAPI(
+            rate_limiter=DistributedRateLimiter(store, max_requests=2, local_ratio=0)
+        )
+
+        @app.add_endpoint("/health")
+        def health():
+            return {"response": "OK"}
+
+        assert [request(app, "/health")[0] for _ in range(3)] == [200, 200, 429]
+        assert request(app, "/missing", ip_address="10.0.0.1")[0] == 404
+        assert [request(app, "/missing", ip_address="10.0.0.2")[0] for _ in range(3)] == [404, 404, 429]
+        status, headers, _ = request(app, "/health")
+        assert status == 429
+        assert b"retry-after" in headers
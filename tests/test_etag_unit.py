@@ -0,0 +1,123 @@
+from ..compression import Compression
+from ..etags import body_etag
+from ..main import SecurAPI
+from ..serializers import JSONSerializer
+from .helpers import ReprSerializer, request
+
+
+class TestETagUnit:
+    def test_etag_of_the_body(self):
+        app = SecurAPI()
+        calls = []
+        item = {"id": 1, "name": "widget"}
+
+        @app.add_endpoint("/item", etag=True)
+        def get_item():
+            calls.append(1)
+            return item
+
+        status, headers, body = request(app, "/item")
+        etag = headers[b"etag"].decode()
+        assert status == 200 and len(etag) == 34 and etag[0] == etag[-1] == '"'
+        status, headers, body = request(app, "/item", if_none_match=etag)
+        assert (status, body) == (304, b"")
+        assert headers == {b"etag": etag.encode()}
+        for if_none_match in (f'"other", W/{etag}', "*"):
+            assert request(app, "/item", if_none_match=if_none_match)[0] == 304
+        item["name"] = "gadget"
+        status, headers, body = request(app, "/item", if_none_match=etag)
+        assert status == 200
+        assert headers[b"etag"].decode() != etag
+        assert len(calls) == 5
+
+    def test_etag_func_skips_the_handler(self):
+        app = SecurAPI()
+        calls = []
+        versions = {"1": 7}
+
+        def item_version(request):
+            return versions.get(request.path_params["id"])
+
+        @app.add_endpoint("/items/{id}", etag_func=item_version)
+        def get_item(id):
+            calls.append(id)
+            return {"id": id}
+
+        status, headers, _ = request(app, "/items/1")
+        etag = headers[b"etag"].decode()
+        assert request(app, "/items/1", if_none_match=etag)[0] == 304
+        assert calls == ["1"]
+        versions["1"] = 8
+        assert request(app, "/items/1", if_none_match=etag)[0] == 200
+        assert calls == ["1", "1"]
+        # No version: the ETag is hashed from the body
+        status, headers, _ = request(app, "/items/2")
+        assert request(app, "/items/2", if_none_match=headers[b"etag"].decode())[0] == 304
+
+    def test_each_representation_has_its_own_etag(self):
+        app = SecurAPI(serializers=[JSONSerializer(), ReprSerializer()])
+        app_compressed = SecurAPI(compression=Compression(min_size=10))
+
+        for app_ in (app, app_compressed):
+
+            @app_.add_endpoint("/items", etag_func=lambda request: "v1")
+            def items():
+                return [{"id": i} for i in range(10)]
+
+        json_etag = request(app, "/items")[1][b"etag"]
+        repr_etag = request(app, "/items", accept="application/x-repr")[1][b"etag"]
+        assert json_etag != repr_etag
+        status, headers, _ = request(app_compressed, "/items", accept_encoding="gzip")
+        gzip_etag = headers[b"etag"].decode()
+        assert headers[b"content-encoding"] == b"gzip"
+        assert gzip_etag.endswith('-gzip"')
+        status, headers, _ = request(
+            app_compressed, "/items", accept_encoding="gzip", if_none_match=gzip_etag
+        )
+        assert status == 304
+        assert headers[b"etag"] == gzip_etag.encode()
+
+    def test_constant_endpoints(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/version", constant=True, etag=True)
+        def version():
+            return {"version": "1.0"}
+
+        @app.add_endpoint("/gone", constant=True, etag=True)
+        def gone():
+            return 410, {"error": "gone"}
+
+        status, headers, _ = request(app, "/version")
+        assert request(app, "/version", if_none_match=headers[b"etag"].decode())[0] == 304
+        # Only 200 responses have an ETag to match
+        assert request(app, "/gone", if_none_match='"abc-gzip"')[0] == 410
+        assert request(app, "/gone", if_none_match="*")[0] == 410
+
+    def test_large_bodies_sent_in_one_message(self):
+        app = SecurAPI()
+
+        # Encoded in pieces (1024 entries or more), sent whole (under 1 MB)
+        @app.add_endpoint("/ids", etag=True)
+        def ids():
+            return list(range(1500))
+
+        status, headers, body = request(app, "/ids")
+        assert headers[b"etag"] == body_etag(body)
+        assert headers[b"content-length"] == str(len(body)).encode()
+        assert request(app, "/ids", if_none_match=headers[b"etag"].decode())[0] == 304
+
+    def test_only_successful_get_responses(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/missing", etag=True)
+        def missing():
+            return 404, {"error": "missing"}
+
+        @app.add_endpoint("/items", "POST", etag=True)
+        def create():
+            return {}
+
+        assert b"etag" not in request(app, "/missing")[1]
+        assert request(app, "/missing", if_none_match="*")[0] == 404
+        assert "/items/" not in app.routes["POST"]
@@ -111,6 +111,14 @@ def test_app():
     @app.add_endpoint("/price", "GET")
     def price_endpoint():
         return {"response": "Price: €99.99"}
+
+    @app.add_endpoint("/users/{id:int}/orders/{order_id}", "GET")
+    def user_order(id, order_id, expand="no"):
+        return {"id": id, "order_id": order_id, "expand": expand}
+
+    @app.add_endpoint("/files/{path:*}", "GET")
+    def file_path(path):
+        return {"path": path}
     
     return app
 
@@ -231,6 +239,35 @@ class TestSecurAPIIntegrationParams:
         response = httpx.get(f"{running_server.base_url}/nonexistent/")
         assert response.status_code == 404
 
+class TestSecurAPIIntegrationPathParams:
+    """Integration tests for path parameters"""
+
+    def test_typed_path_params(self, running_server):
+        """Test path params are converted and passed to the handler"""
+        response = httpx.get(
+            f"{running_server.base_url}/users/12/orders/ab-3", params={"expand": "yes"}
+        )
+        assert response.status_code == 200
+        assert response.json() == {"id": 12, "order_id": "ab-3", "expand": "yes"}
+
+    def test_path_param_type_mismatch(self, running_server):
+        """Test a segment that doesn't match the declared type is a 404"""
+        response = httpx.get(f"{running_server.base_url}/users/twelve/orders/ab-3")
+        assert response.status_code == 404
+
+    def test_path_param_not_accepted_as_query_param(self, running_server):
+        """Test path params can't be overridden from the query string"""
+        response = httpx.get(
+            f"{running_server.base_url}/users/12/orders/ab-3", params={"id": "1"}
+        )
+        assert response.status_code == 400
+
+    def test_catch_all_path_param(self, running_server):
+        """Test catch-all path param"""
+        response = httpx.get(f"{running_server.base_url}/files/docs/2024/report.pdf")
+        assert response.status_code == 200
+        assert response.json() == {"path": "docs/2024/report.pdf"}
+
 class TestSecurAPIIntegrationStatusCodes:
     """Integration tests for custom status codes"""
 
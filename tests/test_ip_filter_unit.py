@@ -0,0 +1,121 @@
+import random
+from ..main import SecurAPI
+from ..security.ipFiltering import ALLOW, DENY, IPFilter
+from ..security.rateLimiting import RateLimiterMiddleware
+from .helpers import request
+
+
+class TestIPFilterUnit:
+    def test_longest_prefix_wins(self):
+        ip_filter = IPFilter(allow=["10.1.2.0/24"], deny=["10.0.0.0/8"])
+        assert ip_filter.check("10.1.2.3") == ALLOW
+        assert ip_filter.check("10.1.3.3") == DENY
+        assert ip_filter.check("11.0.0.1") == 0
+        ip_filter.deny("10.1.2.128/25")
+        assert ip_filter.check("10.1.2.127") == ALLOW
+        assert ip_filter.check("10.1.2.200") == DENY
+
+    def test_deny_wins_on_the_same_prefix(self):
+        ip_filter = IPFilter(allow=["192.168.0.0/16"], deny=["192.168.0.0/16"])
+        assert ip_filter.is_denied("192.168.1.1")
+        assert len(ip_filter) == 1
+
+    def test_ipv6_and_mapped_ipv4(self):
+        ip_filter = IPFilter(allow=["2001:db8::/32", "127.0.0.1/32"], deny=["::/0"])
+        assert ip_filter.is_allowed("2001:db8::1")
+        assert ip_filter.is_denied("2001:db9::1")
+        assert ip_filter.is_allowed("::ffff:127.0.0.1")
+        assert ip_filter.is_allowed("fe80::1%eth0") is False
+        # An IPv6 catch all does not cover IPv4 clients
+        assert ip_filter.check("8.8.8.8") == 0
+
+    def test_invalid_addresses_match_nothing(self):
+        ip_filter = IPFilter(deny=["0.0.0.0/0", "::/0"])
+        assert ip_filter.check("testclient") == 0
+        assert ip_filter.check("999.1.1.1") == 0
+        assert ip_filter.check(None) == 0
+
+    def test_matches_ipaddress_on_many_prefixes(self):
+        rng = random.Random(7)
+        networks = []
+        ip_filter = IPFilter()
+        for _ in range(2_000):
+            prefix_length = rng.randint(8, 32)
+            address = rng.getrandbits(32) >> (32 - prefix_length) << (32 - prefix_length)
+            verdict = rng.choice((ALLOW, DENY))
+            cidr = f"{address >> 24}.{address >> 16 & 255}.{address >> 8 & 255}.{address & 255}/{prefix_length}"
+            networks.append((prefix_length, address, verdict))
+            (ip_filter.allow if verdict == ALLOW else ip_filter.deny)(cidr)
+        for _ in range(2_000):
+            # Half of the probes fall inside a listed network
+            if rng.random() < 0.5:
+                prefix_length, address, _ = rng.choice(networks)
+                address |= rng.getrandbits(32 - prefix_length) if prefix_length < 32 else 0
+            else:
+                address = rng.getrandbits(32)
+            expected, longest = 0, -1
+            for prefix_length, network, verdict in networks:
+                if address >> (32 - prefix_length) == network >> (32 - prefix_length):
+                    if prefix_length > longest or (prefix_length == longest and verdict == DENY):
+                        expected, longest = verdict, prefix_length
+            ip = ".".join(str(address >> shift & 255) for shift in (24, 16, 8, 0))
+            assert ip_filter.check(ip) == expected
+
+    def test_denied_clients_get_403_without_limiter_state(self):
+        rate_limiter = RateLimiterMiddleware(max_requests=1)
+        app = SecurAPI(rate_limiter=rate_limiter, denylist=["203.0.113.0/24"])
+
+        @app.add_endpoint("/health")
+        def health():
+            return {"response": "OK"}
+
+        assert request(app, "/health", ip_address="203.0.113.9")[0] == 403
+        assert request(app, "/missing", ip_address="203.0.113.9")[0] == 403
+        assert rate_limiter.tracked_clients == 0
+        assert rate_limiter.requests == {}
+        assert request(app, "/health", ip_address="198.51.100.1")[0] == 200
+
+    def test_allowlisted_clients_skip_the_rate_limiter(self):
+        rate_limiter = RateLimiterMiddleware(max_requests=1)
+        endpoint_limiter = RateLimiterMiddleware(max_requests=1)
+        app = SecurAPI(rate_limiter=rate_limiter, allowlist=["10.0.0.0/8"])
+
+        @app.add_endpoint("/health")
+        def health():
+            return {"response": "OK"}
+
+        @app.add_endpoint("/report", rate_limit=endpoint_limiter)
+        def report():
+            return {"response": "report"}
+
+        for path, status in (("/health", 200), ("/report", 200), ("/missing", 404)):
+            assert all(request(app, path, ip_address="10.0.0.5")[0] == status for _ in range(5))
+        assert rate_limiter.tracked_clients == 0
+        assert endpoint_limiter.tracked_clients == 0
+        assert [request(app, "/health", ip_address="192.0.2.1")[0] for _ in range(2)] == [200, 429]
+
+    def test_lists_can_change_at_runtime(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/health")
+        def health():
+            return {"response": "OK"}
+
+        assert request(app, "/health", ip_address="192.0.2.1")[0] == 200
+        app.ip_filter.deny("192.0.2.0/24")
+        assert request(app, "/health", ip_address="192.0.2.1")[0] == 403
+
+    def test_constant_handler_called_once_for_both_plans(self):
+        calls = []
+        app = SecurAPI(
+            rate_limiter=RateLimiterMiddleware(max_requests=100), allowlist=["10.0.0.0/8"]
+        )
+
+        @app.add_endpoint("/version", constant=True)
+        def version():
+            calls.append(1)
+            return {"version": "1.0"}
+
+        assert request(app, "/version", ip_address="10.0.0.1")[0] == 200
+        assert request(app, "/version", ip_address="192.0.2.1")[0] == 200
+        assert len(calls) == 1
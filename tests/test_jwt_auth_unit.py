@@ -0,0 +1,122 @@
+import base64
+import json
+import os
+import time
+import jwt
+from ..main import SecurAPI
+from ..security.jwtAuth import JWTVerifier
+from .helpers import request
+
+SECRET = "a-very-long-test-secret-for-hs256-tokens"
+
+
+def token(claims=None, secret=SECRET, kid=None, exp_in=60):
+    payload = {"sub": "alice", "exp": int(time.time()) + exp_in}
+    payload.update(claims or {})
+    headers = {"kid": kid} if kid else None
+    return jwt.encode(payload, secret, algorithm="HS256", headers=headers)
+
+
+def write_jwks(path, keys):
+    """keys: {kid: secret}"""
+    jwks = {
+        "keys": [
+            {
+                "kty": "oct",
+                "kid": kid,
+                "alg": "HS256",
+                "k": base64.urlsafe_b64encode(secret.encode()).rstrip(b"=").decode(),
+            }
+            for kid, secret in keys.items()
+        ]
+    }
+    path.write_text(json.dumps(jwks))
+    # Make sure the mtime changes even within the filesystem time resolution
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class TestJWTAuthUnit:
+    def test_verify_claims(self):
+        verifier = JWTVerifier(SECRET, algorithms=["HS256"], audience="api", issuer="auth")
+        claims = verifier(token({"aud": "api", "iss": "auth"}))
+        assert claims["sub"] == "alice"
+        assert verifier(token({"aud": "other", "iss": "auth"})) is None
+        assert verifier(token({"aud": "api", "iss": "evil"})) is None
+        assert verifier(token({"aud": "api", "iss": "auth"}, exp_in=-10)) is None
+        assert verifier(token({"aud": "api", "iss": "auth", "nbf": int(time.time()) + 60})) is None
+        assert verifier(token({"aud": "api", "iss": "auth"}, secret="wrong-secret-wrong-secret-wrong!")) is None
+        assert verifier("not-a-jwt") is None
+
+    def test_audience_is_checked_when_none_is_expected(self):
+        verifier = JWTVerifier(SECRET, algorithms=["HS256"])
+        assert verifier(token())["sub"] == "alice"
+        # A token minted for another service
+        assert verifier(token({"aud": "other-service"})) is None
+
+    def test_exp_is_required(self):
+        verifier = JWTVerifier(SECRET, algorithms=["HS256"])
+        assert verifier(jwt.encode({"sub": "alice"}, SECRET, algorithm="HS256")) is None
+
+    def test_other_algorithms_rejected(self):
+        verifier = JWTVerifier(SECRET, algorithms=["HS256"])
+        forged = jwt.encode({"sub": "alice", "exp": int(time.time()) + 60}, SECRET, algorithm="HS512")
+        assert verifier(forged) is None
+
+    def test_verified_tokens_cached_until_exp(self):
+        verifier = JWTVerifier(SECRET, algorithms=["HS256"])
+        calls = []
+        verify = verifier.verify
+        verifier.verify = lambda token: calls.append(token) or verify(token)
+        valid = token(exp_in=30)
+        for _ in range(3):
+            assert verifier(valid)["sub"] == "alice"
+            assert verifier("not-a-jwt") is None
+        assert len(calls) == 2
+        expiration, _ = next(iter(verifier.cache.entries.values()))
+        assert expiration <= time.time() + 30
+
+    def test_cache_disabled(self):
+        verifier = JWTVerifier(SECRET, algorithms=["HS256"], cache_size=0)
+        assert verifier.cache is None
+        assert verifier(token())["sub"] == "alice"
+
+    def test_jwks_key_rotation(self, tmp_path):
+        jwks_path = tmp_path / "jwks.json"
+        write_jwks(jwks_path, {"2024": SECRET})
+        verifier = JWTVerifier(algorithms=["HS256"], jwks_path=str(jwks_path))
+        assert verifier(token(kid="2024"))["sub"] == "alice"
+        new_secret = "another-long-secret-for-the-new-signing-key"
+        new_token = token(secret=new_secret, kid="2025")
+        assert verifier.verify(new_token) is None
+        # The new key is picked up as soon as a token uses its kid
+        write_jwks(jwks_path, {"2025": new_secret})
+        assert verifier(new_token)["sub"] == "alice"
+        # and the removed one stops being accepted, cached or not
+        assert verifier(token(kid="2024")) is None
+
+    def test_jwks_broken_file_keeps_the_last_keys(self, tmp_path):
+        jwks_path = tmp_path / "jwks.json"
+        write_jwks(jwks_path, {"2024": SECRET})
+        verifier = JWTVerifier(
+            algorithms=["HS256"], jwks_path=str(jwks_path), jwks_reload_interval=0, cache_size=0
+        )
+        jwks_path.write_text("{not json")
+        assert verifier(token(kid="2024"))["sub"] == "alice"
+
+    def test_key_or_jwks_needed(self):
+        try:
+            JWTVerifier(algorithms=["HS256"])
+            assert False
+        except ValueError:
+            pass
+
+    def test_as_auth_middleware(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/me", auth_middleware=JWTVerifier(SECRET, algorithms=["HS256"]))
+        def me(auth):
+            return {"user": auth["sub"]}
+
+        assert request(app, "/me", token=token())[0] == 200
+        assert request(app, "/me", token=token(exp_in=-10))[0] == 401
@@ -0,0 +1,20 @@
+from ..negotiation import HeaderCache, quality_values
+
+
+class TestNegotiationUnit:
+    def test_quality_values(self):
+        assert quality_values("GZIP;q=0.5, deflate, br;Q=0, *;q=oops") == [
+            ("gzip", 0.5),
+            ("deflate", 1.0),
+            ("br", 0.0),
+            ("*", 0.0),
+        ]
+        assert quality_values("text/html;level=1;q=0.8, ") == [("text/html", 0.8), ("", 1.0)]
+
+    def test_header_cache_is_bounded(self):
+        cache = HeaderCache(max_entries=2)
+        cache.store(b"a", 1)
+        cache.store(b"b", None)
+        assert cache == {b"a": 1, b"b": None}
+        cache.store(b"c", 3)
+        assert cache == {b"c": 3}
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+from ..main import SecurAPI
+from ..offloading import THREAD, WorkerPools
+from .helpers import concurrent_requests, make_scope, request, response, run_request
+
+
+class TestOffloadingUnit:
+    def test_sync_handlers_run_off_the_event_loop(self):
+        app = SecurAPI(max_workers=4)
+        threads = set()
+
+        @app.add_endpoint("/report")
+        def report():
+            threads.add(threading.get_ident())
+            time.sleep(0.1)
+            return {"rows": 100}
+
+        start = time.perf_counter()
+        assert [status for status, _, _ in concurrent_requests(app, "/report", 4)] == [200] * 4
+        # The four 100 ms handlers overlap instead of blocking the loop in turn
+        assert time.perf_counter() - start < 0.3
+        assert threading.get_ident() not in threads
+        app.worker_pools.shutdown()
+
+    def test_inline_handlers_run_on_the_event_loop(self):
+        app = SecurAPI()
+        threads = []
+
+        @app.add_endpoint("/health", inline=True)
+        def health():
+            threads.append(threading.get_ident())
+            return {"response": "OK"}
+
+        @app.add_endpoint("/events", inline=True)
+        def events():
+            threads.append(threading.get_ident())
+            yield {"event": 1}
+
+        assert request(app, "/health")[0] == 200
+        assert request(app, "/events")[0] == 200
+        assert threads == [threading.get_ident()] * 2
+        assert app.worker_pools.stats()["completed"] == 0
+
+    def test_blocking_sync_generators_stream_from_the_pool(self):
+        app = SecurAPI()
+        threads = []
+
+        @app.add_endpoint("/export")
+        def export():
+            for i in range(3):
+                threads.append(threading.get_ident())
+                time.sleep(0.2)  # a blocking DB cursor
+                yield {"row": i}
+
+        @app.add_endpoint("/health")
+        async def health():
+            return {"response": "OK"}
+
+        async def body(path):
+            return response(await run_request(app, make_scope(path)))[2]
+
+        async def run():
+            export_task = asyncio.create_task(body("/export"))
+            # Counted from when /health is due, a blocked loop delays its start
+            due = time.perf_counter() + 0.05
+            await asyncio.sleep(0.05)
+            await body("/health")
+            return time.perf_counter() - due, await export_task
+
+        health_latency, export_body = asyncio.run(run())
+        assert export_body == b'{"row":0}\n{"row":1}\n{"row":2}\n'
+        # /health doesn't wait for the 0.6 s of blocking rows
+        assert health_latency < 0.1
+        assert threading.get_ident() not in threads
+        app.worker_pools.shutdown()
+
+    def test_offload_auth(self):
+        app = SecurAPI(offload_auth=True)
+        threads = []
+
+        def auth_middleware(token):
+            threads.append(threading.get_ident())
+            return {"user_id": 1} if token == "valid-token" else None
+
+        @app.add_endpoint("/me", auth_middleware=auth_middleware, inline=True)
+        def me(auth):
+            return auth
+
+        assert request(app, "/me", token="valid-token")[0] == 200
+        assert request(app, "/me", token="wrong-token")[0] == 401
+        assert threading.get_ident() not in threads
+        app.worker_pools.shutdown()
+
+    def test_queue_depth_and_wait_stats(self):
+        app = SecurAPI(max_workers=1)
+
+        @app.add_endpoint("/report")
+        def report():
+            time.sleep(0.02)
+            return {"rows": 100}
+
+        assert [status for status, _, _ in concurrent_requests(app, "/report", 3)] == [200] * 3
+        stats = app.worker_pools.stats()
+        assert (stats["workers"], stats["queued"], stats["running"]) == (1, 0, 0)
+        assert stats["completed"] == 3
+        # The last one waited for the other two
+        assert stats["wait_max"] >= 0.03
+        assert 0 < stats["wait_avg"] < stats["wait_max"]
+        app.worker_pools.shutdown()
+
+    def test_tasks_of_cancelled_requests_are_skipped(self):
+        pools = WorkerPools(max_workers=1)
+        calls = []
+
+        async def run():
+            blocker = asyncio.create_task(pools.run(THREAD, time.sleep, 0.05))
+            waiting = asyncio.create_task(pools.run(THREAD, calls.append, 1))
+            await asyncio.sleep(0.01)
+            assert pools.stats()["queued"] == 1
+            waiting.cancel()
+            await blocker
+            await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+        assert calls == []
+        assert pools.stats()["queued"] == 0
+        pools.shutdown()
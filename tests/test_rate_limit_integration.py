@@ -43,6 +43,8 @@ class TestRateLimiterIntegration:
             # Third request should be blocked due to rate limiting
             response3 = client.get(f"{base_url}/")
             assert response3.status_code == 429  # Assuming 429 for rate limit exceeded
+            assert response3.json() == {"error": "Rate limit exceeded"}
+            assert 1 <= int(response3.headers["retry-after"]) <= 5
             
             # Wait for time window to expire
             time.sleep(6)
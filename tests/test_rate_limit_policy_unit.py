@@ -0,0 +1,142 @@
+from ..main import SecurAPI
+from ..security.rateLimiting import RateLimiterMiddleware, RateLimitPolicy
+from .helpers import request
+
+
+def auth_middleware(token):
+    return {"alice-token": "alice", "bob-token": "bob"}.get(token)
+
+
+class TestRateLimitPolicyUnit:
+    def test_endpoint_limit_replaces_app_limit(self):
+        app = SecurAPI(rate_limiter=RateLimiterMiddleware(max_requests=100))
+        report_limiter = RateLimiterMiddleware(max_requests=2)
+
+        @app.add_endpoint("/health")
+        def health():
+            return {"response": "OK"}
+
+        @app.add_endpoint("/report", rate_limit=report_limiter)
+        def report():
+            return {"response": "report"}
+
+        assert [request(app, "/report")[0] for _ in range(3)] == [200, 200, 429]
+        assert all(request(app, "/health")[0] == 200 for _ in range(10))
+        # Each request was checked by exactly one limiter
+        assert len(report_limiter.requests["127.0.0.1"]) == 3
+        assert len(app.rate_limiter.requests["127.0.0.1"]) == 10
+
+    def test_unmatched_routes_use_app_limit(self):
+        app = SecurAPI(rate_limiter=RateLimiterMiddleware(max_requests=2))
+        assert [request(app, "/missing")[0] for _ in range(3)] == [404, 404, 429]
+
+    def test_principal_keyed_limit(self):
+        app = SecurAPI()
+        policy = RateLimitPolicy(
+            RateLimiterMiddleware(max_requests=1, mode="gcra"), key="principal"
+        )
+
+        @app.add_endpoint("/me", auth_middleware=auth_middleware, rate_limit=policy)
+        def me():
+            return {"response": "me"}
+
+        assert request(app, "/me", ip_address="10.0.0.1", token="alice-token")[0] == 200
+        status, headers, _ = request(app, "/me", ip_address="10.0.0.2", token="alice-token")
+        assert status == 429
+        assert b"retry-after" in headers
+        assert request(app, "/me", ip_address="10.0.0.1", token="bob-token")[0] == 200
+        # Failed authentications are counted by address, then stopped before auth
+        assert request(app, "/me", ip_address="10.0.0.1", token="wrong-token")[0] == 401
+        assert request(app, "/me", ip_address="10.0.0.1", token="wrong-token")[0] == 429
+        assert set(policy.rate_limiter.requests) == {"alice", "bob", "10.0.0.1"}
+
+    def test_app_limit_stays_in_front_of_principal_limits(self):
+        app = SecurAPI(rate_limiter=RateLimiterMiddleware(2, 60))
+        calls = []
+
+        def counting_auth_middleware(token):
+            calls.append(token)
+            return auth_middleware(token)
+
+        @app.add_endpoint(
+            "/me",
+            auth_middleware=counting_auth_middleware,
+            rate_limit=RateLimitPolicy(RateLimiterMiddleware(100, 60), key="principal"),
+        )
+        def me():
+            return {"response": "me"}
+
+        statuses = [request(app, "/me", token="bad")[0] for _ in range(6)]
+        assert statuses == [401, 401, 429, 429, 429, 429]
+        assert len(calls) == 2
+
+    def test_claims_are_limited_by_subject(self):
+        app = SecurAPI()
+        policy = RateLimitPolicy(RateLimiterMiddleware(2, 60), key="principal")
+
+        # Every token of the same user has its own iat and jti
+        @app.add_endpoint(
+            "/me",
+            auth_middleware=lambda token: {"sub": "alice", "jti": token, "iat": len(token)},
+            rate_limit=policy,
+        )
+        def me():
+            return {"response": "me"}
+
+        statuses = [request(app, "/me", token=f"token-{i}")[0] for i in range(4)]
+        assert statuses == [200, 200, 429, 429]
+        assert set(policy.rate_limiter.requests) == {"alice"}
+
+        @app.add_endpoint("/objects", auth_middleware=lambda token: object(), rate_limit=policy)
+        def objects():
+            return {}
+
+        # A principal without a stable identity needs a key callable
+        assert request(app, "/objects", token="valid-token")[0] == 500
+
+    def test_custom_key(self):
+        app = SecurAPI()
+        policy = RateLimitPolicy(
+            RateLimiterMiddleware(max_requests=1), key=lambda scope, principal: "everyone"
+        )
+
+        @app.add_endpoint("/shared", rate_limit=policy)
+        def shared():
+            return {"response": "shared"}
+
+        assert request(app, "/shared", ip_address="10.0.0.1")[0] == 200
+        assert request(app, "/shared", ip_address="10.0.0.2")[0] == 429
+
+    def test_invalid_policies(self):
+        app = SecurAPI()
+        policy = RateLimitPolicy(RateLimiterMiddleware(), key="principal")
+
+        @app.add_endpoint("/no-auth", rate_limit=policy)
+        def no_auth():
+            return {}
+
+        @app.add_endpoint("/not-a-limiter", rate_limit=10)
+        def not_a_limiter():
+            return {}
+
+        assert app.is_valid_route("/no-auth/", "GET") is False
+        assert app.is_valid_route("/not-a-limiter/", "GET") is False
+        try:
+            RateLimitPolicy(RateLimiterMiddleware(), key="cookie")
+            assert False
+        except ValueError:
+            pass
+
+    def test_rate_limiters_deduplicated(self):
+        shared = RateLimiterMiddleware()
+        app = SecurAPI(rate_limiter=shared)
+
+        @app.add_endpoint("/a", rate_limit=shared)
+        def a():
+            return {}
+
+        @app.add_endpoint("/b", rate_limit=RateLimiterMiddleware())
+        def b():
+            return {}
+
+        assert len(app.rate_limiters()) == 2
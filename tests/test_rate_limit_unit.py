@@ -1,5 +1,7 @@
+import asyncio
 from ..security.rateLimiting import RateLimiterMiddleware
 import time
+from .helpers import FakeClock
 
 
 
@@ -29,3 +31,173 @@ class TestRateLimiterUnit:
 
         assert rate_limiter.new_request_allowed(ip_address) is True
         assert rate_limiter.is_ip_suspected(ip_address) is False
+
+
+class TestRateLimiterModesUnit:
+    def test_invalid_mode(self):
+        try:
+            RateLimiterMiddleware(mode="unknown")
+            assert False
+        except ValueError:
+            pass
+
+    def test_ring_buffer_is_exact_sliding_log(self):
+        clock = FakeClock()
+        rate_limiter = RateLimiterMiddleware(3, 10, mode="ring_buffer", clock=clock)
+        ip_address = "127.0.0.1"
+        for offset in (0, 1, 2):
+            clock.now = 1000 + offset
+            assert rate_limiter.new_request_allowed(ip_address) is True
+        assert rate_limiter.new_request_allowed(ip_address) is False
+        assert rate_limiter.is_ip_suspected(ip_address) is True
+        clock.now = 1010  # first request left the window
+        assert rate_limiter.new_request_allowed(ip_address) is True
+        assert rate_limiter.new_request_allowed(ip_address) is False
+        clock.now = 1012
+        assert rate_limiter.new_request_allowed(ip_address) is True
+        assert rate_limiter.is_ip_suspected(ip_address) is False
+        assert len(rate_limiter.requests[ip_address].timestamps) == 3
+
+    def test_sliding_window_weights_previous_window(self):
+        clock = FakeClock(1000.0)
+        rate_limiter = RateLimiterMiddleware(10, 10, mode="sliding_window", clock=clock)
+        ip_address = "127.0.0.1"
+        for _ in range(10):
+            assert rate_limiter.new_request_allowed(ip_address) is True
+        assert rate_limiter.new_request_allowed(ip_address) is False
+        # 75% through the next window: 10 * 0.25 = 2.5 requests still count
+        clock.now = 1017.5
+        for _ in range(8):
+            assert rate_limiter.new_request_allowed(ip_address) is True
+        assert rate_limiter.new_request_allowed(ip_address) is False
+        # Two windows later nothing counts
+        clock.now = 1030.0
+        for _ in range(10):
+            assert rate_limiter.new_request_allowed(ip_address) is True
+
+    def test_clients_are_independent(self):
+        for mode in ("exact", "sliding_window", "ring_buffer"):
+            rate_limiter = RateLimiterMiddleware(1, 10, mode=mode, clock=FakeClock())
+            assert rate_limiter.new_request_allowed("10.0.0.1") is True
+            assert rate_limiter.new_request_allowed("10.0.0.1") is False
+            assert rate_limiter.new_request_allowed("10.0.0.2") is True
+
+
+class TestRateLimiterMemoryUnit:
+    def test_max_clients_evicts_least_recently_active(self):
+        clock = FakeClock()
+        rate_limiter = RateLimiterMiddleware(5, 10, max_clients=3, clock=clock)
+        for ip_address in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+            rate_limiter.new_request_allowed(ip_address)
+        rate_limiter.new_request_allowed("10.0.0.1")
+        rate_limiter.new_request_allowed("10.0.0.4")
+        assert rate_limiter.tracked_clients == 3
+        assert rate_limiter.evictions == 1
+        assert "10.0.0.2" not in rate_limiter.requests
+        assert "10.0.0.1" in rate_limiter.requests
+
+    def test_sweep_expires_idle_clients_in_batches(self):
+        clock = FakeClock()
+        rate_limiter = RateLimiterMiddleware(1, 10, clock=clock)
+        for i in range(10):
+            rate_limiter.new_request_allowed(f"10.0.0.{i}")
+        rate_limiter.new_request_allowed("10.0.0.0")
+        assert rate_limiter.is_ip_suspected("10.0.0.0") is True
+        clock.now += 5
+        rate_limiter.new_request_allowed("10.0.1.1")
+        clock.now += 6
+        assert rate_limiter.sweep(batch_size=4) == 4
+        assert rate_limiter.sweep(batch_size=4) == 4
+        assert rate_limiter.sweep(batch_size=4) == 2
+        assert rate_limiter.tracked_clients == 1
+        assert rate_limiter.requests.keys() == {"10.0.1.1"}
+        assert rate_limiter.ip_sus == set()
+        assert rate_limiter.stats()["expired"] == 10
+
+    def test_new_clients_expire_idle_ones(self):
+        clock = FakeClock()
+        rate_limiter = RateLimiterMiddleware(1, 10, mode="ring_buffer", clock=clock)
+        for i in range(1000):
+            clock.now += 1
+            rate_limiter.new_request_allowed(f"10.0.{i // 256}.{i % 256}")
+        # Only clients seen in the last time_window are kept
+        assert rate_limiter.tracked_clients <= 11
+
+    def test_sliding_window_keeps_previous_window(self):
+        clock = FakeClock(1005.0)
+        rate_limiter = RateLimiterMiddleware(10, 10, mode="sliding_window", clock=clock)
+        for _ in range(10):
+            rate_limiter.new_request_allowed("10.0.0.1")
+        # Idle for more than time_window, but the previous window still counts
+        clock.now = 1016.0
+        assert rate_limiter.sweep() == 0
+        for _ in range(6):
+            assert rate_limiter.new_request_allowed("10.0.0.1") is True
+        assert rate_limiter.new_request_allowed("10.0.0.1") is False
+        clock.now = 1037.0
+        assert rate_limiter.sweep() == 1
+
+    def test_run_sweeper(self):
+        clock = FakeClock()
+        rate_limiter = RateLimiterMiddleware(1, 10, clock=clock, sweep_interval=0.01)
+        for i in range(50):
+            rate_limiter.new_request_allowed(f"10.0.0.{i}")
+        clock.now += 10
+
+        async def run():
+            task = asyncio.create_task(rate_limiter.run_sweeper(batch_size=7))
+            await asyncio.sleep(0.05)
+            task.cancel()
+
+        asyncio.run(run())
+        assert rate_limiter.tracked_clients == 0
+        assert rate_limiter.requests == {}
+
+
+class TestRateLimiterGCRAUnit:
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        # 1 token per sec, bursts of up to 3
+        rate_limiter = RateLimiterMiddleware(
+            60, 60, mode="gcra", burst=3, refill_rate=1, clock=clock
+        )
+        ip_address = "127.0.0.1"
+        for _ in range(3):
+            assert rate_limiter.new_request_allowed(ip_address) is True
+        assert rate_limiter.new_request_allowed(ip_address) is False
+        assert rate_limiter.is_ip_suspected(ip_address) is True
+        assert abs(rate_limiter.retry_after(ip_address) - 1.0) < 1e-9
+        # No lockout: one token is back after one sec
+        clock.now += 1
+        assert rate_limiter.retry_after(ip_address) is None
+        assert rate_limiter.new_request_allowed(ip_address) is True
+        assert rate_limiter.new_request_allowed(ip_address) is False
+        clock.now += 10
+        for _ in range(3):
+            assert rate_limiter.new_request_allowed(ip_address) is True
+        assert isinstance(rate_limiter.requests[ip_address], float)
+
+    def test_defaults_from_max_requests(self):
+        clock = FakeClock()
+        rate_limiter = RateLimiterMiddleware(5, 10, mode="gcra", clock=clock)
+        assert rate_limiter.emission_interval == 2
+        for _ in range(5):
+            assert rate_limiter.new_request_allowed("127.0.0.1") is True
+        assert rate_limiter.new_request_allowed("127.0.0.1") is False
+        clock.now += 10
+        assert rate_limiter.sweep() == 1
+
+
+class TestRateLimiterRetryAfterUnit:
+    def test_retry_after_per_mode(self):
+        expected = {"exact": 10, "ring_buffer": 10, "sliding_window": 10}
+        for mode, delay in expected.items():
+            clock = FakeClock(1000.0)
+            rate_limiter = RateLimiterMiddleware(2, 10, mode=mode, clock=clock)
+            assert rate_limiter.retry_after("127.0.0.1") is None
+            rate_limiter.new_request_allowed("127.0.0.1")
+            rate_limiter.new_request_allowed("127.0.0.1")
+            assert rate_limiter.new_request_allowed("127.0.0.1") is False
+            assert abs(rate_limiter.retry_after("127.0.0.1") - delay) < 1e-9, mode
+            clock.now += delay + 0.01
+            assert rate_limiter.new_request_allowed("127.0.0.1") is True, mode
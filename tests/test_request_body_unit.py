@@ -0,0 +1,145 @@
+import asyncio
+import tracemalloc
+from typing import AsyncIterator
+from ..main import SecurAPI
+from .helpers import body_receiver, make_scope, response, run_request
+
+MB = 1024 * 1024
+
+
+def post(app, path, chunks, content_length=None):
+    """POST chunks through the app in process, returns (status, body, receive calls)"""
+    if content_length is not None:
+        content_length = str(content_length)
+    scope = make_scope(path, "POST", content_length=content_length)
+    receive_chunk = body_receiver(*chunks)
+    calls = []
+
+    async def receive():
+        calls.append(1)
+        return await receive_chunk()
+
+    status, _, body = response(asyncio.run(run_request(app, scope, receive)))
+    return status, body, len(calls)
+
+
+class TestRequestBodyUnit:
+    def test_body_types_by_annotation(self):
+        app = SecurAPI()
+        seen = {}
+
+        @app.add_endpoint("/text", "POST")
+        def text(request_body):
+            seen["text"] = request_body
+            return {}
+
+        @app.add_endpoint("/bytes", "POST")
+        def raw(request_body: bytes):
+            seen["bytes"] = request_body
+            return {}
+
+        @app.add_endpoint("/view", "POST")
+        def view(request_body: memoryview):
+            seen["view"] = request_body
+            return {}
+
+        @app.add_endpoint("/stream", "POST")
+        async def stream(request_body: AsyncIterator[bytes]):
+            seen["stream"] = [chunk async for chunk in request_body]
+            return {}
+
+        chunks = [b"hel", b"lo"]
+        for path in ("/text", "/bytes", "/view", "/stream"):
+            assert post(app, path, chunks)[0] == 201
+        assert seen["text"] == "hello"
+        assert type(seen["bytes"]) is bytes and seen["bytes"] == b"hello"
+        assert type(seen["view"]) is memoryview and seen["view"] == b"hello"
+        assert seen["stream"] == [b"hel", b"lo"]
+
+    def test_single_message_body_is_not_copied(self):
+        app = SecurAPI()
+        body = b"x" * 1000
+        seen = []
+
+        @app.add_endpoint("/bytes", "POST")
+        def raw(request_body: bytes):
+            seen.append(request_body)
+            return {}
+
+        post(app, "/bytes", [body])
+        assert seen[0] is body
+
+    def test_rejected_from_content_length_before_reading(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/upload", "POST", max_body_size=100)
+        def upload(request_body: bytes):
+            return {}
+
+        status, body, receive_calls = post(app, "/upload", [b"x" * 200], content_length=200)
+        assert status == 400
+        assert b"too large" in body
+        assert receive_calls == 0
+
+    def test_limit_per_endpoint_without_content_length(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/small", "POST", max_body_size=10)
+        def small(request_body):
+            return {}
+
+        @app.add_endpoint("/large", "POST", max_body_size=5 * MB)
+        def large(request_body: bytes):
+            return {"size": len(request_body)}
+
+        assert post(app, "/small", [b"x" * 6, b"x" * 6])[0] == 400
+        # Reading stops at the first chunk over the limit
+        assert post(app, "/small", [b"x" * 11, b"x", b"x"])[2] == 1
+        chunks = [b"x" * 65536] * 32
+        assert post(app, "/large", chunks) == (201, b'{"size":2097152}', 32)
+        assert post(app, "/large", chunks * 3)[0] == 400
+
+    def test_stream_limit(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/stream", "POST", max_body_size=10)
+        async def stream(request_body: AsyncIterator[bytes]):
+            return {"size": sum([len(chunk) async for chunk in request_body])}
+
+        assert post(app, "/stream", [b"x" * 5, b"x" * 5])[1] == b'{"size":10}'
+        assert post(app, "/stream", [b"x" * 5, b"x" * 6])[0] == 400
+
+    def test_request_object_uses_the_endpoint_limit(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/upload", "POST", max_body_size=10)
+        async def upload(request):
+            return {"size": len(await request.body())}
+
+        assert post(app, "/upload", [b"x" * 10])[1] == b'{"size":10}'
+        assert post(app, "/upload", [b"x" * 11])[0] == 400
+        assert post(app, "/upload", [b"x"], content_length=11)[0] == 400
+
+    def test_50mb_upload_memory(self):
+        app = SecurAPI()
+        size = 50 * MB
+        chunks = [b"x" * 65536] * (size // 65536)
+
+        @app.add_endpoint("/stream", "POST", max_body_size=size)
+        async def stream(request_body: AsyncIterator[bytes]):
+            total = 0
+            async for chunk in request_body:
+                total += len(chunk)
+            return {"size": total}
+
+        @app.add_endpoint("/view", "POST", max_body_size=size)
+        def view(request_body: memoryview):
+            return {"size": len(request_body)}
+
+        for path, max_peak in (("/stream", MB), ("/view", 1.2 * size)):
+            tracemalloc.start()
+            status, body, _ = post(app, path, chunks)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            assert (status, body) == (201, b'{"size":%d}' % size)
+            assert peak < max_peak
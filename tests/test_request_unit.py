@@ -0,0 +1,125 @@
+import asyncio
+from ..main import SecurAPI
+from ..request import Request, parse_cookies
+from .helpers import request
+
+
+def scope_with(headers=(), query_string=b"", client=("10.0.0.1", 5000)):
+    return {
+        "type": "http",
+        "method": "POST",
+        "path": "/items/",
+        "query_string": query_string,
+        "headers": list(headers),
+        "client": client,
+    }
+
+
+def counting_receiver(*chunks):
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    calls = []
+
+    async def receive():
+        calls.append(1)
+        return messages[len(calls) - 1]
+
+    return receive, calls
+
+
+class TestRequestUnit:
+    def test_nothing_is_parsed_until_used(self):
+        request = Request(scope_with([(b"x-trace", b"1")], b"a=1"))
+        assert request.header_index is None
+        assert request.query_map is None
+        assert request.cookie_map is None
+        assert request.body_bytes is None
+        assert request.method == "POST"
+        assert request.path == "/items/"
+        assert request.client == "10.0.0.1"
+        assert request.header_index is None
+
+    def test_headers_are_case_insensitive(self):
+        request = Request(
+            scope_with([(b"Content-Type", b"application/json"), (b"x-trace", b"abc")])
+        )
+        assert request.header("content-type") == "application/json"
+        assert request.header("X-Trace") == "abc"
+        assert request.header("missing", "default") == "default"
+        assert request.headers == {"content-type": "application/json", "x-trace": "abc"}
+        # The index is built once and reused
+        index = request.header_index
+        request.header("x-trace")
+        assert request.header_index is index
+
+    def test_repeated_headers_are_combined(self):
+        request = Request(
+            scope_with(
+                [
+                    (b"accept", b"text/html"),
+                    (b"accept", b"application/json"),
+                    (b"cookie", b"a=1"),
+                    (b"cookie", b"b=2"),
+                ]
+            )
+        )
+        assert request.header("accept") == "text/html, application/json"
+        assert request.cookies == {"a": "1", "b": "2"}
+
+    def test_query(self):
+        request = Request(scope_with(query_string=b"q=hello%20world&page=2&page=3&empty="))
+        assert request.query == {"q": "hello world", "page": "3", "empty": ""}
+
+    def test_parse_cookies(self):
+        assert parse_cookies('session=abc123; theme="dark"; broken; name=J%C3%BCrgen') == {
+            "session": "abc123",
+            "theme": "dark",
+            "name": "Jürgen",
+        }
+        assert parse_cookies("") == {}
+
+    def test_client_unknown(self):
+        assert Request(scope_with(client=None)).client is None
+
+    def test_body_is_read_once(self):
+        receive, calls = counting_receiver(b'{"name": ', b'"widget"}')
+        request = Request(scope_with(), receive)
+
+        async def read_twice():
+            return await request.json(), await request.text()
+
+        assert asyncio.run(read_twice()) == ({"name": "widget"}, '{"name": "widget"}')
+        assert len(calls) == 2
+
+    def test_handler_opts_in_by_parameter_name(self):
+        app = SecurAPI()
+        seen = []
+
+        @app.add_endpoint("/items/{item_id:int}", "POST")
+        async def create(item_id, request, request_body):
+            seen.append(
+                (item_id, request.header("x-trace"), request.cookies, request_body, await request.json())
+            )
+            return {"ok": True}
+
+        endpoint = app.routes["POST"]["/items/{item_id:int}/"]
+        assert endpoint.wants_request is True
+        assert "request" not in endpoint.params
+        status = request(
+            app, "/items/7", "POST", body=b'{"name": "widget"}', x_trace="abc", cookie="session=1"
+        )[0]
+        assert status == 201
+        assert seen == [(7, "abc", {"session": "1"}, '{"name": "widget"}', {"name": "widget"})]
+
+    def test_auth_uses_the_header_index(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/me", auth_middleware=lambda token: token == "valid-token")
+        def me(request):
+            return {"auth_header": request.header("authorization")}
+
+        status, _, body = request(app, "/me", Authorization="Bearer valid-token")
+        assert status == 200
+        assert body == b'{"auth_header":"Bearer valid-token"}'
@@ -0,0 +1,136 @@
+from ..caching import ResponseCache
+from ..main import SecurAPI
+from .helpers import FakeClock, request
+
+
+class TestResponseCacheUnit:
+    def test_cached_per_normalized_params_until_the_ttl(self):
+        clock = FakeClock()
+        app = SecurAPI(response_cache=ResponseCache(clock=clock))
+        calls = []
+
+        @app.add_endpoint("/search", cache_ttl=30)
+        def search(q, page="1"):
+            calls.append((q, page))
+            return {"q": q, "page": page}
+
+        first = request(app, "/search", query_string=b"q=shoes&page=1")
+        assert request(app, "/search", query_string=b"page=1&q=shoes") == first
+        assert request(app, "/search", query_string=b"q=shoes") == first
+        assert calls == [("shoes", "1")]
+        request(app, "/search", query_string=b"q=shoes&page=2")
+        assert len(calls) == 2
+        clock.now += 31
+        assert request(app, "/search", query_string=b"q=shoes")[2] == first[2]
+        assert len(calls) == 3
+        assert app.response_cache.stats() == {
+            "entries": 2,
+            "bytes": app.response_cache.size,
+            "hits": 2,
+            "misses": 3,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def test_only_200_responses_are_cached(self):
+        app = SecurAPI()
+        calls = []
+
+        @app.add_endpoint("/items/{id:int}", cache_ttl=30)
+        def get_item(id):
+            calls.append(id)
+            return (200, {"id": id}) if id == 1 else (404, {"error": "missing"})
+
+        for _ in range(2):
+            request(app, "/items/1")
+            request(app, "/items/2")
+        assert calls == [1, 2, 2]
+
+    def test_tag_invalidation(self):
+        app = SecurAPI()
+        products = {"1": "shoes", "2": "boots"}
+        calls = []
+
+        @app.add_endpoint("/products", cache_ttl=60, cache_tags=("products",))
+        def list_products():
+            calls.append("list")
+            return products
+
+        @app.add_endpoint("/products/{id}", cache_ttl=60, cache_tags=("product:{id}",))
+        def get_product(id):
+            calls.append(id)
+            return {"name": products[id]}
+
+        @app.add_endpoint("/products/{id}", "PUT", invalidates=("products", "product:{id}"))
+        def rename(id, name):
+            products[id] = name
+            return {}
+
+        for path in ("/products", "/products/1", "/products/2") * 2:
+            request(app, path)
+        assert calls == ["list", "1", "2"]
+        assert request(app, "/products/1", "PUT", b"name=sandals")[0] == 200
+        assert request(app, "/products/1")[2] == b'{"name":"sandals"}'
+        request(app, "/products")
+        request(app, "/products/2")
+        assert calls == ["list", "1", "2", "1", "list"]
+        assert app.response_cache.stats()["invalidations"] == 2
+
+    def test_bounded_by_entries_and_bytes(self):
+        cache = ResponseCache(max_entries=3, max_bytes=1000)
+        headers = [(b"content-type", b"application/json")]
+        for key in "abc":
+            cache.store(key, 200, headers, b"x" * 100, 60)
+        cache.lookup("a")
+        cache.store("d", 200, headers, b"x" * 100, 60)
+        assert list(cache.entries) == ["c", "a", "d"]
+        cache.store("e", 200, headers, b"x" * 800, 60)
+        assert list(cache.entries) == ["d", "e"]
+        assert cache.size <= 1000
+        cache.store("f", 200, headers, b"x" * 2000, 60)
+        assert "f" not in cache.entries
+        assert cache.stats()["evictions"] == 3
+
+    def test_works_with_etags_and_auth(self):
+        app = SecurAPI()
+        calls = []
+
+        def auth_middleware(token):
+            return {"alice-token": "alice", "bob-token": "bob"}.get(token)
+
+        @app.add_endpoint("/me", auth_middleware=auth_middleware, cache_ttl=60, etag=True)
+        def me(auth):
+            calls.append(auth)
+            return {"user": auth}
+
+        status, headers, body = request(app, "/me", authorization="Bearer alice-token")
+        assert body == b'{"user":"alice"}'
+        assert request(app, "/me", authorization="Bearer bob-token")[2] == b'{"user":"bob"}'
+        etag = headers[b"etag"].decode()
+        status, _, body = request(
+            app, "/me", authorization="Bearer alice-token", if_none_match=etag
+        )
+        assert (status, body) == (304, b"")
+        assert request(app, "/me")[0] == 401
+        assert calls == ["alice", "bob"]
+        # Raw tokens are never kept in the keys
+        assert "alice-token" not in repr(list(app.response_cache.entries))
+
+    def test_invalid_configuration(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/items", "POST", cache_ttl=60)
+        def create():
+            return {}
+
+        @app.add_endpoint("/echo", cache_ttl=60)
+        def echo(request):
+            return {}
+
+        @app.add_endpoint("/tags", cache_ttl=60, cache_tags=("item:{id}",))
+        def tags():
+            return {}
+
+        assert "/items/" not in app.routes["POST"]
+        assert "/echo/" not in app.routes["GET"]
+        assert "/tags/" not in app.routes["GET"]
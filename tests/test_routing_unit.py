@@ -0,0 +1,89 @@
+from ..main import SecurAPI
+from ..routing import RouteTree, path_param_names
+
+
+class TestRouteTreeUnit:
+    def test_static_route(self):
+        tree = RouteTree({"GET"})
+        tree.add("GET", "/health/", "health")
+        assert tree.resolve("GET", "/health/") == ("health", {})
+        assert tree.resolve("GET", "/health") is None
+        assert tree.resolve("GET", "/other/") is None
+
+    def test_typed_path_params(self):
+        tree = RouteTree({"GET"})
+        tree.add("GET", "/users/{id:int}/orders/{order_id}/", "orders")
+        assert tree.resolve("GET", "/users/7/orders/abc/") == (
+            "orders",
+            {"id": 7, "order_id": "abc"},
+        )
+        assert tree.resolve("GET", "/users/seven/orders/abc/") is None
+        assert tree.resolve("GET", "/users/7/orders//") is None
+
+    def test_static_segment_wins_over_param(self):
+        tree = RouteTree({"GET"})
+        tree.add("GET", "/users/{name}/", "by_name")
+        tree.add("GET", "/users/{id:int}/", "by_id")
+        tree.add("GET", "/users/me/", "me")
+        assert tree.resolve("GET", "/users/me/") == ("me", {})
+        assert tree.resolve("GET", "/users/12/") == ("by_id", {"id": 12})
+        assert tree.resolve("GET", "/users/bob/") == ("by_name", {"name": "bob"})
+
+    def test_backtracks_to_other_branch(self):
+        tree = RouteTree({"GET"})
+        tree.add("GET", "/files/latest/info/", "info")
+        tree.add("GET", "/files/{name}/raw/", "raw")
+        assert tree.resolve("GET", "/files/latest/raw/") == ("raw", {"name": "latest"})
+
+    def test_catch_all(self):
+        tree = RouteTree({"GET"})
+        tree.add("GET", "/static/{path:*}/", "static")
+        assert tree.resolve("GET", "/static/css/site/main.css/") == (
+            "static",
+            {"path": "css/site/main.css"},
+        )
+        assert tree.resolve("GET", "/static/") is None
+
+    def test_invalid_templates(self):
+        tree = RouteTree({"GET"})
+        for path in ("/a/{id:uuid}/", "/a/{path:*}/b/", "/a/{bad-name}/"):
+            try:
+                tree.add("GET", path, "x")
+                assert False, path
+            except ValueError:
+                pass
+        try:
+            path_param_names("/a/{id}/{id}/")
+            assert False
+        except ValueError:
+            pass
+
+    def test_methods_are_independent(self):
+        tree = RouteTree({"GET", "POST"})
+        tree.add("GET", "/items/{id:int}/", "get_item")
+        assert tree.resolve("POST", "/items/1/") is None
+
+
+class TestPathParamsEndpointUnit:
+    def test_path_params_are_not_query_params(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/users/{id:int}/orders/{order_id}")
+        def order(id, order_id, expand="no"):
+            return {"id": id}
+
+        endpoint = app.routes["GET"]["/users/{id:int}/orders/{order_id}/"]
+        assert endpoint.path_params == ["id", "order_id"]
+        assert endpoint.params == {"expand": "no"}
+        assert endpoint.required_params == []
+        assert app.is_valid_route("/users/1/orders/x/", "GET") is True
+        assert app.is_valid_route("/users/x/orders/x/", "GET") is False
+
+    def test_path_param_without_handler_argument(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/users/{id:int}")
+        def user():
+            return {}
+
+        assert app.is_valid_route("/users/1/", "GET") is False
@@ -0,0 +1,106 @@
+import json
+from ..main import SecurAPI
+from ..responses import PreencodedResponse, json_pieces
+from ..serializers import JSONSerializer, SerializerRegistry, parse_accept
+from .helpers import ReprSerializer, request, request_messages
+
+
+class TestSerializersUnit:
+    def test_compact_utf8_json_by_default(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/hola")
+        def hola():
+            return {"response": "¡Hola, Señor!", "items": [1, 2]}
+
+        status, headers, body = request(app, "/hola")
+        assert status == 200
+        assert body == '{"response":"¡Hola, Señor!","items":[1,2]}'.encode()
+        # Bytes, not characters
+        assert headers[b"content-length"] == str(len(body)).encode()
+        assert headers[b"content-type"] == b"application/json"
+        assert b"vary" not in headers
+
+    def test_bytes_and_preencoded_responses_are_sent_as_they_are(self):
+        app = SecurAPI()
+        cached = b'{"cached": true}'
+
+        @app.add_endpoint("/cached")
+        def get_cached():
+            return cached
+
+        @app.add_endpoint("/csv")
+        def get_csv():
+            return PreencodedResponse(200, b"a,b\n1,2\n", ((b"content-type", b"text/csv"),))
+
+        assert request_messages(app, "/cached")[1]["body"] is cached
+        status, headers, body = request(app, "/csv")
+        assert (status, headers[b"content-type"], body) == (200, b"text/csv", b"a,b\n1,2\n")
+
+    def test_accept_negotiation(self):
+        app = SecurAPI()
+        app.add_serializer(ReprSerializer())
+        calls = []
+
+        @app.add_endpoint("/item")
+        def item():
+            calls.append(1)
+            return {"id": 1}
+
+        status, headers, body = request(app, "/item", accept="application/x-repr")
+        assert (status, body) == (200, b"{'id': 1}")
+        assert headers[b"content-type"] == b"application/x-repr"
+        assert headers[b"vary"] == b"accept"
+        assert request(app, "/item")[2] == b'{"id":1}'
+        assert request(app, "/item", accept="text/html, */*;q=0.8")[2] == b'{"id":1}'
+        assert request(app, "/item", accept="application/json;q=0.5, application/x-repr")[2] == b"{'id': 1}"
+        assert len(calls) == 4
+        # Nothing fits: 406, without running the handler
+        assert request(app, "/item", accept="text/html")[0] == 406
+        assert request(app, "/item", accept="application/x-repr;q=0, application/json;q=0")[0] == 406
+        assert len(calls) == 4
+
+    def test_constant_endpoints_use_the_default_serializer(self):
+        app = SecurAPI(serializers=[ReprSerializer(), JSONSerializer()])
+
+        @app.add_endpoint("/version", constant=True)
+        def version():
+            return {"version": "1.0"}
+
+        status, headers, body = request(app, "/version", accept="application/json")
+        assert headers[b"content-type"] == b"application/x-repr"
+        assert body == b"{'version': '1.0'}"
+
+
+class TestSerializerRegistryUnit:
+    def test_parse_accept(self):
+        assert parse_accept("text/*, application/json;q=0.9, */*;q=0.1, text/html") == [
+            "text/html",
+            "text/*",
+            "application/json",
+            "*/*",
+        ]
+        assert parse_accept("application/json;q=0, ;q=1") == []
+
+    def test_replacing_a_serializer_keeps_its_place(self):
+        pretty = JSONSerializer(separators=(", ", ": "))
+        registry = SerializerRegistry([JSONSerializer(), ReprSerializer()])
+        registry.register(pretty)
+        assert registry.default is pretty
+        assert registry.select(b"application/*") is pretty
+        assert registry.select(b"application/x-repr").media_type == "application/x-repr"
+        assert registry.select(b"image/png") is None
+
+    def test_json_pieces_match_the_encoder(self):
+        content = {
+            "rows": [{"id": i, "name": "ñ" * (i % 3)} for i in range(3000)],
+            1: list(range(2000)),
+            "small": {"a": [1, 2]},
+        }
+        ascii_serializer = JSONSerializer(separators=(", ", ": "), ensure_ascii=True)
+        for serializer in (JSONSerializer(), ascii_serializer):
+            assert serializer.is_large(content)
+            assert "".join(serializer.pieces(content)) == serializer.encoder.encode(content)
+        assert "".join(json_pieces(content)) == json.dumps(
+            content, separators=(",", ":"), ensure_ascii=False
+        )
@@ -0,0 +1,77 @@
+import threading
+from ..security.shardedRateLimiting import ShardedRateLimiter
+from .helpers import FakeClock
+
+
+def hammer(rate_limiter, ip_addresses, requests, threads):
+    """Call new_request_allowed from several threads at once, returns allowed per ip"""
+    allowed = {ip_address: 0 for ip_address in ip_addresses}
+    counter_lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        local = dict.fromkeys(ip_addresses, 0)
+        barrier.wait()
+        for i in range(requests):
+            ip_address = ip_addresses[i % len(ip_addresses)]
+            if rate_limiter.new_request_allowed(ip_address):
+                local[ip_address] += 1
+        with counter_lock:
+            for ip_address, count in local.items():
+                allowed[ip_address] += count
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return allowed
+
+
+class TestShardedRateLimiterUnit:
+    def test_same_behavior_as_single_limiter(self):
+        clock = FakeClock()
+        rate_limiter = ShardedRateLimiter(2, 10, mode="ring_buffer", clock=clock, shards=4)
+        assert rate_limiter.new_request_allowed("10.0.0.1") is True
+        assert rate_limiter.new_request_allowed("10.0.0.1") is True
+        assert rate_limiter.new_request_allowed("10.0.0.1") is False
+        assert rate_limiter.is_ip_suspected("10.0.0.1") is True
+        assert rate_limiter.retry_after("10.0.0.1") == 10
+        assert rate_limiter.new_request_allowed("10.0.0.2") is True
+        assert rate_limiter.tracked_clients == 2
+        clock.now += 10
+        assert rate_limiter.sweep() == 2
+        assert rate_limiter.stats()["expired"] == 2
+
+    def test_stress_limit_is_exact_under_contention(self):
+        for mode in ("exact", "sliding_window", "ring_buffer", "gcra"):
+            rate_limiter = ShardedRateLimiter(
+                500, 3600, mode=mode, clock=FakeClock(), shards=8
+            )
+            ip_addresses = [f"10.0.0.{i}" for i in range(20)]
+            allowed = hammer(rate_limiter, ip_addresses, requests=2_000, threads=8)
+            # 8 threads x 2000 requests over 20 ips = 800 attempts per ip
+            assert allowed == dict.fromkeys(ip_addresses, 500), mode
+
+    def test_max_clients_split_between_shards(self):
+        rate_limiter = ShardedRateLimiter(max_clients=100, shards=4)
+        assert [shard.max_clients for shard in rate_limiter.shards] == [25] * 4
+        for i in range(1000):
+            rate_limiter.new_request_allowed(f"10.0.{i // 256}.{i % 256}")
+        assert rate_limiter.tracked_clients <= 100
+
+    def test_count_min_shares_one_sketch(self):
+        rate_limiter = ShardedRateLimiter(
+            500, 3600, mode="count_min", clock=FakeClock(), sketch_width=4096, top_k=20, shards=8
+        )
+        assert rate_limiter.shards == []
+        ip_addresses = [f"10.0.0.{i}" for i in range(20)]
+        allowed = hammer(rate_limiter, ip_addresses, requests=2_000, threads=8)
+        assert allowed == dict.fromkeys(ip_addresses, 500)
+        assert rate_limiter.stats()["sketch_bytes"] == 2 * 4 * 4096 * 4
+        # Rejected requests count too: 800 per ip
+        heavy_hitters = rate_limiter.heavy_hitters()
+        assert sorted(ip_address for ip_address, _, _ in heavy_hitters) == sorted(ip_addresses)
+        assert all(requests == 800 for _, requests, _ in heavy_hitters)
+        assert rate_limiter.is_ip_suspected("10.0.0.1") is True
+        assert rate_limiter.sweep() == 0
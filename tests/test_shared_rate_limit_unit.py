@@ -0,0 +1,73 @@
+import os
+import tempfile
+from multiprocessing import Process, Queue
+from ..security.sharedRateLimiting import SharedMemoryRateLimiter
+from .helpers import FakeClock
+
+
+def make_requests(path, requests, results):
+    rate_limiter = SharedMemoryRateLimiter(path, max_requests=100, time_window=60)
+    allowed = sum(rate_limiter.new_request_allowed("10.0.0.1") for _ in range(requests))
+    rate_limiter.close()
+    results.put(allowed)
+
+
+class TestSharedMemoryRateLimiterUnit:
+    def setup_method(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "rate-limit")
+
+    def teardown_method(self):
+        self.directory.cleanup()
+
+    def test_limit_shared_between_instances(self):
+        clock = FakeClock()
+        first = SharedMemoryRateLimiter(self.path, 3, 10, capacity=64, clock=clock)
+        second = SharedMemoryRateLimiter(self.path, 3, 10, capacity=64, clock=clock)
+        assert first.new_request_allowed("10.0.0.1") is True
+        assert second.new_request_allowed("10.0.0.1") is True
+        assert first.new_request_allowed("10.0.0.1") is True
+        assert second.new_request_allowed("10.0.0.1") is False
+        assert first.is_ip_suspected("10.0.0.1") is True
+        assert second.new_request_allowed("10.0.0.2") is True
+        clock.now += 20
+        assert first.new_request_allowed("10.0.0.1") is True
+        assert second.tracked_clients == 2
+        first.close()
+        second.close()
+
+    def test_configuration_mismatch(self):
+        SharedMemoryRateLimiter(self.path, 3, 10, capacity=64).close()
+        try:
+            SharedMemoryRateLimiter(self.path, 5, 10, capacity=64)
+            assert False
+        except ValueError:
+            pass
+
+    def test_full_group_reuses_oldest_slot(self):
+        clock = FakeClock()
+        # A single group of 16 slots
+        rate_limiter = SharedMemoryRateLimiter(self.path, 1, 10, capacity=16, clock=clock)
+        for i in range(16):
+            clock.now += 1
+            assert rate_limiter.new_request_allowed(f"10.0.0.{i}") is True
+        assert rate_limiter.tracked_clients == 16
+        assert rate_limiter.new_request_allowed("10.0.1.1") is True
+        assert rate_limiter.tracked_clients == 16
+        assert rate_limiter.evictions == 1
+        clock.now += 100
+        assert rate_limiter.sweep() == 16
+        assert rate_limiter.tracked_clients == 0
+        rate_limiter.close()
+
+    def test_limit_enforced_across_processes(self):
+        results = Queue()
+        processes = [
+            Process(target=make_requests, args=(self.path, 60, results)) for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        allowed = [results.get(timeout=30) for _ in processes]
+        for process in processes:
+            process.join(timeout=30)
+        assert sum(allowed) == 100
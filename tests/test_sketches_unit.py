@@ -0,0 +1,108 @@
+import math
+import random
+from ..security.rateLimiting import RateLimiterMiddleware
+from ..security.sketches import CountMinSketch, SpaceSaving, WindowedCountMin
+from .helpers import FakeClock
+
+
+class TestCountMinSketchUnit:
+    def test_documented_error_bound(self):
+        depth = 5
+        sketch = CountMinSketch(width=2_000, depth=depth, seed=b"securapi-tests")
+        generator = random.Random(7)
+        true_counts = {}
+        for i in range(20_000):
+            key = f"10.{i // 65536}.{i // 256 % 256}.{i % 256}"
+            count = generator.choice((1, 1, 1, 2, 5, 50))
+            true_counts[key] = count
+            sketch.add(key, count)
+        bound = math.e / sketch.width * sketch.total
+        assert sketch.error_bound() == bound
+        over_bound = 0
+        for key, count in true_counts.items():
+            estimate = sketch.estimate(key)
+            assert estimate >= count
+            if estimate - count > bound:
+                over_bound += 1
+        # Each estimate can break the bound with probability exp(-depth)
+        assert over_bound / len(true_counts) <= math.exp(-depth)
+
+    def test_memory_does_not_grow_with_keys(self):
+        sketch = CountMinSketch(width=1_024, depth=4)
+        memory = sketch.memory_bytes
+        for i in range(50_000):
+            sketch.add(str(i))
+        assert sketch.memory_bytes == memory == 4 * 1_024 * 4
+
+
+class TestSpaceSavingUnit:
+    def test_finds_heavy_hitters(self):
+        # Keys with more than N / k occurrences are guaranteed to be tracked
+        top = SpaceSaving(k=20)
+        generator = random.Random(3)
+        true_counts = {}
+        for i in range(20_000):
+            if i % 4 == 0:
+                key = f"attacker-{i % 3}"
+            else:
+                key = f"client-{generator.randrange(100_000)}"
+            true_counts[key] = true_counts.get(key, 0) + 1
+            top.add(key)
+        heaviest = top.top(3)
+        assert {key for key, _, _ in heaviest} == {"attacker-0", "attacker-1", "attacker-2"}
+        for key, count, error in heaviest:
+            assert count - error <= true_counts[key] <= count
+        assert len(top.keys) == 20
+
+    def test_heap_order(self):
+        top = SpaceSaving(k=3)
+        for key, count in (("a", 5), ("b", 1), ("c", 3), ("d", 1)):
+            top.add(key, count)
+        # "b" was the lightest, "d" inherits its count as error
+        assert top.top() == [("a", 5, 0), ("c", 3, 0), ("d", 2, 1)]
+
+
+class TestCountMinRateLimiterUnit:
+    def test_limits_like_sliding_window(self):
+        clock = FakeClock(1000.0)
+        rate_limiter = RateLimiterMiddleware(
+            5, 10, mode="count_min", clock=clock, sketch_width=1_024, sketch_depth=3
+        )
+        for _ in range(5):
+            assert rate_limiter.new_request_allowed("10.0.0.1") is True
+        assert rate_limiter.new_request_allowed("10.0.0.1") is False
+        assert rate_limiter.is_ip_suspected("10.0.0.1") is True
+        assert rate_limiter.retry_after("10.0.0.1") > 0
+        assert rate_limiter.new_request_allowed("10.0.0.2") is True
+        clock.now += 20
+        assert rate_limiter.new_request_allowed("10.0.0.1") is True
+        assert rate_limiter.tracked_clients == 0
+        assert rate_limiter.requests == {}
+
+    def test_heavy_hitters_include_rejected_requests(self):
+        clock = FakeClock(1000.0)
+        rate_limiter = RateLimiterMiddleware(3, 10, mode="count_min", clock=clock, top_k=5)
+        for _ in range(50):
+            rate_limiter.new_request_allowed("10.6.6.6")
+        for i in range(20):
+            rate_limiter.new_request_allowed(f"10.0.0.{i}")
+        ip_address, requests, _ = rate_limiter.heavy_hitters(1)[0]
+        assert (ip_address, requests) == ("10.6.6.6", 50)
+        try:
+            RateLimiterMiddleware().heavy_hitters()
+            assert False
+        except ValueError:
+            pass
+
+    def test_window_rotation(self):
+        sketches = WindowedCountMin(10, width=256, depth=2, seed=b"x")
+        assert sketches.hit("a", 1000.0, 2) is True
+        assert sketches.hit("a", 1001.0, 2) is True
+        assert sketches.hit("a", 1002.0, 2) is False
+        # Next window, half elapsed: 2 * 0.5 = 1 request still counts
+        assert sketches.hit("a", 1015.0, 2) is True
+        assert sketches.hit("a", 1015.0, 2) is False
+        assert sketches.heavy_hitters.top() == [("a", 2, 0)]
+        # Skipping a whole window forgets everything
+        assert sketches.hit("a", 1040.0, 1) is True
+        assert sketches.previous.total == 0
@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import json
+import tracemalloc
+from ..main import SecurAPI
+from ..responses import JSON_STREAM_THRESHOLD, StreamingResponse
+from .helpers import make_scope, request_messages, response, run_request
+
+
+class TestStreamingUnit:
+    def test_generator_of_items_is_ndjson(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/export")
+        def export():
+            for i in range(3):
+                yield {"id": i}
+
+        sent = request_messages(app, "/export")
+        assert sent[0]["status"] == 200
+        assert dict(sent[0]["headers"])[b"content-type"] == b"application/x-ndjson"
+        assert b"content-length" not in dict(sent[0]["headers"])
+        assert [json.loads(line) for line in response(sent)[2].splitlines()] == [
+            {"id": 0},
+            {"id": 1},
+            {"id": 2},
+        ]
+        assert all(message["more_body"] for message in sent[1:-1])
+        assert "more_body" not in sent[-1]
+
+    def test_async_generator_sends_each_item(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/events")
+        async def events():
+            for i in range(3):
+                await asyncio.sleep(0)
+                yield f"event {i}\n"
+
+        sent = request_messages(app, "/events")
+        assert dict(sent[0]["headers"])[b"content-type"] == b"text/plain; charset=utf-8"
+        assert [message["body"] for message in sent[1:]] == [
+            b"event 0\n",
+            b"event 1\n",
+            b"event 2\n",
+            b"",
+        ]
+
+    def test_json_array_framing_and_status(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/items")
+        def items():
+            return StreamingResponse(
+                ({"id": i} for i in range(3)), status=201, framing="json_array"
+            )
+
+        @app.add_endpoint("/empty")
+        def empty():
+            return 206, StreamingResponse(iter(()), framing="json_array")
+
+        sent = request_messages(app, "/items")
+        assert sent[0]["status"] == 201
+        assert dict(sent[0]["headers"])[b"content-type"] == b"application/json"
+        assert json.loads(response(sent)[2]) == [{"id": 0}, {"id": 1}, {"id": 2}]
+        sent = request_messages(app, "/empty")
+        assert sent[0]["status"] == 206
+        assert json.loads(response(sent)[2]) == []
+
+    def test_raw_bytes(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/file")
+        def file():
+            return StreamingResponse(
+                iter([b"\x00\x01", bytearray(b"\x02")]), content_type="application/pdf"
+            )
+
+        sent = request_messages(app, "/file")
+        assert dict(sent[0]["headers"])[b"content-type"] == b"application/pdf"
+        assert response(sent)[2] == b"\x00\x01\x02"
+        assert all(type(message["body"]) is bytes for message in sent[1:])
+
+    def test_error_before_first_item_is_a_normal_error(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/broken")
+        def broken():
+            raise KeyError("missing")
+            yield
+
+        sent = request_messages(app, "/broken")
+        assert sent[0]["status"] == 400
+        assert len(sent) == 2
+
+    def test_error_mid_stream_leaves_the_response_unfinished(self):
+        app = SecurAPI()
+        closed = []
+
+        @app.add_endpoint("/broken")
+        async def broken():
+            try:
+                yield {"id": 0}
+                raise ValueError("database went away")
+            finally:
+                closed.append(True)
+
+        sent = request_messages(app, "/broken")
+        assert sent[0]["status"] == 200
+        # No final message without more_body, the server closes the connection
+        assert all(message.get("more_body") for message in sent[1:])
+        assert closed == [True]
+
+    def test_first_byte_before_the_last_item(self):
+        app = SecurAPI()
+        produced = []
+        produced_at_first_body = []
+
+        @app.add_endpoint("/export")
+        def export():
+            for i in range(100_000):
+                produced.append(i)
+                yield {"id": i}
+
+        async def on_message(message):
+            if message["type"] == "http.response.body" and not produced_at_first_body:
+                produced_at_first_body.append(len(produced))
+
+        asyncio.run(run_request(app, make_scope("/export"), on_message=on_message))
+        assert produced_at_first_body == [1]
+        assert len(produced) == 100_000
+
+    def test_memory_stays_flat(self):
+        app = SecurAPI()
+        row = {"id": 0, "name": "x" * 100}
+
+        @app.add_endpoint("/export")
+        def export(rows: int):
+            for _ in range(int(rows)):
+                yield row
+
+        async def run(rows):
+            scope = make_scope("/export", query_string=f"rows={rows}".encode())
+            size = 0
+
+            async def on_message(message):
+                nonlocal size
+                size += len(message.pop("body", b""))
+
+            tracemalloc.start()
+            await run_request(app, scope, on_message=on_message)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return size, peak
+
+        small_size, small_peak = asyncio.run(run(1_000))
+        large_size, large_peak = asyncio.run(run(100_000))
+        assert large_size > 90 * small_size
+        assert large_peak < 3 * small_peak + 256 * 1024
+
+
+def measure(app, path, keep_body=True):
+    """Run a GET in process, returns (messages without their bodies, body, peak memory).\n
+    Without keep_body, the body returned is its sha256 and the peak is only what
+    the app used"""
+    body = bytearray() if keep_body else hashlib.sha256()
+    add = body.extend if keep_body else body.update
+
+    async def on_message(message):
+        add(message.pop("body", b""))
+
+    tracemalloc.start()
+    messages = asyncio.run(run_request(app, make_scope(path), on_message=on_message))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return messages, body, peak
+
+
+class TestLargeJSONUnit:
+    def test_small_response_is_sent_at_once(self):
+        app = SecurAPI()
+        rows = [{"id": i} for i in range(2000)]
+
+        @app.add_endpoint("/rows")
+        def get_rows():
+            return {"rows": rows, "total": len(rows)}
+
+        messages, body, _ = measure(app, "/rows")
+        assert len(messages) == 2
+        assert dict(messages[0]["headers"])[b"content-length"] == str(len(body)).encode()
+        assert json.loads(body) == {"rows": rows, "total": 2000}
+
+    def test_large_response_is_chunked(self):
+        app = SecurAPI()
+        rows = [{"id": i, "name": "x" * 50, "tags": [i, None, True]} for i in range(50_000)]
+
+        @app.add_endpoint("/rows")
+        def get_rows():
+            return {"rows": rows, "nested": {"rows": rows}}
+
+        messages, body, _ = measure(app, "/rows")
+        assert len(messages) > 3
+        assert b"content-length" not in dict(messages[0]["headers"])
+        assert all(message["more_body"] for message in messages[1:-1])
+        assert json.loads(body) == {"rows": rows, "nested": {"rows": rows}}
+
+    def test_encoding_error(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/early")
+        def early():
+            return [object()] + [0] * 5000
+
+        @app.add_endpoint("/late")
+        def late():
+            return ["x" * 1000] * (2 * JSON_STREAM_THRESHOLD // 1000) + [object()]
+
+        messages, _, _ = measure(app, "/early")
+        assert messages[0]["status"] == 500
+        messages, _, _ = measure(app, "/late")
+        assert messages[0]["status"] == 200
+        assert all(message["more_body"] for message in messages[1:])
+
+    def test_peak_memory_of_a_100mb_response(self):
+        app = SecurAPI()
+        # The same string repeated: the payload objects take almost no memory
+        item = "x" * 1000
+        rows = [item] * 100_000
+
+        @app.add_endpoint("/rows")
+        def get_rows():
+            return rows
+
+        tracemalloc.start()
+        encoded = json.dumps(rows, separators=(",", ":")).encode()
+        single_shot_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        single_shot = len(encoded)
+        digest = hashlib.sha256(encoded).digest()
+        del encoded
+        assert single_shot > 100_000_000
+        assert single_shot_peak > 2 * single_shot
+
+        _, body, peak = measure(app, "/rows", keep_body=False)
+        assert body.digest() == digest
+        # A few buffers of about JSON_STREAM_THRESHOLD, against two copies of the body
+        assert peak < single_shot / 10
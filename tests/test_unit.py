@@ -1,4 +1,7 @@
+import asyncio
+import json
 from ..main import SecurAPI
+from ..security.rateLimiting import RateLimiterMiddleware
 
 class TestSecurAPIUnit:
     def test_securapi_initialization(self):
@@ -64,3 +67,95 @@ class TestSecurAPIUnit:
 
 
 
+    def test_dispatch_plan_compiled_on_registration(self):
+        app = SecurAPI()
+
+        @app.add_endpoint("/plan", "POST")
+        async def plan_handler(name, request_body=""):
+            return {"response": f"{name}: {request_body}"}
+
+        endpoint = app.routes["POST"]["/plan/"]
+        assert callable(endpoint.dispatch)
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": "¡hola!".encode(), "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"query_string": b"name=ana", "headers": []}
+        asyncio.run(endpoint.dispatch(scope, {}, receive, send))
+        assert sent[0]["status"] == 201
+        body = sent[1]["body"]
+        assert json.loads(body) == {"response": "ana: ¡hola!"}
+        assert dict(sent[0]["headers"])[b"content-length"] == str(len(body)).encode()
+
+    def test_framework_responses_content_length(self):
+        app = SecurAPI()
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/missing/ñ",
+            "query_string": b"",
+            "headers": [],
+            "client": ("127.0.0.1", 1),
+        }
+        asyncio.run(app.request_manager(scope, receive, send))
+        asyncio.run(app.request_manager({**scope, "method": "PATCH"}, receive, send))
+        asyncio.run(app.request_manager({**scope, "type": "websocket"}, receive, send))
+        assert [m["status"] for m in sent[::2]] == [404, 405, 400]
+        assert json.loads(sent[1]["body"]) == {"error": "Path /missing/ñ/ not found"}
+        for start, body in zip(sent[::2], sent[1::2]):
+            assert dict(start["headers"])[b"content-length"] == str(len(body["body"])).encode()
+
+    def test_constant_endpoint_called_once(self):
+        app = SecurAPI()
+        calls = []
+
+        @app.add_endpoint("/version", constant=True)
+        def version():
+            calls.append(1)
+            return {"version": "1.0"}
+
+        @app.add_endpoint("/invalid-constant", constant=True)
+        def invalid_constant(param):
+            return {}
+
+        assert app.is_valid_route("/version/", "GET") is True
+        assert app.is_valid_route("/invalid-constant/", "GET") is False
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        endpoint = app.routes["GET"]["/version/"]
+        for _ in range(3):
+            asyncio.run(endpoint.dispatch({"headers": []}, {}, None, send))
+        assert len(calls) == 1
+        assert [json.loads(m["body"]) for m in sent[1::2]] == [{"version": "1.0"}] * 3
+
+    def test_lifespan_starts_and_stops_sweeper(self):
+        app = SecurAPI(rate_limiter=RateLimiterMiddleware())
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            if len(sent) == 1:
+                assert len(app.background_tasks) == 1
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        asyncio.run(app.request_manager({"type": "lifespan"}, receive, send))
+        assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+        assert app.background_tasks == []